@@ -0,0 +1,268 @@
+"""
+AKIRA command line entry point.
+
+    python akira.py build-dataset --workers 16
+    python akira.py detect video.mp4 --output overstimulating_segments.json --hop 1
+    python akira.py retune video.mp4 --segments overstimulating_segments.json --output retuned.mp4
+    python akira.py process video.mp4 --outputs detection_json retuned_mp4 --retuned-mp4 retuned.mp4
+    python akira.py batch episodes/ --output-folder batch_output --workers 4
+    python akira.py train --dataset model_dataset --epochs 20
+    python akira.py export-shards model_dataset --output-folder spectrogram_shards
+    python akira.py calibrate-gate --audio-folder new_dataset --max-recall-loss 0.01
+    python akira.py export --formats tflite-float16 tflite-int8 onnx --calibration-folder model_dataset/train
+
+Every subcommand imports its pipeline modules inside its handler, so --help and argument
+errors never load librosa, matplotlib, moviepy or TensorFlow.
+"""
+import argparse
+import sys
+
+
+def run_build_dataset(args):
+    from buildDataset import build_dataset
+
+    summary = build_dataset(args.raw_folder, workers=args.workers, gain_db=args.gain_db,
+                            manifest_path=args.manifest)
+    return 1 if summary["failed"] else 0
+
+
+def invalid_hop(segment_length, window_hop):
+    """Prints why the hop cannot be used and returns True, before any video is decoded."""
+    from appflow.detectModel import check_window_hop
+
+    try:
+        check_window_hop(segment_length, window_hop)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return True
+    return False
+
+
+def run_detect(args):
+    from appflow.detectModel import AcousticGate, detect_regions, load_ai_model, save_and_print_results
+    from appflow.streamingAnalysis import analyse_video_streaming
+
+    if invalid_hop(args.window, args.hop):
+        return 2
+    ai_model = load_ai_model(args.model, backend=args.backend, num_threads=args.threads, jit_compile=args.xla,
+                             batch_size=args.batch_size)
+    gate = AcousticGate.load(args.gate) if args.gate else None
+    window_results = analyse_video_streaming(args.video, ai_model, args.window, args.threshold, args.batch_size,
+                                             args.gain_db, gate, args.hop, args.stream_output)
+    if args.windows_output:
+        save_and_print_results(window_results, args.windows_output)
+
+    # The retune stage reads the merged regions, not one entry per window
+    regions = detect_regions(window_results, args.window, args.hop, args.threshold, args.hysteresis, args.min_gap)
+    save_and_print_results(regions, args.output)
+    return 0
+
+
+def run_retune(args):
+    from appflow.extractSpectroSound import boost_volume, extract_audio
+    from appflow.retunedDetected import attach_audio_to_video, load_overstim_segments, retune_audio
+
+    overstim_segments = load_overstim_segments(args.segments)
+    boosted_audio = boost_volume(extract_audio(args.video), gain_db=args.gain_db)
+    retuned_audio = retune_audio(boosted_audio, None, overstim_segments)
+    attach_audio_to_video(args.video, retuned_audio, args.output)
+    return 0
+
+
+def run_process(args):
+    from appflow.videoPipeline import run_pipeline
+
+    if invalid_hop(4.0, args.hop):
+        return 2
+    paths = {name: getattr(args, name) for name in ("detection_json", "retuned_mp4") if getattr(args, name)}
+    gate = None
+    if args.gate:
+        from appflow.detectModel import AcousticGate
+        gate = AcousticGate.load(args.gate)
+    produced, pipeline = run_pipeline(args.video, args.outputs, paths, debug=args.debug_artifacts or None,
+                                      model_path=args.model, window_hop=args.hop, threshold=args.threshold,
+                                      min_gap=args.min_gap, gain_db=args.gain_db, gate=gate, threads=args.threads,
+                                      processes=args.processes, results_stream=args.stream_output,
+                                      jit_compile=args.xla)
+    for name, path in produced.items():
+        print(f"{name}: {path}")
+    if args.timeline:
+        pipeline.print_timeline()
+    return 0
+
+
+def run_batch(args):
+    from batchProcess import batch_process
+
+    if invalid_hop(4.0, args.hop):
+        return 2
+    report = batch_process(args.inputs, args.output_folder, args.workers, args.model, args.backend, args.outputs,
+                           args.hop, args.threshold, args.min_gap, args.gain_db, args.journal, args.report)
+    return 1 if report["failed"] else 0
+
+
+def run_train(args):
+    from model_dataset.train_model import dataset_path, train_model
+
+    cache = None if args.cache == "none" else args.cache
+    train_model(args.dataset or dataset_path, epochs=args.epochs, model_path=args.model_output, history_path=args.history_output,
+                batch_size=args.batch_size, learning_rate=args.learning_rate, fine_tune_layers=args.fine_tune_layers,
+                cache=cache, seed=args.seed, mode=args.mode, embedding_cache=args.embedding_cache,
+                fine_tune_epochs=args.fine_tune_epochs, fine_tune_learning_rate=args.fine_tune_learning_rate,
+                shards=args.shards)
+    return 0
+
+
+def run_export_shards(args):
+    from model_dataset.spectrogram_shards import export_shards
+
+    export_shards(args.source_folder, args.output_folder, args.shard_size, args.val_fraction)
+    return 0
+
+
+def run_calibrate_gate(args):
+    from appflow.detectModel import calibrate_gate
+
+    gate = calibrate_gate(args.audio_folder, args.max_recall_loss, args.gain_db)
+    gate.save(args.output)
+    print(f"Acoustic gate saved to {args.output}.")
+    return 0
+
+
+def run_export(args):
+    from appflow.exportModel import export_model
+
+    export_model(args.model, args.output_folder, args.formats, args.calibration_folder, args.calibration_samples)
+    return 0
+
+
+def build_parser():
+    from batchProcess import add_batch_arguments
+
+    parser = argparse.ArgumentParser(prog="akira", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build-dataset", help="Build the training dataset from the raw category videos")
+    build.add_argument("--raw-folder", default="raw_dataset")
+    build.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    build.add_argument("--gain-db", type=float, default=15)
+    build.add_argument("--manifest", default="dataset_manifest.json")
+    build.set_defaults(handler=run_build_dataset)
+
+    detect = subparsers.add_parser("detect", help="Detect overstimulating segments in a video")
+    detect.add_argument("video")
+    detect.add_argument("--model", default="overstimulating_audio_detector.h5")
+    detect.add_argument("--output", default="overstimulating_segments.json")
+    detect.add_argument("--threshold", type=float, default=0.75)
+    detect.add_argument("--batch-size", type=int, default=None, help="Inference batch size (default: autotuned)")
+    detect.add_argument("--gain-db", type=float, default=20)
+    detect.add_argument("--backend", choices=["keras", "tflite", "onnx"], default=None,
+                        help="Inference backend (default: from the model file suffix)")
+    detect.add_argument("--threads", type=int, default=None, help="Inference threads (default: backend default)")
+    detect.add_argument("--xla", action="store_true", help="Compile the Keras model with XLA")
+    detect.add_argument("--gate", default=None, help="Acoustic gate from calibrate-gate; gated segments skip the CNN")
+    detect.add_argument("--window", type=float, default=4.0, help="Analysis window length in seconds")
+    detect.add_argument("--hop", type=float, default=None,
+                        help="Seconds between window starts; the window length must be a multiple (default: no overlap)")
+    detect.add_argument("--hysteresis", type=float, default=0.15,
+                        help="Regions extend while the timeline stays above threshold minus this margin")
+    detect.add_argument("--min-gap", type=float, default=0.0, help="Join regions separated by less than this (seconds)")
+    detect.add_argument("--windows-output", default=None, help="Also save the per-window scores to this JSON file")
+    detect.add_argument("--stream-output", default=None,
+                        help="Append each window score to this JSON Lines file as soon as it is scored")
+    detect.set_defaults(handler=run_detect)
+
+    retune = subparsers.add_parser("retune", help="Retune the detected segments and write a new video")
+    retune.add_argument("video")
+    retune.add_argument("--segments", default="overstimulating_segments.json")
+    retune.add_argument("--output", required=True)
+    retune.add_argument("--gain-db", type=float, default=20)
+    retune.set_defaults(handler=run_retune)
+
+    process = subparsers.add_parser("process", help="Produce only the requested outputs for a video")
+    process.add_argument("video")
+    process.add_argument("--outputs", nargs="+", default=["retuned_mp4"],
+                         choices=["detection_json", "retuned_mp4", "boosted_mp4", "full_spectrogram", "segment_pngs",
+                                  "extracted_mp3", "boosted_mp3"])
+    process.add_argument("--detection-json", default=None, help="Path of the detection JSON output")
+    process.add_argument("--retuned-mp4", default=None, help="Path of the retuned video output")
+    process.add_argument("--debug-artifacts", action="store_true",
+                         help="Also write the intermediate MP3s and spectrogram images")
+    process.add_argument("--model", default="overstimulating_audio_detector.h5")
+    process.add_argument("--hop", type=float, default=None)
+    process.add_argument("--threshold", type=float, default=0.75)
+    process.add_argument("--min-gap", type=float, default=0.0,
+                         help="Join regions separated by less than this (seconds)")
+    process.add_argument("--gain-db", type=float, default=20)
+    process.add_argument("--gate", default=None)
+    process.add_argument("--xla", action="store_true", help="Compile the Keras model with XLA")
+    process.add_argument("--threads", type=int, default=6, help="Thread pool size for independent stages")
+    process.add_argument("--processes", type=int, default=2, help="Process pool size for the matplotlib renders")
+    process.add_argument("--timeline", action="store_true", help="Print when each stage ran")
+    process.add_argument("--stream-output", default=None,
+                         help="Append each window score to this JSON Lines file as soon as it is scored")
+    process.set_defaults(handler=run_process)
+
+    batch = subparsers.add_parser("batch", help="Process a folder or list of videos with a worker pool")
+    add_batch_arguments(batch)
+    batch.set_defaults(handler=run_batch)
+
+    train = subparsers.add_parser("train", help="Fine-tune the VGG16 detector")
+    train_source = train.add_mutually_exclusive_group(required=True)
+    train_source.add_argument("--dataset", help="Folder containing train/ and val/ class folders")
+    train_source.add_argument("--shards", help="Spectrogram shard folder written by export-shards")
+    train.add_argument("--epochs", type=int, default=20)
+    train.add_argument("--model-output", default="overstimulating_audio_detector.h5")
+    train.add_argument("--history-output", default="training_history.pkl")
+    train.add_argument("--batch-size", type=int, default=32)
+    train.add_argument("--learning-rate", type=float, default=0.0001)
+    train.add_argument("--fine-tune-layers", type=int, default=4, help="Trailing VGG16 layers left trainable")
+    train.add_argument("--cache", default="memory",
+                       help="Decoded image cache: 'memory', 'none', or a file prefix for an on-disk cache")
+    train.add_argument("--seed", type=int, default=0, help="Shuffle seed")
+    train.add_argument("--mode", choices=["full", "embeddings"], default="full",
+                       help="embeddings: run the frozen VGG16 prefix once into a cache and train the rest from it")
+    train.add_argument("--embedding-cache", default="embedding_cache", help="Folder of the embedding cache")
+    train.add_argument("--fine-tune-epochs", type=int, default=0,
+                       help="After embeddings training, epochs of fine-tuning on the raw images")
+    train.add_argument("--fine-tune-learning-rate", type=float, default=None)
+    train.set_defaults(handler=run_train)
+
+    shards = subparsers.add_parser("export-shards", help="Export spectrogram PNGs to memory-mapped .npy shards")
+    shards.add_argument("source_folder",
+                        help="Folder with train/ and val/ class folders, or category folders (spectrogram_dataset)")
+    shards.add_argument("--output-folder", default="spectrogram_shards")
+    shards.add_argument("--shard-size", type=int, default=1024, help="Images per shard")
+    shards.add_argument("--val-fraction", type=float, default=0.2,
+                        help="Validation share when splitting category folders by image hash")
+    shards.set_defaults(handler=run_export_shards)
+
+    gate = subparsers.add_parser("calibrate-gate", help="Calibrate the acoustic pre-gate on the category audio")
+    gate.add_argument("--audio-folder", default="new_dataset", help="Category folders of extracted clip audio")
+    gate.add_argument("--max-recall-loss", type=float, default=0.01,
+                      help="Largest share of overstimulating segments the gate may skip")
+    gate.add_argument("--gain-db", type=float, default=20, help="Gain applied before analysis, as in detect")
+    gate.add_argument("--output", default="acoustic_gate.json")
+    gate.set_defaults(handler=run_calibrate_gate)
+
+    export = subparsers.add_parser("export", help="Export the Keras detector to TFLite and ONNX")
+    export.add_argument("--model", default="overstimulating_audio_detector.h5")
+    export.add_argument("--output-folder", default="exported_models")
+    export.add_argument("--formats", nargs="+", choices=["tflite-float16", "tflite-int8", "onnx"],
+                        default=["tflite-float16", "tflite-int8", "onnx"])
+    export.add_argument("--calibration-folder", default=None,
+                        help="Spectrogram images used to calibrate int8 quantization (e.g. model_dataset/train)")
+    export.add_argument("--calibration-samples", type=int, default=200)
+    export.set_defaults(handler=run_export)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import subprocess
+import librosa
+import numpy as np
+import soundfile as sf
+from imageio_ffmpeg import get_ffmpeg_exe
+from appflow.tracing import span, traced
+
+
+def pcm_decode_command(input_path, sr, channels=2):
+    """Builds the ffmpeg command that decodes the audio stream of a file to raw float32 PCM on stdout."""
+    return [get_ffmpeg_exe(), "-v", "error", "-i", input_path, "-vn",
+            "-f", "f32le", "-acodec", "pcm_f32le", "-ar", str(sr), "-ac", str(channels), "-"]
+
+
+def remux_command(input_video, output_video, sr, channels, audio_codec="aac", audio_bitrate="192k"):
+    """
+    Builds the ffmpeg command that copies the video stream of input_video unchanged and encodes
+    raw float32 PCM read from stdin as its new audio track.
+    """
+    return [get_ffmpeg_exe(), "-y", "-v", "error", "-i", input_video,
+            "-f", "f32le", "-ar", str(sr), "-ac", str(channels), "-i", "pipe:0",
+            "-map", "0:v:0", "-map", "1:a:0", "-c:v", "copy", "-c:a", audio_codec, "-b:a", audio_bitrate,
+            "-movflags", "+faststart", output_video]
+
+
+def native_sample_rate(input_path):
+    """Reads the sample rate of the audio stream in a media file."""
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    infos = ffmpeg_parse_infos(input_path)
+    if not infos.get("audio_found"):
+        raise ValueError(f"No audio stream found in {input_path}")
+    return int(infos["audio_fps"])
+
+
+class AudioBuffer:
+    """Decoded float32 PCM audio, shaped (samples, channels), passed in memory between pipeline stages."""
+
+    def __init__(self, samples, sr):
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        self.samples = samples
+        self.sr = sr
+        self._mono = None
+
+    @classmethod
+    def from_video(cls, input_path, sr=None, channels=2):
+        """Decodes the audio track of a video once, straight to PCM (stereo, like moviepy's extraction)."""
+        if sr is None:
+            sr = native_sample_rate(input_path)
+        with span("decode", source=input_path):
+            result = subprocess.run(pcm_decode_command(input_path, sr, channels), capture_output=True, check=True)
+        samples = np.frombuffer(bytearray(result.stdout), dtype=np.float32).reshape(-1, channels)
+        return cls(samples, sr)
+
+    @classmethod
+    def from_file(cls, input_path):
+        """Decodes an audio file at its native sample rate, keeping all channels."""
+        with span("decode", source=input_path):
+            y, sr = librosa.load(input_path, sr=None, mono=False)
+        return cls(np.atleast_2d(y).T, sr)
+
+    @property
+    def channels(self):
+        return self.samples.shape[1]
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sr
+
+    def mono(self):
+        """Returns the channel average as a 1-D float32 array, the same downmix librosa.load applies."""
+        if self._mono is None:
+            if self.channels == 1:
+                self._mono = self.samples[:, 0]
+            else:
+                self._mono = self.samples.mean(axis=1, dtype=np.float32)
+        return self._mono
+
+    def with_gain(self, gain_db):
+        """Returns a copy boosted by gain_db decibels, saturating at full scale like pydub does."""
+        boosted = self.samples * np.float32(10 ** (gain_db / 20))
+        np.clip(boosted, -1.0, 1.0, out=boosted)
+        return AudioBuffer(boosted, self.sr)
+
+    def write(self, output_path):
+        """Encodes the buffer to an audio file; the format follows the file extension."""
+        with span("encode", output=output_path):
+            sf.write(output_path, self.samples, self.sr)
+
+
+@traced("mux")
+def mux_audio(input_video, audio, output_video, audio_codec="aac", audio_bitrate="192k", chunk_seconds=10):
+    """
+    Replaces the audio track of a video without re-encoding its frames.
+
+    audio is an AudioBuffer (or audio file path); its PCM is piped to ffmpeg in chunks, so no
+    intermediate audio file is written and only the audio track is encoded.
+    """
+    audio = load_audio_buffer(audio)
+    samples = np.ascontiguousarray(audio.samples, dtype=np.float32)
+    process = subprocess.Popen(remux_command(input_video, output_video, audio.sr, audio.channels, audio_codec,
+                                             audio_bitrate),
+                               stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        chunk = int(chunk_seconds * audio.sr)
+        for start in range(0, len(samples), chunk):
+            process.stdin.write(samples[start:start + chunk].tobytes())
+    except BrokenPipeError:
+        pass  # ffmpeg exited early; its error is reported below
+    finally:
+        process.stdin.close()
+    error = process.stderr.read().decode(errors="replace").strip()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed to remux {input_video}: {error}")
+    return output_video
+
+
+def load_audio_buffer(source):
+    """Returns source unchanged if it is already an AudioBuffer, otherwise decodes the audio file."""
+    if isinstance(source, AudioBuffer):
+        return source
+    return AudioBuffer.from_file(source)
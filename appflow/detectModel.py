@@ -1,16 +1,40 @@
-import tensorflow as tf
 import numpy as np
 import os
-from PIL import Image
 import re
 import json
+import queue
+import threading
+from appflow.modelBackends import MODEL_SUFFIXES, InferenceBackend, KerasBackend, load_backend
+from appflow.tracing import span, traced
 
-def load_ai_model(model_path="overstimulating_audio_detector.h5"):
-    """Loads the trained AI model for detecting overstimulating audio."""
+# Rough peak activation footprint of one VGG16 forward pass at 224x224, in bytes
+VGG16_BYTES_PER_SAMPLE = 64 * 1024 * 1024
+
+# Attribute holding the KerasBackend of a plain Keras model; it lives and dies with the model
+KERAS_BACKEND_ATTRIBUTE = "_akira_inference_backend"
+
+# Category folders whose clips are labelled non-overstimulating (acoustic gate calibration, spectrogram shards)
+NEGATIVE_CATEGORIES = ("Non-Overstimulating",)
+
+def load_ai_model(model_path="overstimulating_audio_detector.h5", exit_on_error=True, backend=None, num_threads=None,
+                  jit_compile=False, batch_size=None):
+    """
+    Loads the trained AI model for detecting overstimulating audio as a warmed-up InferenceBackend.
+
+    Keras models (.h5, .keras) run through one compiled tf.function, with XLA when jit_compile
+    is set; exported .tflite and .onnx models run on their own runtimes. A warm-up batch runs
+    here, so the first scored segment does not pay for graph building. With XLA the warm-up
+    uses the detection batch size (autotuned unless given), the one shape it compiles for.
+    """
     try:
-        model = tf.keras.models.load_model(model_path)
-        return model
+        if backend is None:
+            backend = MODEL_SUFFIXES.get(os.path.splitext(model_path)[1].lower(), "keras")
+        if jit_compile and batch_size is None:
+            batch_size = autotune_batch_size()
+        return load_backend(model_path, backend, num_threads, jit_compile, batch_size or 1)
     except Exception as e:
+        if not exit_on_error:
+            raise
         print(f"Error loading model: {e}")
         exit(1)
 
@@ -18,9 +42,57 @@ def natural_sort_key(filename):
     """Extracts numbers from filenames for correct numerical sorting."""
     return [int(text) if text.isdigit() else text.lower() for text in re.split(r"(\d+)", filename)]
 
-def detect_overstimulating_segments(segment_folder, ai_model, segment_length=4.0, threshold=0.75):
+def available_memory_bytes():
+    """Returns the memory currently available to new allocations, or None if it cannot be read."""
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def autotune_batch_size(memory_fraction=0.25, bytes_per_sample=VGG16_BYTES_PER_SAMPLE, max_batch_size=64,
+                        default_batch_size=16):
+    """Picks an inference batch size that keeps one forward pass within a fraction of available memory."""
+    available = available_memory_bytes()
+    if available is None:
+        return default_batch_size
+    return int(max(1, min(max_batch_size, available * memory_fraction // bytes_per_sample)))
+
+def as_backend(ai_model, input_shape=(224, 224, 3)):
+    """Returns the model as an InferenceBackend, wrapping Keras models once so they are traced only once."""
+    if isinstance(ai_model, InferenceBackend):
+        return ai_model
+    backend = getattr(ai_model, KERAS_BACKEND_ATTRIBUTE, None)
+    if backend is None:
+        backend = KerasBackend(ai_model, input_shape)
+        # Kept on the model itself: a cache keyed by the model would be kept alive by the backend
+        object.__setattr__(ai_model, KERAS_BACKEND_ATTRIBUTE, backend)
+    return backend
+
+def predict_confidences(spectrograms, ai_model, batch_size=None):
+    """Scores an (N, 224, 224, 3) array of spectrograms batch by batch and returns N confidences."""
+    if batch_size is None:
+        batch_size = autotune_batch_size()
+
+    backend = as_backend(ai_model, tuple(spectrograms.shape[1:]))
+    confidences = np.empty(len(spectrograms), dtype=np.float32)
+    for start in range(0, len(spectrograms), batch_size):
+        batch = np.asarray(spectrograms[start:start + batch_size], dtype=np.float32)
+        with span("inference_batch", backend=backend.name, size=len(batch)):
+            confidences[start:start + len(batch)] = backend.predict_batch(batch)
+    return confidences
+
+@traced("detect_segment_pngs")
+def detect_overstimulating_segments(segment_folder, ai_model, segment_length=4.0, threshold=0.75, batch_size=None):
     """Detects overstimulating segments from spectrogram images with confidence scores."""
-    overstim_results = []
+    from PIL import Image
 
     try:
         segment_files = sorted(os.listdir(segment_folder), key=natural_sort_key)  # Ensure correct order
@@ -28,6 +100,7 @@ def detect_overstimulating_segments(segment_folder, ai_model, segment_length=4.0
         print(f"Error: Folder '{segment_folder}' not found.")
         exit(1)
 
+    loaded_files, indices, images = [], [], []
     for i, segment_file in enumerate(segment_files):
         if segment_file.endswith(".png"):
             segment_path = os.path.join(segment_folder, segment_file)
@@ -35,30 +108,323 @@ def detect_overstimulating_segments(segment_folder, ai_model, segment_length=4.0
             try:
                 # Load and preprocess image
                 img = Image.open(segment_path).convert("RGB").resize((224, 224))
-                img_array = np.array(img) / 255.0  # Normalize pixel values
-                img_array = np.expand_dims(img_array, axis=0)  # Add batch dimension
-
-                # Predict overstimulation
-                prediction = ai_model.predict(img_array)
-                confidence = float(prediction[0])  # Convert NumPy array to float
-                is_overstim = confidence > threshold  # Apply threshold
-
-                # Calculate time range
-                start_time = round(i * segment_length, 2)
-                end_time = round(start_time + segment_length, 2)
-
-                # Append result with confidence score
-                overstim_results.append({
-                    "segment": segment_file,
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "overstimulating": is_overstim,
-                    "confidence": round(confidence, 4)  # ✅ Confidence added for analysis
-                })
+                images.append(np.asarray(img, dtype=np.float32) / 255.0)  # Normalize pixel values
+                loaded_files.append(segment_file)
+                indices.append(i)
             except Exception as e:
                 print(f"Error processing {segment_file}: {e}")
 
-    return overstim_results
+    if not images:
+        return []
+
+    # Predict overstimulation for all segments in stacked batches
+    confidences = predict_confidences(np.stack(images), ai_model, batch_size)
+    return [segment_result(segment_file, i, float(confidence), segment_length, threshold)
+            for segment_file, i, confidence in zip(loaded_files, indices, confidences)]
+
+def detect_overstimulating_tensors(spectrograms, ai_model, segment_length=4.0, threshold=0.75, batch_size=None,
+                                   window_hop=None):
+    """Detects overstimulating segments from an (N, 224, 224, 3) array of in-memory spectrograms."""
+    confidences = predict_confidences(spectrograms, ai_model, batch_size)
+    return [segment_result(f"segment_{i}", i, float(confidence), segment_length, threshold, window_hop)
+            for i, confidence in enumerate(confidences)]
+
+def queued_stream(items, max_pending=64):
+    """
+    Runs a generator on a producer thread and yields its items through a bounded queue.
+
+    The consumer works on what is already queued while the producer computes the next items;
+    at most max_pending items wait in between. Exceptions raised by the producer (including
+    PipelineCancelled) are re-raised in the consumer, and closing the consumer stops the producer.
+    """
+    buffer = queue.Queue(maxsize=max_pending)
+    finished, stop = object(), threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    break
+            else:
+                put(finished)
+        except BaseException as e:
+            put((finished, e))
+        finally:
+            if hasattr(items, "close"):
+                items.close()
+
+    producer = threading.Thread(target=produce, name="spectrogram-producer", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is finished:
+                return
+            if isinstance(item, tuple) and item and item[0] is finished:
+                raise item[1]
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+def detect_overstimulating_stream(spectrogram_stream, ai_model, segment_length=4.0, threshold=0.75, batch_size=None,
+                                  window_hop=None, queue_batches=2):
+    """
+    Detects overstimulating segments from an iterable of (index, spectrogram) pairs.
+
+    Results are yielded batch by batch, so only a few batches of spectrograms are held at a time.
+    With queue_batches, the spectrograms are produced on a separate thread into a queue of that
+    many batches, so the model scores one batch while the next ones are still being transformed;
+    0 produces and scores them in turn on the calling thread.
+    A spectrogram of None marks a segment the acoustic gate already ruled out: it is reported
+    as gated with confidence 0 and never reaches the CNN.
+    """
+    if batch_size is None:
+        batch_size = autotune_batch_size()
+    if queue_batches:
+        spectrogram_stream = queued_stream(spectrogram_stream, queue_batches * batch_size)
+
+    pending, images = [], []
+    for index, spectrogram in spectrogram_stream:
+        pending.append((index, spectrogram is None))
+        if spectrogram is not None:
+            images.append(spectrogram)
+        if len(images) == batch_size:
+            yield from score_pending(pending, images, ai_model, segment_length, threshold, batch_size, window_hop)
+            pending, images = [], []
+
+    if pending:
+        yield from score_pending(pending, images, ai_model, segment_length, threshold, batch_size, window_hop)
+
+def score_pending(pending, images, ai_model, segment_length=4.0, threshold=0.75, batch_size=None, window_hop=None):
+    """Scores the ungated images of a batch and yields the results of all its segments in order."""
+    confidences = iter(predict_confidences(np.stack(images), ai_model, batch_size) if images else [])
+    for i, gated in pending:
+        confidence = 0.0 if gated else float(next(confidences))
+        result = segment_result(f"segment_{i}", i, confidence, segment_length, threshold, window_hop)
+        if gated:
+            result["gated"] = True
+        yield result
+
+class AcousticGate:
+    """
+    First stage of the cascade detector: rules out segments that are quiet, steady and dull.
+
+    A segment skips the CNN only when its RMS level, spectral flux and high-band energy share
+    (TrackSpectrum.segment_features) are all below the calibrated thresholds.
+    """
+
+    def __init__(self, thresholds, high_band_hz=4000, calibration=None):
+        self.thresholds = np.asarray(thresholds, dtype=np.float32)
+        self.high_band_hz = high_band_hz
+        self.calibration = calibration or {}
+
+    def passes(self, features):
+        """Returns a boolean mask of the segments that still need the CNN."""
+        return ~np.all(features < self.thresholds, axis=1)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"thresholds": self.thresholds.tolist(), "high_band_hz": self.high_band_hz,
+                       "calibration": self.calibration}, f, indent=4)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["thresholds"], data["high_band_hz"], data.get("calibration"))
+
+def calibrate_gate(audio_folder="new_dataset", max_recall_loss=0.01, gain_db=20, segment_length=4,
+                   high_band_hz=4000, negative_categories=NEGATIVE_CATEGORIES):
+    """
+    Calibrates the acoustic gate on the labelled category clips of the training audio.
+
+    Every segment inherits its clip's label. The thresholds are the same quantile q of each
+    feature over the overstimulating segments, and q is the largest value for which the share
+    of overstimulating segments the gate would skip stays within max_recall_loss. Clips are
+    boosted by gain_db, like detection input, so the RMS threshold is on the same scale.
+    """
+    from appflow.audioBuffer import AudioBuffer
+    from appflow.spectralAnalysis import TrackSpectrum
+
+    features, labels = [], []
+    for category in sorted(os.listdir(audio_folder)):
+        category_path = os.path.join(audio_folder, category)
+        if not os.path.isdir(category_path):
+            continue
+        for audio_file in sorted(os.listdir(category_path)):
+            if not audio_file.endswith((".mp3", ".wav")):
+                continue
+            try:
+                buffer = AudioBuffer.from_file(os.path.join(category_path, audio_file)).with_gain(gain_db)
+                spectrum = TrackSpectrum(buffer.mono(), buffer.sr, segment_length=segment_length)
+            except Exception as e:
+                print(f"Error processing {audio_file}: {e}")
+                continue
+            clip_features = spectrum.segment_features(high_band_hz)
+            features.append(clip_features)
+            labels.append(np.full(len(clip_features), category not in negative_categories))
+
+    if not features:
+        raise ValueError(f"No labelled audio clips found under '{audio_folder}'")
+    features, labels = np.concatenate(features), np.concatenate(labels)
+    positives = features[labels]
+    if not len(positives):
+        raise ValueError("Calibration needs overstimulating clips to bound the recall loss")
+
+    # Largest quantile first: higher thresholds gate more segments
+    for quantile in np.linspace(0.5, 0.0, 101):
+        thresholds = np.quantile(positives, quantile, axis=0)
+        gated = np.all(features < thresholds, axis=1)
+        recall_loss = float(gated[labels].mean())
+        if recall_loss <= max_recall_loss:
+            break
+
+    calibration = {
+        "audio_folder": audio_folder,
+        "gain_db": gain_db,
+        "segment_length": segment_length,
+        "max_recall_loss": max_recall_loss,
+        "quantile": round(float(quantile), 4),
+        "recall_loss": round(recall_loss, 4),
+        "segments": int(len(features)),
+        "overstimulating_segments": int(labels.sum()),
+        "gated_fraction": round(float(gated.mean()), 4),
+        "gated_non_overstimulating": round(float(gated[~labels].mean()), 4) if (~labels).any() else 0.0,
+    }
+    print(f"Acoustic gate calibrated on {calibration['segments']} segments: skips "
+          f"{calibration['gated_fraction']:.1%} of them at a recall loss of {recall_loss:.2%} "
+          f"(bound {max_recall_loss:.2%}).")
+    return AcousticGate(thresholds, high_band_hz, calibration)
+
+def stream_results_json(overstim_results, output_json_path):
+    """Writes each result to a JSON Lines file as soon as it arrives, and passes the results on."""
+    with open(output_json_path, "w") as f:
+        for segment in overstim_results:
+            f.write(json.dumps(segment) + "\n")
+            f.flush()  # Readers tailing the file see every result as soon as it is scored
+            yield segment
+
+def report_inference_latency(ai_model):
+    """Prints the steady-state latency of the batches scored since the last report and returns it."""
+    report = as_backend(ai_model).latency_report()
+    if report:
+        print(f"Inference ({report['backend']}): {report['batches']} batches, p50 {report['batch_p50_ms']} ms / "
+              f"p95 {report['batch_p95_ms']} ms per batch, {report['image_mean_ms']} ms per image "
+              f"({report['images_per_second']} images/s).")
+    return report
+
+def report_gate_savings(overstim_results):
+    """Prints how many CNN calls the acoustic gate saved and returns that count."""
+    saved = sum(1 for segment in overstim_results if segment.get("gated"))
+    total = len(overstim_results)
+    print(f"Acoustic gate: {saved} of {total} segments skipped the CNN "
+          f"({saved / total if total else 0:.1%} of CNN calls saved).")
+    return saved
+
+def segment_result(segment_name, index, confidence, segment_length=4.0, threshold=0.75, window_hop=None):
+    """Builds the result entry for one segment (or sliding window) from its confidence score."""
+    # Calculate time range
+    start_time = round(index * (segment_length if window_hop is None else window_hop), 2)
+    end_time = round(start_time + segment_length, 2)
+
+    return {
+        "segment": segment_name,
+        "start_time": start_time,
+        "end_time": end_time,
+        "overstimulating": confidence > threshold,  # Apply threshold
+        "confidence": round(confidence, 4)  # ✅ Confidence added for analysis
+    }
+
+def check_window_hop(segment_length=4.0, window_hop=None):
+    """
+    Raises ValueError unless window_hop (None for no overlap) is a positive divisor of the window length.
+
+    Regions are merged on a timeline of hop-long cells, so this is checked before any audio is analysed.
+    """
+    if window_hop is None:
+        return
+    span = int(round(segment_length / window_hop)) if window_hop > 0 else 0
+    if span < 1 or not np.isclose(span * window_hop, segment_length):
+        raise ValueError(f"The window length ({segment_length}s) must be a multiple of the hop ({window_hop}s)")
+
+def confidence_timeline(window_results, segment_length=4.0, window_hop=None, reduce="mean"):
+    """
+    Spreads per-window confidences onto a timeline of window_hop-long cells.
+
+    Each cell takes the mean (or max) confidence of every window covering it, so a burst
+    straddling a window boundary is still scored by the windows centred on it.
+    Returns (cell_start_times, cell_confidences).
+    """
+    check_window_hop(segment_length, window_hop)
+    hop = segment_length if window_hop is None else window_hop
+    span = int(round(segment_length / hop))
+
+    windows = sorted(window_results, key=lambda result: result["start_time"])
+    confidences = np.array([result["confidence"] for result in windows], dtype=np.float64)
+    if not len(confidences):
+        return np.empty(0), np.empty(0)
+
+    kernel = np.ones(span)
+    if reduce == "mean":
+        cells = np.convolve(confidences, kernel) / np.convolve(np.ones_like(confidences), kernel)
+    elif reduce == "max":
+        padded = np.pad(confidences, span - 1, constant_values=-np.inf)
+        cells = np.lib.stride_tricks.sliding_window_view(padded, span).max(axis=1)
+    else:
+        raise ValueError(f"Unknown timeline reduction '{reduce}'; expected 'mean' or 'max'")
+
+    first = windows[0]["start_time"]
+    return first + np.arange(len(cells)) * hop, cells
+
+def merge_regions(cell_starts, cell_confidences, cell_length, threshold=0.75, hysteresis=0.15, min_gap=0.0):
+    """
+    Merges contiguous timeline cells into overstimulating regions with hysteresis.
+
+    A region is a run of cells at or above threshold - hysteresis that contains at least one
+    cell above threshold; regions separated by less than min_gap seconds are joined. Returns
+    region entries with the same keys as segment results, so the retune stage reads either.
+    """
+    above_low = cell_confidences >= threshold - hysteresis
+    edges = np.diff(np.concatenate([[False], above_low, [False]]).astype(np.int8))
+    run_starts, run_ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    if not len(run_starts):
+        return []
+
+    peaks = np.maximum.reduceat(cell_confidences, run_starts)
+    keep = peaks > threshold
+    run_starts, run_ends, peaks = run_starts[keep], run_ends[keep], peaks[keep]
+    if not len(run_starts):
+        return []
+
+    starts, ends = cell_starts[run_starts], cell_starts[run_ends - 1] + cell_length
+    joined = np.concatenate([[True], starts[1:] - ends[:-1] >= min_gap])  # True opens a new region
+    groups = np.cumsum(joined) - 1
+    group_starts = np.flatnonzero(joined)
+
+    return [{
+        "segment": f"region_{k}",
+        "start_time": round(float(starts[first]), 2),
+        "end_time": round(float(ends[groups == k][-1]), 2),
+        "overstimulating": True,
+        "confidence": round(float(peaks[groups == k].max()), 4),
+    } for k, first in enumerate(group_starts)]
+
+def detect_regions(window_results, segment_length=4.0, window_hop=None, threshold=0.75, hysteresis=0.15,
+                   min_gap=0.0, reduce="mean"):
+    """Aggregates per-window results onto a timeline and returns the compact list of regions to retune."""
+    cell_starts, cell_confidences = confidence_timeline(window_results, segment_length, window_hop, reduce)
+    hop = segment_length if window_hop is None else window_hop
+    return merge_regions(cell_starts, cell_confidences, hop, threshold, hysteresis, min_gap)
 
 def save_and_print_results(overstim_results, output_json_path="overstimulating_segments.json"):
     """
@@ -0,0 +1,101 @@
+import os
+import random
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+# Export format -> file suffix
+EXPORT_FORMATS = {"tflite-float16": ".tflite", "tflite-int8": ".tflite", "onnx": ".onnx"}
+
+INPUT_SIGNATURE = [tf.TensorSpec(shape=(None, 224, 224, 3), dtype=tf.float32, name="spectrogram")]
+
+
+def sample_spectrogram_images(image_folder, num_samples=None, seed=0):
+    """
+    Loads spectrogram PNGs from a folder tree (e.g. the dataset's val/ split) as an (N, 224, 224, 3) array.
+
+    Images are preprocessed exactly like detect_overstimulating_segments. With num_samples set,
+    a fixed random subset is drawn so calibration and benchmarks are reproducible.
+    """
+    paths = sorted(os.path.join(root, name) for root, _, files in os.walk(image_folder)
+                   for name in files if name.endswith(".png"))
+    if not paths:
+        raise ValueError(f"No spectrogram images found under '{image_folder}'")
+    if num_samples is not None and num_samples < len(paths):
+        paths = sorted(random.Random(seed).sample(paths, num_samples))
+
+    images = [np.asarray(Image.open(path).convert("RGB").resize((224, 224)), dtype=np.float32) / 255.0
+              for path in paths]
+    return np.stack(images)
+
+
+def inference_fn(ai_model):
+    """Wraps the model with a dynamic batch dimension, the entry point the ONNX converter traces."""
+    return tf.function(lambda batch: ai_model(batch, training=False), input_signature=INPUT_SIGNATURE)
+
+
+def export_tflite(ai_model, output_path, quantization="float16", calibration_images=None):
+    """
+    Converts the Keras model to TFLite with float16 weights or post-training int8 quantization.
+
+    int8 needs calibration_images, a few hundred real spectrograms used to measure activation
+    ranges. Inputs and outputs stay float32 so the backend can be swapped without other changes.
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(ai_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        if calibration_images is None or not len(calibration_images):
+            raise ValueError("int8 quantization needs calibration spectrograms")
+
+        def representative_dataset():
+            for image in calibration_images:
+                yield [image[np.newaxis].astype(np.float32)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    else:
+        raise ValueError(f"Unknown quantization '{quantization}'; expected 'float16' or 'int8'")
+
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+    return output_path
+
+
+def export_onnx(ai_model, output_path, opset=17):
+    """Converts the Keras model to ONNX through tf2onnx."""
+    import tf2onnx
+
+    tf2onnx.convert.from_function(inference_fn(ai_model), input_signature=INPUT_SIGNATURE, opset=opset,
+                                  output_path=output_path)
+    return output_path
+
+
+def export_model(model_path, output_folder, formats=tuple(EXPORT_FORMATS), calibration_folder=None,
+                 calibration_samples=200):
+    """Exports a trained Keras model to each requested format and returns {format: path}."""
+    ai_model = tf.keras.models.load_model(model_path)
+    os.makedirs(output_folder, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+
+    exported = {}
+    for export_format in formats:
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format '{export_format}'; expected one of {sorted(EXPORT_FORMATS)}")
+        output_path = os.path.join(output_folder, f"{stem}.{export_format.replace('tflite-', '')}"
+                                                  f"{EXPORT_FORMATS[export_format]}")
+
+        if export_format == "onnx":
+            export_onnx(ai_model, output_path)
+        elif export_format == "tflite-int8":
+            if calibration_folder is None:
+                raise ValueError("tflite-int8 export needs a calibration folder of spectrogram images")
+            calibration_images = sample_spectrogram_images(calibration_folder, calibration_samples)
+            export_tflite(ai_model, output_path, "int8", calibration_images)
+        else:
+            export_tflite(ai_model, output_path, "float16")
+
+        exported[export_format] = output_path
+        print(f"Exported {export_format} model to {output_path} ({os.path.getsize(output_path) / 1e6:.1f} MB)")
+    return exported
@@ -1,34 +1,58 @@
-from moviepy import VideoFileClip, AudioFileClip
 import os
-from pydub import AudioSegment
-import librosa
-import librosa.display
 import numpy as np
-import matplotlib.pyplot as plt
-from PIL import Image
+from functools import lru_cache
+from appflow.audioBuffer import AudioBuffer, load_audio_buffer, mux_audio
+from appflow.spectralAnalysis import load_spectrum
+from appflow.tracing import traced
 
+# moviepy, matplotlib.pyplot and librosa.display are imported inside the functions that
+# render or encode, so analysis-only callers do not pay for them at import time.
 
-def extract_audio(mp4_path, output_mp3):
-    """Extracts audio from an MP4 file and saves it as an MP3."""
-    with VideoFileClip(mp4_path) as video_clip:
-        with video_clip.audio as audio_clip:
-            audio_clip.write_audiofile(output_mp3)
-    print(f"Extracted audio saved: {output_mp3}")
+# Time columns kept for the full-track overview: twice the 1000 pixel width of the image
+FULL_SPECTROGRAM_COLUMNS = 2000
 
 
-def boost_volume(input_mp3, output_mp3, gain_db=20):
-    """Boosts the volume of an MP3 file."""
-    audio = AudioSegment.from_mp3(input_mp3) + gain_db
-    audio.export(output_mp3, format="mp3")
-    print(f"Boosted audio saved: {output_mp3}")
+@lru_cache(maxsize=None)
+def magma_lut():
+    """Returns the magma colormap as a 256-entry RGB lookup table, matching what specshow(cmap='magma') renders."""
+    from matplotlib import colormaps
+    return colormaps["magma"](np.linspace(0, 1, 256))[:, :3].astype(np.float32)
+
+
+@traced("extract_audio")
+def extract_audio(mp4_path, output_mp3=None):
+    """Decodes the audio of an MP4 file into an AudioBuffer, saving it as an MP3 only if a path is given."""
+    audio = AudioBuffer.from_video(mp4_path)
+    if output_mp3:
+        audio.write(output_mp3)
+        print(f"Extracted audio saved: {output_mp3}")
+    return audio
+
+
+@traced("boost")
+def boost_volume(input_audio, output_mp3=None, gain_db=20):
+    """Boosts the volume of an AudioBuffer (or MP3 file), saving it as an MP3 only if a path is given."""
+    boosted = load_audio_buffer(input_audio).with_gain(gain_db)
+    if output_mp3:
+        boosted.write(output_mp3)
+        print(f"Boosted audio saved: {output_mp3}")
+    return boosted
 
 
 def generate_full_spectrogram(input_mp3, output_img):
-    """Generates the full spectrogram from the boosted MP3 file and saves it."""
-    y, sr = librosa.load(input_mp3, sr=None)
-    D = np.abs(librosa.stft(y))
+    """Generates the full spectrogram from the boosted MP3 file (or its TrackSpectrum) and saves it."""
+    spectrum = load_spectrum(input_mp3)
+    render_full_spectrogram(spectrum.full_db(FULL_SPECTROGRAM_COLUMNS), spectrum.sr, output_img)
+
+
+@traced("render_full_spectrogram")
+def render_full_spectrogram(S_db, sr, output_img):
+    """Renders a full-track dB spectrogram as the 10x5 inch overview image."""
+    import librosa.display
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots(figsize=(10, 5), dpi=100)
-    librosa.display.specshow(librosa.amplitude_to_db(D, ref=np.max), sr=sr, cmap='magma', ax=ax)
+    librosa.display.specshow(S_db, sr=sr, cmap='magma', ax=ax)
     ax.axis("off")
     plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
     fig.savefig(output_img, transparent=True)
@@ -36,52 +60,138 @@ def generate_full_spectrogram(input_mp3, output_img):
     print(f"Full spectrogram saved: {output_img}")
 
 
+@traced("render_segment_pngs")
 def segment_spectrogram(input_mp3, output_folder, segment_length=4, img_size=(224, 224)):
-    """Segments the spectrogram into chunks of 4 seconds and saves each as a resized image."""
-    y, sr = librosa.load(input_mp3, sr=None)
-    segment_samples = int(segment_length * sr)
-    num_segments = len(y) // segment_samples
-
-    for i in range(num_segments + 1):
-        start = i * segment_samples
-        end = start + segment_samples
-        if start >= len(y):
-            break
-
-        segment = y[start:end]
-        D = np.abs(librosa.stft(segment))
-        fig, ax = plt.subplots(figsize=(5, 5), dpi=100)
-        librosa.display.specshow(librosa.amplitude_to_db(D, ref=np.max), sr=sr, cmap='magma', ax=ax)
+    """
+    Segments the spectrogram into chunks of 4 seconds and saves each as a resized image.
+
+    Figures are drawn on their own Agg canvas rather than through pyplot, so segments can be
+    rendered from any thread without touching pyplot's global figure state.
+    """
+    import librosa.display
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from PIL import Image
+
+    spectrum = load_spectrum(input_mp3, segment_length)
+
+    for i in range(spectrum.num_segments):
+        fig = Figure(figsize=(5, 5), dpi=100)
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
+        librosa.display.specshow(spectrum.segment_db(i), sr=spectrum.sr, cmap='magma', ax=ax)
         ax.axis("off")
-        plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
+        fig.subplots_adjust(left=0, right=1, top=1, bottom=0)
 
         temp_output = os.path.join(output_folder, f"segment_{i}.png")
         fig.savefig(temp_output, transparent=True)
-        plt.close(fig)
 
         img = Image.open(temp_output).convert("RGB").resize(img_size, Image.LANCZOS)
         img.save(temp_output)
         print(f"Segment {i} spectrogram saved: {temp_output}")
 
 
+@lru_cache(maxsize=None)
+def lanczos_weights(in_size, out_size, a=3):
+    """Builds the (out_size, in_size) Lanczos resampling matrix, antialiased like PIL's LANCZOS filter."""
+    scale = in_size / out_size
+    support = a * max(scale, 1.0)
+    centers = (np.arange(out_size) + 0.5) * scale
+    positions = np.arange(in_size) + 0.5
+    x = (positions[None, :] - centers[:, None]) / max(scale, 1.0)
+    weights = np.sinc(x) * np.sinc(x / a)
+    weights[np.abs(positions[None, :] - centers[:, None]) >= support] = 0.0
+    weights /= weights.sum(axis=1, keepdims=True)
+    return weights.astype(np.float32)
+
+
+@traced("render_spectrogram_image")
+def spectrogram_to_image(S_db, img_size=(224, 224)):
+    """Colorizes a dB spectrogram with magma and resizes it to an (H, W, 3) float32 array in [0, 1]."""
+    vmin, vmax = S_db.min(), S_db.max()
+    if vmax > vmin:
+        norm = (S_db - vmin) / (vmax - vmin)
+    else:
+        norm = np.zeros_like(S_db)
+
+    # specshow draws low frequencies at the bottom, so the first image row is the highest bin
+    indices = np.clip((norm[::-1] * 256).astype(np.int32), 0, 255)
+    rgb = magma_lut()[indices]
+
+    width, height = img_size
+    n_rows, n_cols = indices.shape
+    rows = lanczos_weights(n_rows, height) @ rgb.reshape(n_rows, -1)
+    img = np.matmul(rows.reshape(height, n_cols, 3).transpose(0, 2, 1), lanczos_weights(n_cols, width).T)
+    return np.clip(img.transpose(0, 2, 1), 0.0, 1.0)
+
+
+def segment_spectrogram_tensors(input_mp3, segment_length=4, img_size=(224, 224), window_hop=None):
+    """
+    Segments the spectrogram into chunks of 4 seconds and returns them as an (N, H, W, 3) float32 array.
+
+    With window_hop, chunks are overlapping windows starting every window_hop seconds.
+    """
+    spectrum = load_spectrum(input_mp3, segment_length, window_hop)
+
+    width, height = img_size
+    spectrograms = np.empty((spectrum.num_segments, height, width, 3), dtype=np.float32)
+    for i in range(spectrum.num_segments):
+        spectrograms[i] = spectrogram_to_image(spectrum.segment_db(i), img_size)
+    return spectrograms
+
+
+def compare_spectrogram_paths(input_mp3, output_folder, segment_length=4, img_size=(224, 224), tolerance=0.05):
+    """Checks the in-memory spectrograms against the rendered PNG segments and reports pixel differences."""
+    from PIL import Image
+
+    os.makedirs(output_folder, exist_ok=True)
+    spectrum = load_spectrum(input_mp3, segment_length)
+    segment_spectrogram(spectrum, output_folder, segment_length, img_size)
+    spectrograms = segment_spectrogram_tensors(spectrum, segment_length, img_size)
+
+    mean_errors = []
+    for i, tensor in enumerate(spectrograms):
+        png = Image.open(os.path.join(output_folder, f"segment_{i}.png")).convert("RGB")
+        png_array = np.asarray(png, dtype=np.float32) / 255.0
+        mean_errors.append(float(np.mean(np.abs(png_array - tensor))))
+
+    worst = max(mean_errors, default=0.0)
+    print(f"Spectrogram parity: {len(mean_errors)} segments, worst mean abs difference {worst:.4f} "
+          f"(tolerance {tolerance})")
+    return worst <= tolerance, mean_errors
+
+
+@traced("mux_boosted")
 def attach_boosted_audio(mp4_path, boosted_mp3, output_mp4):
-    """Attaches the boosted audio back to the original video."""
-    with VideoFileClip(mp4_path) as video_clip:
-        new_audio = AudioFileClip(boosted_mp3)
-        final_video = video_clip.with_audio(new_audio)
-        final_video.write_videofile(output_mp4, codec="libx264", audio_codec="aac")
+    """Attaches the boosted audio (an AudioBuffer or MP3 path) back to the original video, copying its frames."""
+    mux_audio(mp4_path, boosted_mp3, output_mp4)
     print(f"Final video with boosted audio saved: {output_mp4}")
 
 
 def process_video(mp4_path, output_mp3, full_spectrogram_img, output_folder, output_mp4):
-    """Extracts, boosts, generates spectrograms, and reattaches boosted audio to the video."""
-    extract_audio(mp4_path, output_mp3)
-    boosted_mp3 = output_mp3.replace(".mp3", "_boosted.mp3")
-    boost_volume(output_mp3, boosted_mp3)
-    generate_full_spectrogram(boosted_mp3, full_spectrogram_img)
-    segment_spectrogram(boosted_mp3, output_folder)
-    attach_boosted_audio(mp4_path, boosted_mp3, output_mp4)
-    return boosted_mp3, full_spectrogram_img, output_mp4
+    """
+    Extracts, boosts, generates spectrograms, and reattaches boosted audio to the video.
+
+    The audio is decoded once into an AudioBuffer that every stage shares. The extracted and
+    boosted MP3s, full spectrogram, segment PNGs and boosted MP4 are each produced only when
+    their path is given. Segment spectrograms are returned as an in-memory (N, 224, 224, 3)
+    array ready for detection, alongside the boosted AudioBuffer. See videoPipeline for
+    building a chosen set of outputs.
+    """
+    audio = extract_audio(mp4_path, output_mp3)
+    boosted_mp3 = output_mp3.replace(".mp3", "_boosted.mp3") if output_mp3 else None
+    boosted = boost_volume(audio, boosted_mp3)
+
+    # Transform the boosted track once; every spectrogram view derives from it
+    spectrum = load_spectrum(boosted)
+    if full_spectrogram_img is not None:
+        generate_full_spectrogram(spectrum, full_spectrogram_img)
+    spectrograms = segment_spectrogram_tensors(spectrum)
+    if output_folder is not None:
+        segment_spectrogram(spectrum, output_folder)
+    if output_mp4 is not None:
+        attach_boosted_audio(mp4_path, boosted, output_mp4)
+    return boosted, full_spectrogram_img, output_mp4, spectrograms
 
 
 # # Example usage
@@ -97,7 +207,7 @@ def process_video(mp4_path, output_mp3, full_spectrogram_img, output_folder, out
 #     os.makedirs(output_segments_folder)
 #
 # # Process the video
-# boosted_audio, full_spectrogram, final_video = process_video(mp4_file, output_mp3, full_spectrogram_img,
+# boosted_audio, full_spectrogram, final_video, spectrograms = process_video(mp4_file, output_mp3, full_spectrogram_img,
 #                                                              output_segments_folder, output_mp4)
 #
 # print("Processing complete!")
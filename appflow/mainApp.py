@@ -1,8 +1,8 @@
 import os
 import sys
 
-from PyQt5.QtGui import QPixmap, QFont, QIcon
-from PyQt5.QtCore import Qt, QUrl
+from PyQt5.QtGui import QPixmap, QFont, QIcon, QPainter, QColor
+from PyQt5.QtCore import Qt, QUrl, QThread, pyqtSignal
 from PyQt5.QtMultimedia import QMediaContent, QMediaPlayer
 from PyQt5.QtMultimediaWidgets import QVideoWidget
 from PyQt5.QtWidgets import (
@@ -10,7 +10,99 @@ from PyQt5.QtWidgets import (
     QMainWindow, QStackedWidget, QProgressBar, QSpacerItem, QSizePolicy
 )
 
-from appflow.extractSpectroSound import process_video
+import threading
+
+from appflow.videoPipeline import PipelineCancelled, run_pipeline
+
+
+class ModelLoaderThread(QThread):
+    loaded = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, model_path="overstimulating_audio_detector.h5", parent=None):
+        super().__init__(parent)
+        self.model_path = model_path
+        self.model = None
+
+    def run(self):
+        try:
+            # The model and its runtime load here, so the window opens before they have loaded
+            from appflow.detectModel import load_ai_model
+            self.model = load_ai_model(self.model_path, exit_on_error=False)
+            self.loaded.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class DetectionTimeline(QWidget):
+    """Strip of one cell per analysis window, coloured as the windows are scored (they arrive in order)."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setFixedSize(400, 24)
+        self.reset()
+
+    def reset(self, total=0):
+        self.total = total
+        self.results = []
+        self.update()
+
+    def add_result(self, result):
+        self.results.append(result)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("#D9E8D4"))  # Not scored yet
+        if not self.total:
+            return
+        cell_width = self.width() / self.total
+        for index, result in enumerate(self.results):
+            if result["overstimulating"]:
+                color = QColor("#8C1C13")
+            else:
+                # Darker green for windows closer to the threshold
+                color = QColor("#78D35F").darker(100 + int(60 * result["confidence"]))
+            x = int(index * cell_width)
+            painter.fillRect(x, 0, max(1, int((index + 1) * cell_width) - x), self.height(), color)
+
+
+class PipelineWorker(QThread):
+    stage_progress = pyqtSignal(str, int, int)  # stage, stages finished, stages in the run
+    segment_progress = pyqtSignal(int, int)  # windows scored, windows in the track
+    segment_scored = pyqtSignal(dict)  # one window result, as soon as it is scored
+    completed = pyqtSignal(dict)
+    cancelled = pyqtSignal()
+    error = pyqtSignal(str)
+
+    def __init__(self, file_path, outputs, paths, model_loader, parent=None):
+        super().__init__(parent)
+        self.file_path = file_path
+        self.outputs = outputs
+        self.paths = paths
+        self.model_loader = model_loader
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def on_stage(self, stage, status, finished, total):
+        if status == "started":
+            self.stage_progress.emit(stage, finished, total)
+
+    def run(self):
+        try:
+            # Use the preloaded model, waiting here (not on the UI thread) if it is still loading;
+            # if the preload failed, the pipeline loads the model itself
+            self.model_loader.wait()
+            produced, _ = run_pipeline(self.file_path, self.outputs, self.paths, ai_model=self.model_loader.model,
+                                       cancel_event=self.cancel_event, on_stage=self.on_stage,
+                                       on_segment=self.segment_progress.emit, on_result=self.segment_scored.emit)
+            self.completed.emit(produced)
+        except PipelineCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.error.emit(str(e))
 
 
 class MainApp(QMainWindow):
@@ -41,6 +133,24 @@ class MainApp(QMainWindow):
 
         self.stacked_widget.setCurrentWidget(self.main_page)
 
+        # Load the detection model in the background while the user is still picking a file; the
+        # loader holds it, and pipeline workers wait on the loader for it
+        self.worker = None
+        self.start_model_preload()
+
+    def start_model_preload(self):
+        self.model_status_label.setText("Loading detection model...")
+        self.model_loader = ModelLoaderThread(parent=self)
+        self.model_loader.loaded.connect(self.on_model_loaded)
+        self.model_loader.failed.connect(self.on_model_failed)
+        self.model_loader.start()
+
+    def on_model_loaded(self):
+        self.model_status_label.setText("Detection model ready")
+
+    def on_model_failed(self, error_message):
+        self.model_status_label.setText(f"Detection model failed to load: {error_message}")
+
     def setup_main_page(self):
         layout = QVBoxLayout(self.main_page)
 
@@ -163,6 +273,15 @@ class MainApp(QMainWindow):
         self.upload_btn.clicked.connect(self.upload_video)
         layout.addWidget(self.upload_btn, alignment=Qt.AlignCenter)
 
+        # Cancel Button, shown while a video is being processed
+        self.cancel_btn = QPushButton("CANCEL")
+        self.cancel_btn.setFont(QFont("Arial", 14, QFont.Bold))
+        self.cancel_btn.setStyleSheet("background-color: #8C1C13; color: #F1FBEF; padding: 10px; border-radius: 10px;")
+        self.cancel_btn.setFixedSize(200, 60)
+        self.cancel_btn.clicked.connect(self.cancel_processing)
+        self.cancel_btn.setVisible(False)
+        layout.addWidget(self.cancel_btn, alignment=Qt.AlignCenter)
+
         # Add some space between upload button and progress bar
         layout.addSpacing(20)  # Adjust spacing as needed
 
@@ -185,6 +304,18 @@ class MainApp(QMainWindow):
         self.progress_bar.setVisible(False)
         layout.addWidget(self.progress_bar, alignment=Qt.AlignCenter)
 
+        # Window scores, filled in while detection runs
+        self.timeline = DetectionTimeline()
+        self.timeline.setVisible(False)
+        layout.addWidget(self.timeline, alignment=Qt.AlignCenter)
+
+        # Detection model load status
+        self.model_status_label = QLabel()
+        self.model_status_label.setFont(QFont("Arial", 12))
+        self.model_status_label.setStyleSheet("color: #1A3C10;")
+        self.model_status_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.model_status_label, alignment=Qt.AlignCenter)
+
         # Add spacing at the bottom for better layout flow
         layout.addStretch()
 
@@ -287,9 +418,7 @@ class MainApp(QMainWindow):
         self.media_player_bottom = QMediaPlayer(None, QMediaPlayer.VideoSurface)
         self.media_player_bottom.setVideoOutput(self.video_widget_bottom)
 
-        # Load video file into bottom player
-        video_path = "app-test-retuned.mp4"  # Replace with the actual video path
-        self.media_player_bottom.setMedia(QMediaContent(QUrl.fromLocalFile(video_path)))
+        # The retuned video is loaded into the bottom player once processing has finished
 
         # Add video widget to the rounded container (Bottom Box)
         video_container_bottom_layout.addWidget(self.video_widget_bottom)
@@ -323,53 +452,78 @@ class MainApp(QMainWindow):
     def go_to_upload_page(self):
         self.stacked_widget.setCurrentWidget(self.upload_page)
 
-    from extractSpectroSound import process_video
-
-
-    def load_and_detect_segments(self):
-        from detectModel import load_ai_model, detect_overstimulating_segments, save_and_print_results
-        ai_model = load_ai_model()
-        segment_folder = "spectrogram_segments"  # Folder containing segmented spectrogram images
-
-        # Detect overstimulating segments
-        overstim_results = detect_overstimulating_segments(segment_folder, ai_model)
-        save_and_print_results(overstim_results)
-
-    def retune_and_display(self, fileName):
-        from retunedDetected import load_overstim_segments, retune_audio, attach_audio_to_video
-        json_file = "overstimulating_segments.json"
-        input_audio = "extracted_audio_boosted.mp3"
-        output_audio = "retuned_audio.mp3"
-        input_video = fileName
-        output_video = "app-test-retuned.mp4"
-
-        overstim_segments = load_overstim_segments(json_file)
-        retune_audio(input_audio, output_audio, overstim_segments)
-        attach_audio_to_video(input_video, output_audio, output_video)
-
     def upload_video(self):
         options = QFileDialog.Options()
         file_name, _ = QFileDialog.getOpenFileName(self, "Open Video File", "", "MP4 Files (*.mp4)", options=options)
         if file_name:
-            output_mp3 = "extracted_audio.mp3"
-            full_spectrogram_img = "full_spectrogram.png"
-            output_segments_folder = "spectrogram_segments"
-            output_mp4 = "original-boosted.mp4"
-
-            # Ensure the output folder exists
-            if not os.path.exists(output_segments_folder):
-                os.makedirs(output_segments_folder)
-
-            process_video(file_name, output_mp3, full_spectrogram_img, output_segments_folder, output_mp4)
-
-            self.video_path = output_mp4  # Store the selected video path
+            # Only what the results page shows is produced; MP3s, spectrogram images and segment
+            # PNGs are written only when AKIRA_DEBUG_ARTIFACTS=1
+            outputs = {"boosted_mp4", "detection_json", "retuned_mp4"}
+            paths = {"boosted_mp4": "original-boosted.mp4", "retuned_mp4": "app-test-retuned.mp4"}
+
+            # The whole job runs on a worker thread; the window stays responsive and can cancel it
+            self.worker = PipelineWorker(file_name, outputs, paths, self.model_loader, parent=self)
+            self.worker.stage_progress.connect(self.on_stage_progress)
+            self.worker.segment_progress.connect(self.on_segment_progress)
+            self.worker.segment_scored.connect(self.timeline.add_result)
+            self.worker.completed.connect(self.on_processing_completed)
+            self.worker.cancelled.connect(self.on_processing_cancelled)
+            self.worker.error.connect(self.on_processing_error)
+
+            self.upload_btn.setEnabled(False)
+            self.cancel_btn.setEnabled(True)
+            self.cancel_btn.setVisible(True)
+            self.progress_bar.setRange(0, 1)
+            self.progress_bar.setValue(0)
+            self.progress_bar.setFormat("Starting...")
             self.progress_bar.setVisible(True)
-            self.progress_bar.setValue(100)  # Simulating upload completion
-            self.stacked_widget.setCurrentWidget(self.results_page)
-            # Load video into the media player
-            self.media_player.setMedia(QMediaContent(QUrl.fromLocalFile(self.video_path)))
-            self.load_and_detect_segments()
-            self.retune_and_display(file_name)
+            self.timeline.reset()
+            self.timeline.setVisible(True)
+            self.worker.start()
+
+    def cancel_processing(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.progress_bar.setFormat("Cancelling...")
+
+    def on_stage_progress(self, stage, finished, total):
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(finished)
+        self.progress_bar.setFormat(f"{stage.replace('_', ' ').capitalize()} (%v/%m stages)")
+
+    def on_segment_progress(self, done, total):
+        if self.timeline.total != total:
+            self.timeline.total = total
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+        self.progress_bar.setFormat("Scoring segments (%v/%m)")
+
+    def finish_processing(self):
+        self.upload_btn.setEnabled(True)
+        self.cancel_btn.setVisible(False)
+        self.worker = None
+
+    def on_processing_completed(self, produced):
+        self.finish_processing()
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(1)
+        self.progress_bar.setFormat("Done")
+
+        self.video_path = produced["boosted_mp4"]  # Store the selected video path
+        self.stacked_widget.setCurrentWidget(self.results_page)
+        # Load both videos into the media players
+        self.media_player.setMedia(QMediaContent(QUrl.fromLocalFile(self.video_path)))
+        self.media_player_bottom.setMedia(QMediaContent(QUrl.fromLocalFile(produced["retuned_mp4"])))
+
+    def on_processing_cancelled(self):
+        self.finish_processing()
+        self.progress_bar.setVisible(False)
+        self.timeline.setVisible(False)
+
+    def on_processing_error(self, error_message):
+        self.finish_processing()
+        self.progress_bar.setFormat(f"Failed: {error_message}")
 
     def play_video(self):
         if self.media_player.state() == QMediaPlayer.PlayingState:
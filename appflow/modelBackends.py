@@ -0,0 +1,189 @@
+import os
+import statistics
+import time
+import numpy as np
+
+# Model file suffix -> backend that can run it
+MODEL_SUFFIXES = {".h5": "keras", ".keras": "keras", ".tflite": "tflite", ".onnx": "onnx"}
+
+
+class InferenceBackend:
+    """
+    Scores batches of (N, 224, 224, 3) float32 spectrograms and returns N confidences.
+
+    Subclasses implement run_batch. predict_batch times every call, so latency_report can give
+    the steady-state latency per batch; warm_up runs a throwaway batch that is not counted.
+    """
+
+    name = None
+
+    def __init__(self):
+        self.batch_latencies = []
+
+    def run_batch(self, batch):
+        raise NotImplementedError
+
+    def predict_batch(self, batch):
+        started = time.perf_counter()
+        confidences = self.run_batch(batch)
+        self.batch_latencies.append((time.perf_counter() - started, len(confidences)))
+        return confidences
+
+    def warm_up(self, batch_size=1, input_shape=(224, 224, 3)):
+        """Pays graph building and buffer allocation at load time instead of on the first scored segment."""
+        self.run_batch(np.zeros((batch_size, *input_shape), dtype=np.float32))
+
+    def latency_report(self, reset=True):
+        """Summarises the batches scored since the last report, or returns None if there were none."""
+        latencies, self.batch_latencies = self.batch_latencies, ([] if reset else self.batch_latencies)
+        if not latencies:
+            return None
+        seconds = [latency for latency, _ in latencies]
+        images = sum(size for _, size in latencies)
+        return {
+            "backend": self.name,
+            "batches": len(latencies),
+            "images": images,
+            "batch_p50_ms": round(statistics.median(seconds) * 1000, 2),
+            "batch_p95_ms": round(float(np.percentile(seconds, 95)) * 1000, 2),
+            "image_mean_ms": round(sum(seconds) / images * 1000, 2),
+            "images_per_second": round(images / sum(seconds), 1),
+        }
+
+
+class KerasBackend(InferenceBackend):
+    """
+    Runs the full-precision Keras model through a tf.function traced once for any batch size.
+
+    Batches are copied into a preallocated float32 buffer that is reused across calls. With
+    jit_compile, the function is compiled by XLA; XLA specialises on the input shape, so every
+    batch is padded to the buffer size and only one program is ever compiled.
+    """
+
+    name = "keras"
+
+    def __init__(self, ai_model, input_shape=(224, 224, 3), jit_compile=False, batch_size=1):
+        import tensorflow as tf
+
+        super().__init__()
+        self.model = ai_model
+        self.jit_compile = jit_compile
+        self.buffer = np.zeros((batch_size, *input_shape), dtype=np.float32)
+
+        @tf.function(input_signature=[tf.TensorSpec(shape=(None, *input_shape), dtype=tf.float32)],
+                     jit_compile=jit_compile)
+        def infer(batch):
+            return ai_model(batch, training=False)
+
+        self.infer = infer
+
+    @classmethod
+    def from_file(cls, model_path, num_threads=None, jit_compile=False, batch_size=1):
+        import tensorflow as tf
+
+        if num_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+        return cls(tf.keras.models.load_model(model_path), jit_compile=jit_compile, batch_size=batch_size)
+
+    def run_batch(self, batch):
+        size = len(batch)
+        if size > len(self.buffer):
+            self.buffer = np.zeros((size, *self.buffer.shape[1:]), dtype=np.float32)
+        np.copyto(self.buffer[:size], batch, casting="unsafe")
+        inputs = self.buffer if self.jit_compile else self.buffer[:size]
+        return self.infer(inputs).numpy()[:size, 0]
+
+
+class TFLiteBackend(InferenceBackend):
+    """Runs an exported float16 or int8 TFLite model, resizing the interpreter when the batch size changes."""
+
+    name = "tflite"
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        super().__init__()
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = None
+
+    @classmethod
+    def from_file(cls, model_path, num_threads=None, **options):
+        return cls(model_path, num_threads)
+
+    def run_batch(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        if len(batch) != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input["index"], batch.shape)
+            self.interpreter.allocate_tensors()
+            self.input = self.interpreter.get_input_details()[0]
+            self.output = self.interpreter.get_output_details()[0]
+            self.batch_size = len(batch)
+
+        # Fully quantized models take and return integers; map them through the tensor scales
+        scale, zero_point = self.input["quantization"]
+        if self.input["dtype"] != np.float32 and scale:
+            batch = np.round(batch / scale + zero_point).astype(self.input["dtype"])
+        self.interpreter.set_tensor(self.input["index"], batch)
+        self.interpreter.invoke()
+
+        confidences = self.interpreter.get_tensor(self.output["index"])[:, 0].astype(np.float32)
+        scale, zero_point = self.output["quantization"]
+        if self.output["dtype"] != np.float32 and scale:
+            confidences = (confidences - zero_point) * scale
+        return confidences
+
+
+class ONNXBackend(InferenceBackend):
+    """Runs an exported ONNX model on the onnxruntime CPU execution provider."""
+
+    name = "onnx"
+
+    def __init__(self, model_path, num_threads=None):
+        import onnxruntime as ort
+
+        super().__init__()
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    @classmethod
+    def from_file(cls, model_path, num_threads=None, **options):
+        return cls(model_path, num_threads)
+
+    def run_batch(self, batch):
+        outputs = self.session.run(None, {self.input_name: np.asarray(batch, dtype=np.float32)})
+        return outputs[0][:, 0].astype(np.float32)
+
+
+BACKENDS = {backend.name: backend for backend in (KerasBackend, TFLiteBackend, ONNXBackend)}
+
+
+def backend_name_for(model_path):
+    """Picks the backend from the model file suffix."""
+    suffix = os.path.splitext(model_path)[1].lower()
+    if suffix not in MODEL_SUFFIXES:
+        raise ValueError(f"Cannot tell the backend of '{model_path}'; expected one of {sorted(MODEL_SUFFIXES)}")
+    return MODEL_SUFFIXES[suffix]
+
+
+def load_backend(model_path, backend=None, num_threads=None, jit_compile=False, batch_size=1, warm_up=True):
+    """
+    Loads a model file into the named backend, or the one matching its suffix when backend is None,
+    and runs a warm-up batch of batch_size. jit_compile (XLA) applies to the Keras backend only.
+    """
+    if backend is None:
+        backend = backend_name_for(model_path)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'; expected one of {sorted(BACKENDS)}")
+    loaded = BACKENDS[backend].from_file(model_path, num_threads, jit_compile=jit_compile, batch_size=batch_size)
+    if warm_up:
+        loaded.warm_up(batch_size)
+    return loaded
@@ -1,9 +1,12 @@
 import json
+from functools import lru_cache
 import librosa
-import soundfile as sf
 import numpy as np
-from moviepy import VideoFileClip, AudioFileClip  # Fixed import
-from scipy.signal import butter, lfilter
+import soundfile as sf
+from scipy.signal import butter, sosfilt
+from appflow.audioBuffer import AudioBuffer, load_audio_buffer, mux_audio, native_sample_rate
+from appflow.streamingAnalysis import iter_boosted_mono_blocks
+from appflow.tracing import traced
 
 def load_overstim_segments(json_file):
     """Loads detected overstimulating segments from a JSON file."""
@@ -14,80 +17,159 @@ def load_overstim_segments(json_file):
         print(f"Error loading JSON file: {e}")
         exit(1)
 
-def butter_filter(data, cutoff, fs, order=8, filter_type="low"):
-    """Applies a Butterworth filter to reduce unwanted frequencies."""
-    nyquist = 0.5 * fs
-    normal_cutoff = cutoff / nyquist
-    b, a = butter(order, normal_cutoff, btype=filter_type, analog=False)
-    return lfilter(b, a, data)
-
-def reduce_loudness(audio, factor=0.1):
-    """Reduces loudness by scaling amplitude."""
-    return audio * factor
-
-def fade_audio(audio, fade_length):
-    """Applies a fade-in and fade-out effect."""
-    fade = np.linspace(0, 1, fade_length)
-    audio[:fade_length] *= fade  # Fade-in
-    audio[-fade_length:] *= fade[::-1]  # Fade-out
-    return audio
-
-def compress_audio(audio):
-    """Applies dynamic range compression to balance loudness."""
-    return np.tanh(audio * 2.5)  # Adjusted to prevent excessive distortion
-
-def retune_audio(input_audio, output_audio, overstim_segments):
-    """Processes and retunes only overstimulating segments."""
-    y, sr = librosa.load(input_audio, sr=44100)
-
-    processed_segments = []
-    for segment in overstim_segments:
-        try:
-            start_time = float(segment.get("start_time", 0))
-            end_time = float(segment.get("end_time", 0))
-            segment_file = segment.get("segment", "Unknown")
-            overstim_status = segment.get("overstimulating", False)
-
-            if end_time > start_time:
-                start_sample = int(start_time * sr)
-                end_sample = int(end_time * sr)
-                segment_audio = y[start_sample:end_sample].copy()
-
-                if overstim_status:
-                    # Apply filtering
-                    segment_audio = butter_filter(segment_audio, cutoff=1500, fs=sr, filter_type="low")
-                    segment_audio = butter_filter(segment_audio, cutoff=400, fs=sr, filter_type="high")
-
-                    # Apply loudness reduction, fade, and compression
-                    segment_audio = reduce_loudness(segment_audio, factor=0.1)
-                    fade_length = min(int(0.75 * sr), len(segment_audio) // 2)  # Avoid out-of-bounds errors
-                    segment_audio = fade_audio(segment_audio, fade_length)
-                    segment_audio = compress_audio(segment_audio)
-
-                    processed_segments.append(f"Segment: {segment_file}, Time: {start_time:.1f} - {end_time:.1f}s, Overstimulating: True")
-
-                # Replace only the segment in the main audio (unmodified if not overstimulating)
-                y[start_sample:end_sample] = segment_audio
-
-        except Exception as e:
-            print(f"Skipping segment due to error: {e}")
-
-    sf.write(output_audio, y, sr)
-    print(f"✅ Retuned audio saved as: {output_audio}")
-
-    print("\n📌 Processed Overstimulating Segments:")
-    for segment in processed_segments:
-        print(segment)
-
+@lru_cache(maxsize=None)
+def retune_sos(sr, low_cutoff=400, high_cutoff=1500, order=8):
+    """
+    Designs the retune band-pass once per sample rate: the 8th-order Butterworth high-pass and
+    low-pass cascaded as second-order sections, which stay stable at this order where b, a does not.
+    """
+    high_pass = butter(order, low_cutoff, btype="high", fs=sr, output="sos")
+    low_pass = butter(order, high_cutoff, btype="low", fs=sr, output="sos")
+    return np.vstack([low_pass, high_pass]).astype(np.float32)
+
+def flagged_regions(overstim_segments, sr):
+    """Returns the sorted sample ranges of the overstimulating entries, merging touching or overlapping ones."""
+    spans = sorted((int(float(segment["start_time"]) * sr), int(float(segment["end_time"]) * sr))
+                   for segment in overstim_segments
+                   if segment.get("overstimulating", False)
+                   and float(segment.get("end_time", 0)) > float(segment.get("start_time", 0)))
+
+    regions = []
+    for start, end in spans:
+        if regions and start <= regions[-1][1]:
+            regions[-1][1] = max(regions[-1][1], end)
+        else:
+            regions.append([start, end])
+    return [tuple(region) for region in regions]
+
+class RetuneEngine:
+    """
+    Retunes the flagged regions of a mono float32 track in place, block by block, at its native sample rate.
+
+    The band-pass runs with its state carried across each whole region (and across block
+    boundaries), starting from state warmed up on the audio just before the region. The
+    quietened, compressed signal is crossfaded into and out of the original at the region edges.
+    """
+
+    def __init__(self, sr, overstim_segments, num_samples=None, factor=0.1, drive=2.5, fade_seconds=0.75,
+                 preroll_seconds=0.25):
+        self.sr = sr
+        self.sos = retune_sos(sr)
+        self.regions = flagged_regions(overstim_segments, sr)
+        if num_samples is not None:
+            # Regions running past the end of the track fade out where the track ends
+            self.regions = [(start, min(end, num_samples)) for start, end in self.regions if start < num_samples]
+        self.factor = np.float32(factor)
+        self.drive = np.float32(drive)
+        self.fade = int(fade_seconds * sr)
+        self.preroll = int(preroll_seconds * sr)
+        self.next_region = 0
+        self.zi = None
+        self.history = np.zeros(0, dtype=np.float32)
+
+    def warm_state(self, before):
+        """Runs the filter over the audio preceding a region so it starts in steady state."""
+        zi = np.zeros((len(self.sos), 2), dtype=np.float32)
+        if len(before):
+            _, zi = sosfilt(self.sos, before, zi=zi)
+        return zi
+
+    @traced("filter")
+    def process(self, block, block_start):
+        """Retunes the flagged part of one block, which starts at sample block_start, in place."""
+        block_end = block_start + len(block)
+        while self.next_region < len(self.regions):
+            region_start, region_end = self.regions[self.next_region]
+            if region_start >= block_end:
+                break
+
+            lo, hi = max(region_start, block_start), min(region_end, block_end)
+            if lo == region_start:
+                offset = region_start - block_start
+                before = np.concatenate([self.history, block[max(offset - self.preroll, 0):offset]])
+                self.zi = self.warm_state(before[len(before) - self.preroll:])
+
+            x = block[lo - block_start:hi - block_start]
+            retuned, self.zi = sosfilt(self.sos, x, zi=self.zi)
+            retuned *= self.factor * self.drive
+            np.tanh(retuned, out=retuned)
+
+            # Crossfade from the original into the retuned signal and back at the region edges
+            fade = min(self.fade, (region_end - region_start) // 2)
+            for edge_start, edge_end in ((region_start, region_start + fade), (region_end - fade, region_end)):
+                a, b = max(edge_start, lo), min(edge_end, hi)
+                if a < b:
+                    position = np.arange(a, b)
+                    weight = (np.minimum(position - region_start, region_end - 1 - position) / fade).astype(np.float32)
+                    edge, original = retuned[a - lo:b - lo], x[a - lo:b - lo]
+                    edge -= original
+                    edge *= weight
+                    edge += original
+            x[:] = retuned
+
+            if hi < region_end:
+                break
+            self.next_region += 1
+
+        history = np.concatenate([self.history, block[max(len(block) - self.preroll, 0):]])
+        self.history = history[len(history) - self.preroll:]
+        return block
+
+@traced("retune")
+def retune_audio(input_audio, output_audio, overstim_segments, sr=None):
+    """
+    Processes and retunes only overstimulating segments.
+
+    input_audio may be an AudioBuffer or an audio file path. The track is retuned at its own
+    sample rate unless sr asks for another one. The retuned mono audio is returned as an
+    AudioBuffer and only encoded to output_audio when a path is given.
+    """
+    audio = load_audio_buffer(input_audio)
+    y = audio.mono().copy()
+    if sr is None:
+        sr = audio.sr
+    elif audio.sr != sr:
+        y = librosa.resample(y, orig_sr=audio.sr, target_sr=sr)
+
+    engine = RetuneEngine(sr, overstim_segments, len(y))
+    engine.process(y, 0)
+
+    retuned = AudioBuffer(y, sr)
+    if output_audio:
+        retuned.write(output_audio)
+        print(f"✅ Retuned audio saved as: {output_audio}")
+
+    print("\n📌 Processed Overstimulating Regions:")
+    for start, end in engine.regions:
+        print(f"Region: {start / sr:.1f} - {end / sr:.1f}s, Overstimulating: True")
+
+    return retuned
+
+def retune_audio_stream(input_video, output_audio, overstim_segments, sr=None, gain_db=20, block_seconds=32):
+    """
+    Retunes the boosted audio of a video block by block and writes it progressively to output_audio.
+
+    The engine carries filter state and crossfade position across blocks, so memory is bounded
+    by one block and the result matches retune_audio on the whole track.
+    """
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    if sr is None:
+        sr = native_sample_rate(input_video)
+
+    num_samples = int(round(ffmpeg_parse_infos(input_video)["duration"] * sr))
+    engine = RetuneEngine(sr, overstim_segments, num_samples)
+    with sf.SoundFile(output_audio, "w", samplerate=sr, channels=1) as out:
+        for block_start, block in iter_boosted_mono_blocks(input_video, sr, int(block_seconds * sr), gain_db=gain_db):
+            out.write(engine.process(block, block_start))
+
+    print(f"✅ Retuned audio streamed to: {output_audio}")
+
+@traced("mux_retuned")
 def attach_audio_to_video(input_video, output_audio, output_video):
-    """Attaches retuned audio to video."""
+    """Attaches retuned audio (an AudioBuffer or audio file path) to video, copying the video stream unchanged."""
     try:
-        video = VideoFileClip(input_video)
-        audio = AudioFileClip(output_audio)
-
-        video = video.with_audio(audio)
-        video.write_videofile(output_video, codec="libx264", audio_codec="aac")
-
+        mux_audio(input_video, output_audio, output_video)
         print(f"✅ Retuned video saved as: {output_video}")
     except Exception as e:
         print(f"Error processing video: {e}")
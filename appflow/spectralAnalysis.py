@@ -0,0 +1,215 @@
+import threading
+import librosa
+import numpy as np
+from appflow.audioBuffer import AudioBuffer
+from appflow.tracing import traced
+
+
+class TrackSpectrum:
+    """
+    STFT magnitudes of a whole track, computed once and framed on the segment grid.
+
+    Every segment is transformed exactly like a standalone per-slice STFT (centered frames,
+    zero padding at the segment edges), so segment views match the old per-segment results.
+    The full-track view is the concatenation of all segment frames.
+
+    With window_hop (seconds) shorter than segment_length, segments become overlapping windows
+    starting every window_hop seconds; the full-track view then repeats the overlapping audio.
+    For whole tracks, WindowedSpectrum analyses such windows a chunk at a time instead.
+    """
+
+    @traced("stft")
+    def __init__(self, y, sr, segment_length=4, n_fft=2048, hop_length=512, chunk_segments=32, window_hop=None):
+        self.sr = sr
+        self.segment_length = segment_length
+        self.window_hop = segment_length if window_hop is None else window_hop
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.duration = len(y) / sr
+
+        segment_samples = int(segment_length * sr)
+        step = int(self.window_hop * sr)
+        num_full = 1 + (len(y) - segment_samples) // step if len(y) >= segment_samples else 0
+        covered = (num_full - 1) * step + segment_samples if num_full else 0
+        tail = y[num_full * step:] if len(y) > covered else y[:0]
+
+        frames_per_segment = 1 + segment_samples // hop_length
+        tail_frames = 1 + len(tail) // hop_length if len(tail) else 0
+        frame_counts = [frames_per_segment] * num_full + ([tail_frames] if tail_frames else [])
+        self.offsets = np.concatenate([[0], np.cumsum(frame_counts, dtype=np.int64)])
+        self.magnitude = np.empty((1 + n_fft // 2, self.offsets[-1]), dtype=np.float32)
+
+        # Full segments are stacked and transformed as one batch, a chunk at a time to bound memory
+        for first in range(0, num_full, chunk_segments):
+            last = min(first + chunk_segments, num_full)
+            if step == segment_samples:
+                block = y[first * segment_samples:last * segment_samples].reshape(last - first, segment_samples)
+            else:
+                windows = np.lib.stride_tricks.sliding_window_view(y, segment_samples)
+                block = np.ascontiguousarray(windows[first * step:(last - 1) * step + 1:step])
+            D = np.abs(librosa.stft(block, n_fft=n_fft, hop_length=hop_length))
+            self.magnitude[:, self.offsets[first]:self.offsets[last]] = np.concatenate(D, axis=1)
+
+        if tail_frames:
+            D = np.abs(librosa.stft(tail, n_fft=n_fft, hop_length=hop_length))
+            self.magnitude[:, self.offsets[num_full]:] = D
+
+    @classmethod
+    def from_file(cls, input_audio, segment_length=4, **kwargs):
+        """Decodes an audio file once at its native sample rate and analyses it."""
+        y, sr = librosa.load(input_audio, sr=None)
+        return cls(y, sr, segment_length=segment_length, **kwargs)
+
+    @property
+    def num_segments(self):
+        return len(self.offsets) - 1
+
+    @property
+    def start_times(self):
+        """Start time of every segment (or window), in seconds."""
+        return np.arange(self.num_segments) * self.window_hop
+
+    def segment(self, index):
+        """Returns the magnitude frames of one segment as a view into the track STFT."""
+        return self.magnitude[:, self.offsets[index]:self.offsets[index + 1]]
+
+    def segment_db(self, index):
+        """Returns one segment in dB, referenced to that segment's own maximum."""
+        return librosa.amplitude_to_db(self.segment(index), ref=np.max)
+
+    def full_db(self, max_frames=None):
+        """
+        Returns the whole track in dB, referenced to the track maximum.
+
+        With max_frames, runs of adjacent frames are max-pooled so at most max_frames columns
+        remain, which is all an overview image of the track can show.
+        """
+        magnitude = self.magnitude
+        if max_frames and magnitude.shape[1] > max_frames:
+            factor = -(-magnitude.shape[1] // max_frames)
+            magnitude = np.maximum.reduceat(magnitude, np.arange(0, magnitude.shape[1], factor), axis=1)
+        return librosa.amplitude_to_db(magnitude, ref=np.max)
+
+    def segment_features(self, high_band_hz=4000, chunk_frames=8192):
+        """
+        Returns cheap per-segment loudness features as a (num_segments, 3) float32 array:
+        RMS level in dBFS, mean positive spectral flux, and the share of energy above high_band_hz.
+
+        Frame statistics are reduced over the track STFT a chunk at a time and pooled per
+        segment with the frame offsets, so flux never spans a segment boundary.
+        """
+        if not self.num_segments:
+            return np.empty((0, 3), dtype=np.float32)
+
+        high_bin = int(np.searchsorted(librosa.fft_frequencies(sr=self.sr, n_fft=self.n_fft), high_band_hz))
+        total_frames = self.magnitude.shape[1]
+        frame_power = np.empty(total_frames, dtype=np.float64)
+        high_power = np.empty(total_frames, dtype=np.float64)
+        frame_flux = np.zeros(total_frames, dtype=np.float64)
+
+        for start in range(0, total_frames, chunk_frames):
+            stop = min(start + chunk_frames, total_frames)
+            block = self.magnitude[:, start:stop]
+            frame_power[start:stop] = np.einsum("ft,ft->t", block, block)
+            high_power[start:stop] = np.einsum("ft,ft->t", block[high_bin:], block[high_bin:])
+
+            first = max(start - 1, 0)
+            rise = np.diff(self.magnitude[:, first:stop], axis=1)
+            np.maximum(rise, 0, out=rise)
+            frame_flux[first + 1:stop] = rise.sum(axis=0)
+
+        starts = self.offsets[:-1]
+        frame_flux[starts] = 0  # The first frame of a segment has no predecessor within it
+        counts = np.diff(self.offsets)
+
+        # Same scaling librosa.feature.rms applies to a spectrogram with a Hann window
+        power = np.add.reduceat(frame_power, starts) / counts
+        rms_db = 10 * np.log10(2 * power / self.n_fft ** 2 + 1e-10)
+        flux = np.add.reduceat(frame_flux, starts) / np.maximum(counts - 1, 1) / self.n_fft
+        high_band_ratio = np.add.reduceat(high_power, starts) / np.maximum(power * counts, 1e-12)
+        return np.stack([rms_db, flux, high_band_ratio], axis=1).astype(np.float32)
+
+
+class WindowedSpectrum:
+    """
+    Overlapping analysis windows of a track, transformed a chunk of windows at a time.
+
+    Materializing every window would multiply the STFT memory by segment_length / window_hop,
+    so only the mono samples are kept and the chunk holding the requested window is analysed
+    on demand (the last chunk stays cached for sequential reads). Each chunk is a TrackSpectrum
+    over its own samples, so windows match TrackSpectrum(y, window_hop=...) exactly.
+    """
+
+    def __init__(self, y, sr, segment_length=4, window_hop=1, chunk_segments=32, **stft_kwargs):
+        self.y = y
+        self.sr = sr
+        self.segment_length = segment_length
+        self.window_hop = window_hop
+        self.chunk_segments = chunk_segments
+        self.stft_kwargs = stft_kwargs
+        self.duration = len(y) / sr
+
+        self.segment_samples = int(segment_length * sr)
+        self.step = int(window_hop * sr)
+        num_full = 1 + (len(y) - self.segment_samples) // self.step if len(y) >= self.segment_samples else 0
+        covered = (num_full - 1) * self.step + self.segment_samples if num_full else 0
+        self._num_segments = num_full + (1 if len(y) > covered else 0)
+        self._chunk_index, self._chunk = None, None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, input_audio, segment_length=4, **kwargs):
+        y, sr = librosa.load(input_audio, sr=None)
+        return cls(y, sr, segment_length=segment_length, **kwargs)
+
+    @property
+    def num_segments(self):
+        return self._num_segments
+
+    @property
+    def start_times(self):
+        return np.arange(self.num_segments) * self.window_hop
+
+    def chunk(self, chunk_index):
+        """Returns the TrackSpectrum of one chunk of windows, analysing it unless it is the cached one."""
+        with self._lock:
+            if self._chunk_index != chunk_index:
+                first = chunk_index * self.chunk_segments
+                last = first + self.chunk_segments
+                # The final chunk runs to the end of the track, so it also picks up the partial tail window
+                end = len(self.y) if last >= self.num_segments else (last - 1) * self.step + self.segment_samples
+                self._chunk = TrackSpectrum(self.y[first * self.step:end], self.sr, self.segment_length,
+                                            window_hop=self.window_hop, **self.stft_kwargs)
+                self._chunk_index = chunk_index
+            return self._chunk
+
+    def segment(self, index):
+        return self.chunk(index // self.chunk_segments).segment(index % self.chunk_segments)
+
+    def segment_db(self, index):
+        return self.chunk(index // self.chunk_segments).segment_db(index % self.chunk_segments)
+
+    def segment_features(self, high_band_hz=4000):
+        """Per-window features as in TrackSpectrum.segment_features, computed chunk by chunk."""
+        num_chunks = -(-self.num_segments // self.chunk_segments)
+        if not num_chunks:
+            return np.empty((0, 3), dtype=np.float32)
+        return np.concatenate([self.chunk(i).segment_features(high_band_hz) for i in range(num_chunks)])
+
+
+def load_spectrum(source, segment_length=4, window_hop=None):
+    """
+    Returns source unchanged if it is already a spectrum, otherwise analyses the buffer or audio file.
+
+    Overlapping windows (window_hop shorter than segment_length) come back as a WindowedSpectrum.
+    """
+    if isinstance(source, (TrackSpectrum, WindowedSpectrum)):
+        return source
+    windowed = window_hop is not None and window_hop != segment_length
+    if isinstance(source, AudioBuffer):
+        if windowed:
+            return WindowedSpectrum(source.mono(), source.sr, segment_length=segment_length, window_hop=window_hop)
+        return TrackSpectrum(source.mono(), source.sr, segment_length=segment_length)
+    if windowed:
+        return WindowedSpectrum.from_file(source, segment_length=segment_length, window_hop=window_hop)
+    return TrackSpectrum.from_file(source, segment_length=segment_length)
@@ -0,0 +1,122 @@
+import subprocess
+import librosa
+import numpy as np
+from appflow.audioBuffer import AudioBuffer, native_sample_rate, pcm_decode_command
+from appflow.extractSpectroSound import FULL_SPECTROGRAM_COLUMNS, render_full_spectrogram, spectrogram_to_image
+from appflow.spectralAnalysis import TrackSpectrum
+
+
+def iter_pcm_blocks(input_path, sr, block_samples, overlap_samples=0, channels=2):
+    """
+    Streams the audio of a media file as float32 blocks shaped (samples, channels).
+
+    Yields (start_sample, block) pairs. Consecutive blocks share overlap_samples samples and
+    only the last block may be shorter than block_samples, so memory stays bounded by one block.
+    """
+    step = block_samples - overlap_samples
+    frame_bytes = 4 * channels
+    process = subprocess.Popen(pcm_decode_command(input_path, sr, channels),
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        carry = np.empty((0, channels), dtype=np.float32)
+        start = 0
+        while True:
+            data = process.stdout.read((block_samples - len(carry)) * frame_bytes)
+            fresh = np.frombuffer(data[:len(data) - len(data) % frame_bytes], dtype=np.float32)
+            if not len(fresh):
+                break
+
+            block = np.concatenate([carry, fresh.reshape(-1, channels)])
+            yield start, block
+            if len(block) < block_samples:
+                break
+            carry = block[step:]
+            start += step
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+
+def iter_boosted_mono_blocks(input_path, sr, block_samples, overlap_samples=0, gain_db=20):
+    """Streams boosted mono blocks, applying the same gain and downmix as the in-memory pipeline."""
+    for start, block in iter_pcm_blocks(input_path, sr, block_samples, overlap_samples):
+        yield start, AudioBuffer(block, sr).with_gain(gain_db).mono()
+
+
+def stream_segment_spectrograms(input_path, segment_length=4, img_size=(224, 224), gain_db=20, block_segments=8,
+                                gate=None, window_hop=None):
+    """
+    Yields (index, spectrogram) pairs for each 4-second segment of a media file, reading it in blocks.
+
+    Segments are transformed like standalone slices (zero padding at their own edges), so
+    segment-aligned blocks need no overlap and the output matches segment_spectrogram_tensors.
+    With window_hop, segments are overlapping windows and consecutive blocks share the
+    window overlap. With an AcousticGate, segments it rules out yield None and are never rendered.
+    """
+    sr = native_sample_rate(input_path)
+    segment_samples = int(segment_length * sr)
+    step = segment_samples if window_hop is None else int(window_hop * sr)
+    block_samples = (block_segments - 1) * step + segment_samples
+
+    for start, y in iter_boosted_mono_blocks(input_path, sr, block_samples, segment_samples - step, gain_db):
+        spectrum = TrackSpectrum(y, sr, segment_length=segment_length, window_hop=window_hop)
+        first = start // step
+        if gate is None:
+            needs_cnn = np.ones(spectrum.num_segments, dtype=bool)
+        else:
+            needs_cnn = gate.passes(spectrum.segment_features(gate.high_band_hz))
+        for j in range(spectrum.num_segments):
+            yield first + j, spectrogram_to_image(spectrum.segment_db(j), img_size) if needs_cnn[j] else None
+
+
+def stream_full_spectrogram(input_path, output_img, segment_length=4, gain_db=20, block_segments=8,
+                            max_columns=FULL_SPECTROGRAM_COLUMNS):
+    """Renders the full-track overview from streamed blocks, max-pooling frames down to max_columns."""
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    sr = native_sample_rate(input_path)
+    segment_samples = int(segment_length * sr)
+    duration = ffmpeg_parse_infos(input_path)["duration"]
+    frames_per_segment = 1 + segment_samples // 512
+    pool = max(1, int(np.ceil(duration / segment_length * frames_per_segment / max_columns)))
+
+    pooled, carry = [], None
+    for _, y in iter_boosted_mono_blocks(input_path, sr, block_segments * segment_samples, gain_db=gain_db):
+        magnitude = TrackSpectrum(y, sr, segment_length=segment_length).magnitude
+        if carry is not None:
+            magnitude = np.concatenate([carry, magnitude], axis=1)
+        usable = magnitude.shape[1] - magnitude.shape[1] % pool
+        pooled.append(magnitude[:, :usable].reshape(magnitude.shape[0], -1, pool).max(axis=2))
+        carry = magnitude[:, usable:]
+
+    if carry is not None and carry.shape[1]:
+        pooled.append(carry.max(axis=1, keepdims=True))
+    if not pooled:
+        raise ValueError(f"No audio decoded from {input_path}")
+    render_full_spectrogram(librosa.amplitude_to_db(np.concatenate(pooled, axis=1), ref=np.max), sr, output_img)
+
+
+def analyse_video_streaming(mp4_path, ai_model, segment_length=4.0, threshold=0.75, batch_size=None, gain_db=20,
+                            gate=None, window_hop=None, results_stream=None):
+    """
+    Runs detection on a video in constant memory, regardless of its length, optionally behind an acoustic gate.
+
+    Decoding and spectrogram rendering run on a producer thread ahead of inference. Returns one
+    result per window; merge them into regions with detect_regions. With results_stream, every
+    window is also appended to that JSON Lines file as soon as it is scored.
+    """
+    from appflow.detectModel import (detect_overstimulating_stream, report_gate_savings, report_inference_latency,
+                                     stream_results_json)
+
+    spectrograms = stream_segment_spectrograms(mp4_path, segment_length, gain_db=gain_db, gate=gate,
+                                               window_hop=window_hop)
+    results = detect_overstimulating_stream(spectrograms, ai_model, segment_length, threshold, batch_size, window_hop)
+    if results_stream is not None:
+        results = stream_results_json(results, results_stream)
+    overstim_results = list(results)
+    report_inference_latency(ai_model)
+    if gate is not None:
+        report_gate_savings(overstim_results)
+    return overstim_results
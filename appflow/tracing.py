@@ -0,0 +1,215 @@
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+from multiprocessing import parent_process
+
+try:
+    import resource  # Unix only; without it RSS and child CPU are recorded as None
+except ImportError:
+    resource = None
+
+# Setting this environment variable turns tracing on for the whole process. Its value is the
+# Chrome trace file written at exit ("1" picks akira_trace.json); the span list goes next to it
+# as <name>.spans.json. Worker processes inherit it and write <name>.<pid>.json.
+TRACE_ENV_VAR = "AKIRA_TRACE"
+DEFAULT_TRACE_PATH = "akira_trace.json"
+
+# Returned by span() while tracing is off, so a disabled span costs one flag check
+_NULL_SPAN = nullcontext()
+
+_enabled = False
+_output_path = None
+_spans = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def read_io_counters():
+    """Returns (bytes read, bytes written) by this process, pipes included, or (None, None) without /proc."""
+    try:
+        with open("/proc/self/io") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return int(counters["rchar"]), int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def resource_snapshot():
+    snapshot = {
+        "cpu": time.process_time(),
+        "thread_cpu": time.thread_time(),
+        "child_cpu": None,
+        "max_rss_mb": None,
+        "io": read_io_counters(),
+    }
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        snapshot["child_cpu"] = children.ru_utime + children.ru_stime
+        snapshot["max_rss_mb"] = usage.ru_maxrss / 1024  # ru_maxrss is in kilobytes on Linux
+    return snapshot
+
+
+def difference(after, before, digits):
+    """after - before, rounded, or None when the counter is not available on this platform."""
+    return round(after - before, digits) if after is not None and before is not None else None
+
+
+class Span:
+    """
+    Measures one traced region: wall, process and thread CPU time, CPU time of finished child
+    processes (ffmpeg), peak RSS and bytes read and written.
+
+    Process-wide counters also include work done by other threads meanwhile; thread_cpu_s is
+    the calling thread's own share.
+    """
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.before = resource_snapshot()
+        self.start = time.time()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.started
+        after = resource_snapshot()
+        _local.stack.pop()
+
+        (read_before, written_before), (read_after, written_after) = self.before["io"], after["io"]
+        record = {
+            "name": self.name,
+            "parent": self.parent,
+            "start": self.start,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(after["cpu"] - self.before["cpu"], 6),
+            "thread_cpu_s": round(after["thread_cpu"] - self.before["thread_cpu"], 6),
+            "child_cpu_s": difference(after["child_cpu"], self.before["child_cpu"], 6),
+            "peak_rss_mb": difference(after["max_rss_mb"], 0, 1),
+            "rss_growth_mb": difference(after["max_rss_mb"], self.before["max_rss_mb"], 1),
+            "bytes_read": read_after - read_before if read_after is not None else None,
+            "bytes_written": written_after - written_before if written_after is not None else None,
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+            "tid": threading.get_ident(),
+            "error": exc_type.__name__ if exc_type else None,
+            "args": self.args,
+        }
+        with _lock:
+            _spans.append(record)
+        return False
+
+
+def span(name, **args):
+    """Context manager tracing the enclosed block; a shared no-op when tracing is off."""
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, args)
+
+
+def traced(name=None):
+    """Decorator tracing every call of a function under name (default: the function name)."""
+    def decorate(function):
+        span_name = name or function.__name__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with Span(span_name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def enable(output_path=None):
+    """Turns tracing on; with output_path, the traces are written there when the process exits."""
+    global _enabled, _output_path
+    _enabled = True
+    if output_path is not None:
+        if _output_path is None:
+            atexit.register(write_at_exit)
+            try:
+                from multiprocessing.util import Finalize
+                # Pool workers leave through os._exit and skip atexit, but run multiprocessing finalizers
+                Finalize(None, write_at_exit, exitpriority=0)
+            except ImportError:
+                pass
+        _output_path = output_path
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def spans():
+    """Returns a copy of the spans recorded so far."""
+    with _lock:
+        return list(_spans)
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+
+
+def export_json(path):
+    """Writes the recorded spans as a JSON list."""
+    with open(path, "w") as f:
+        json.dump(spans(), f, indent=4)
+    return path
+
+
+def export_chrome_trace(path):
+    """Writes the recorded spans in the Chrome trace-event format (chrome://tracing, Perfetto)."""
+    events = []
+    for record in spans():
+        metrics = {key: value for key, value in record.items()
+                   if key not in ("name", "start", "wall_s", "pid", "tid", "thread", "parent")}
+        events.append({"name": record["name"], "cat": "akira", "ph": "X", "ts": record["start"] * 1e6,
+                       "dur": record["wall_s"] * 1e6, "pid": record["pid"], "tid": record["tid"], "args": metrics})
+    threads = {(record["pid"], record["tid"]): record["thread"] for record in spans()}
+    events += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread}}
+               for (pid, tid), thread in threads.items()]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return path
+
+
+def write_at_exit():
+    """Exports the spans of this process once, to the configured path (suffixed with the pid in workers)."""
+    global _output_path
+    path, _output_path = _output_path, None
+    if path is None or not spans():
+        return
+    stem, extension = os.path.splitext(path)
+    if parent_process() is not None:
+        stem = f"{stem}.{os.getpid()}"
+    export_chrome_trace(stem + (extension or ".json"))
+    export_json(stem + ".spans.json")
+
+
+def enable_from_env():
+    value = os.environ.get(TRACE_ENV_VAR)
+    if value and value != "0":
+        enable(DEFAULT_TRACE_PATH if value == "1" else value)
+
+
+enable_from_env()
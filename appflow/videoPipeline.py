@@ -0,0 +1,389 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing import get_context
+
+# Files the pipeline can produce, and where they go unless a path is given
+DEFAULT_PATHS = {
+    "extracted_mp3": "extracted_audio.mp3",
+    "boosted_mp3": "extracted_audio_boosted.mp3",
+    "full_spectrogram": "full_spectrogram.png",
+    "segment_pngs": "spectrogram_segments",
+    "boosted_mp4": "original-boosted.mp4",
+    "detection_json": "overstimulating_segments.json",
+    "retuned_mp4": "retuned.mp4",
+}
+
+# Intermediate files only written when debug artifacts are switched on
+DEBUG_OUTPUTS = ("extracted_mp3", "boosted_mp3", "full_spectrogram", "segment_pngs")
+
+# Setting this environment variable to 1 turns debug artifacts on for every pipeline run
+DEBUG_ENV_VAR = "AKIRA_DEBUG_ARTIFACTS"
+
+# Settings that hold live objects and never travel to a worker process
+THREAD_ONLY_SETTINGS = ("ai_model", "gate", "cancel_event", "on_segment", "on_result")
+
+
+class PipelineCancelled(Exception):
+    """Raised out of a pipeline run once it has been cancelled."""
+
+
+def init_worker():
+    """Keeps render workers single-threaded and headless."""
+    for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMBA_NUM_THREADS"):
+        os.environ[variable] = "1"
+    os.environ["MPLBACKEND"] = "Agg"
+
+
+# Stage functions: each takes the settings dict followed by its input artifacts
+
+def stage_audio(settings):
+    from appflow.extractSpectroSound import extract_audio
+
+    return extract_audio(settings["mp4_path"])
+
+
+def stage_boosted_audio(settings, audio):
+    return audio.with_gain(settings["gain_db"])
+
+
+def stage_spectrum(settings, boosted_audio):
+    from appflow.spectralAnalysis import load_spectrum
+
+    return load_spectrum(boosted_audio, settings["segment_length"])
+
+
+def stage_window_spectrum(settings, boosted_audio):
+    from appflow.spectralAnalysis import load_spectrum
+
+    return load_spectrum(boosted_audio, settings["segment_length"], settings["window_hop"])
+
+
+def stage_model(settings):
+    from appflow.detectModel import load_ai_model
+
+    if settings["ai_model"] is not None:
+        return settings["ai_model"]
+    return load_ai_model(settings["model_path"], exit_on_error=False, jit_compile=settings["jit_compile"],
+                         batch_size=settings["batch_size"])
+
+
+def stage_window_results(settings, window_spectrum, ai_model):
+    from appflow.detectModel import (detect_overstimulating_stream, report_gate_savings, report_inference_latency,
+                                     stream_results_json)
+    from appflow.extractSpectroSound import spectrogram_to_image
+
+    spectrum, gate = window_spectrum, settings["gate"]
+    if gate is None:
+        needs_cnn = [True] * spectrum.num_segments
+    else:
+        needs_cnn = gate.passes(spectrum.segment_features(gate.high_band_hz))
+
+    def spectrograms():
+        for i in range(spectrum.num_segments):
+            if settings["cancel_event"].is_set():
+                raise PipelineCancelled()
+            yield i, spectrogram_to_image(spectrum.segment_db(i)) if needs_cnn[i] else None
+
+    # Spectrograms are rendered on a producer thread while the model scores the batches already queued
+    results = detect_overstimulating_stream(spectrograms(), ai_model, settings["segment_length"], settings["threshold"],
+                                            settings["batch_size"], settings["window_hop"])
+    if settings["results_stream"] is not None:
+        results = stream_results_json(results, settings["results_stream"])
+
+    window_results = []
+    for result in results:
+        window_results.append(result)
+        if settings["on_segment"] is not None:
+            settings["on_segment"](len(window_results), spectrum.num_segments)
+        if settings["on_result"] is not None:
+            settings["on_result"](result)
+    report_inference_latency(ai_model)
+    if gate is not None:
+        report_gate_savings(window_results)
+    return window_results
+
+
+def stage_regions(settings, window_results):
+    from appflow.detectModel import detect_regions
+
+    return detect_regions(window_results, settings["segment_length"], settings["window_hop"], settings["threshold"],
+                          settings["hysteresis"], settings["min_gap"])
+
+
+def stage_retuned_audio(settings, boosted_audio, regions):
+    from appflow.retunedDetected import retune_audio
+
+    return retune_audio(boosted_audio, None, regions)
+
+
+def stage_extracted_mp3(settings, audio):
+    audio.write(settings["paths"]["extracted_mp3"])
+    return settings["paths"]["extracted_mp3"]
+
+
+def stage_boosted_mp3(settings, boosted_audio):
+    boosted_audio.write(settings["paths"]["boosted_mp3"])
+    return settings["paths"]["boosted_mp3"]
+
+
+def stage_full_spectrogram_db(settings, spectrum):
+    from appflow.extractSpectroSound import FULL_SPECTROGRAM_COLUMNS
+
+    # Pooled to the columns the overview can show, so only a small image travels to the render process
+    return spectrum.full_db(FULL_SPECTROGRAM_COLUMNS), spectrum.sr
+
+
+def stage_full_spectrogram(settings, full_spectrogram_db):
+    from appflow.extractSpectroSound import render_full_spectrogram
+
+    render_full_spectrogram(*full_spectrogram_db, settings["paths"]["full_spectrogram"])
+    return settings["paths"]["full_spectrogram"]
+
+
+def stage_segment_pngs(settings, spectrum):
+    from appflow.extractSpectroSound import segment_spectrogram
+
+    os.makedirs(settings["paths"]["segment_pngs"], exist_ok=True)
+    segment_spectrogram(spectrum, settings["paths"]["segment_pngs"], settings["segment_length"])
+    return settings["paths"]["segment_pngs"]
+
+
+def stage_boosted_mp4(settings, boosted_audio):
+    from appflow.audioBuffer import mux_audio
+
+    return mux_audio(settings["mp4_path"], boosted_audio, settings["paths"]["boosted_mp4"])
+
+
+def stage_detection_json(settings, regions):
+    from appflow.detectModel import save_and_print_results
+
+    save_and_print_results(regions, settings["paths"]["detection_json"])
+    return settings["paths"]["detection_json"]
+
+
+def stage_retuned_mp4(settings, retuned_audio):
+    from appflow.audioBuffer import mux_audio
+
+    return mux_audio(settings["mp4_path"], retuned_audio, settings["paths"]["retuned_mp4"])
+
+
+# Stage DAG: artifact -> (input artifacts, pool, function). numpy, librosa, TensorFlow and ffmpeg
+# release the GIL, so most stages share a thread pool. The GIL-bound full-track render runs in a
+# worker process on its pooled dB image; segment PNGs stay on a thread, since shipping them their
+# inputs would mean pickling every segment's magnitudes.
+STAGES = {
+    "audio": ((), "thread", stage_audio),
+    "boosted_audio": (("audio",), "thread", stage_boosted_audio),
+    "spectrum": (("boosted_audio",), "thread", stage_spectrum),
+    "window_spectrum": (("boosted_audio",), "thread", stage_window_spectrum),
+    "model": ((), "thread", stage_model),
+    "window_results": (("window_spectrum", "model"), "thread", stage_window_results),
+    "regions": (("window_results",), "thread", stage_regions),
+    "retuned_audio": (("boosted_audio", "regions"), "thread", stage_retuned_audio),
+    "extracted_mp3": (("audio",), "thread", stage_extracted_mp3),
+    "boosted_mp3": (("boosted_audio",), "thread", stage_boosted_mp3),
+    "full_spectrogram_db": (("spectrum",), "thread", stage_full_spectrogram_db),
+    "full_spectrogram": (("full_spectrogram_db",), "process", stage_full_spectrogram),
+    "segment_pngs": (("spectrum",), "thread", stage_segment_pngs),
+    "boosted_mp4": (("boosted_audio",), "thread", stage_boosted_mp4),
+    "detection_json": (("regions",), "thread", stage_detection_json),
+    "retuned_mp4": (("retuned_audio",), "thread", stage_retuned_mp4),
+}
+
+
+def timed_stage(function, settings, *inputs):
+    """Runs one stage and returns (result, start, end, worker); module level so process pools can run it."""
+    from appflow.tracing import span
+
+    start = time.time()
+    with span(function.__name__):
+        result = function(settings, *inputs)
+    return result, start, time.time(), f"{os.getpid()}/{threading.current_thread().name}"
+
+
+class VideoPipeline:
+    """
+    Produces a requested set of outputs for one video, computing only what they depend on.
+
+    The pipeline is a DAG of stages (STAGES) with explicit inputs and outputs. run() schedules
+    every stage the requested outputs need as soon as its inputs exist, so independent stages
+    (the boosted preview mux, spectrum analysis, model loading) overlap and the wall time
+    approaches the critical path. Each stage's start and end are kept in self.timeline.
+
+    on_stage(stage, status, finished, total) is called as stages start and finish, and
+    on_segment(done, total) as detection scores each window. Each window result is also handed
+    to on_result and, with results_stream, appended to that JSON Lines file as it is scored.
+    Setting cancel_event (or calling cancel()) stops the run at the next stage or segment with
+    PipelineCancelled.
+    """
+
+    def __init__(self, mp4_path, outputs, paths=None, debug=None, ai_model=None,
+                 model_path="overstimulating_audio_detector.h5", segment_length=4.0, window_hop=None,
+                 threshold=0.75, hysteresis=0.15, min_gap=0.0, gain_db=20, batch_size=None, gate=None, threads=6,
+                 processes=2, cancel_event=None, on_stage=None, on_segment=None, on_result=None, results_stream=None,
+                 jit_compile=False):
+        if debug is None:
+            debug = os.environ.get(DEBUG_ENV_VAR) == "1"
+        self.outputs = set(outputs) | (set(DEBUG_OUTPUTS) if debug else set())
+        unknown = self.outputs - set(DEFAULT_PATHS)
+        if unknown:
+            raise ValueError(f"Unknown outputs {sorted(unknown)}; expected some of {sorted(DEFAULT_PATHS)}")
+
+        if window_hop == segment_length:
+            window_hop = None
+        # Fail before decoding anything rather than after a full analysis pass
+        from appflow.detectModel import check_window_hop
+        check_window_hop(segment_length, window_hop)
+        self.settings = {
+            "mp4_path": mp4_path,
+            "paths": {**DEFAULT_PATHS, **(paths or {})},
+            "ai_model": ai_model,
+            "model_path": model_path,
+            "segment_length": segment_length,
+            "window_hop": window_hop,
+            "threshold": threshold,
+            "hysteresis": hysteresis,
+            "min_gap": min_gap,
+            "gain_db": gain_db,
+            "batch_size": batch_size,
+            "gate": gate,
+            "cancel_event": cancel_event or threading.Event(),
+            "on_segment": on_segment,
+            "on_result": on_result,
+            "results_stream": results_stream,
+            "jit_compile": jit_compile,
+        }
+        self.on_stage = on_stage
+        self.threads = threads
+        self.processes = processes
+        self.artifacts = {}
+        self.timeline = []
+
+    def cancel(self):
+        """Asks a running pipeline to stop; run() raises PipelineCancelled shortly after."""
+        self.settings["cancel_event"].set()
+
+    def report_stage(self, name, status, finished, total):
+        if self.on_stage is not None:
+            self.on_stage(name, status, finished, total)
+
+    def stage_inputs(self, name):
+        inputs = STAGES[name][0]
+        # Without overlapping windows the detection windows are the plain segment spectrum
+        if name == "window_results" and self.settings["window_hop"] is None:
+            inputs = ("spectrum", "model")
+        return inputs
+
+    def required_stages(self, names):
+        """Returns every stage the given artifacts depend on, themselves included."""
+        required, stack = set(), list(names)
+        while stack:
+            name = stack.pop()
+            if name not in required:
+                required.add(name)
+                stack.extend(self.stage_inputs(name))
+        return required
+
+    def downstream_depth(self, stages):
+        """Returns, for each stage, the length of the longest chain of stages that waits on it."""
+        depth = {}
+
+        def visit(name):
+            if name not in depth:
+                consumers = [other for other in stages if name in self.stage_inputs(other)]
+                depth[name] = 1 + max((visit(consumer) for consumer in consumers), default=0)
+            return depth[name]
+
+        for name in stages:
+            visit(name)
+        return depth
+
+    def get(self, name):
+        """Returns an artifact, building it (and whatever it needs) in this thread if it does not exist yet."""
+        if name not in self.artifacts:
+            inputs = [self.get(dependency) for dependency in self.stage_inputs(name)]
+            result, start, end, worker = timed_stage(STAGES[name][2], self.settings, *inputs)
+            self.record(name, result, start, end, worker)
+        return self.artifacts[name]
+
+    def record(self, name, result, start, end, worker):
+        self.artifacts[name] = result
+        self.timeline.append({"stage": name, "pool": STAGES[name][1], "worker": worker,
+                              "start": start, "end": end})
+
+    def run(self):
+        """Runs every stage the requested outputs need, concurrently where the DAG allows, and returns {output: path}."""
+        pending = self.required_stages(self.outputs) - set(self.artifacts)
+        depth = self.downstream_depth(pending)
+        process_settings = {key: value for key, value in self.settings.items() if key not in THREAD_ONLY_SETTINGS}
+        needs_processes = any(STAGES[name][1] == "process" for name in pending)
+        cancel_event = self.settings["cancel_event"]
+        total, finished = len(pending), 0
+        process_pool = None
+        if needs_processes:
+            process_pool = ProcessPoolExecutor(self.processes, mp_context=get_context("spawn"), initializer=init_worker)
+
+        thread_pool = ThreadPoolExecutor(self.threads, thread_name_prefix="stage")
+        running = {}
+        cancelled = False
+        try:
+            while pending or running:
+                if cancel_event.is_set():
+                    raise PipelineCancelled()
+                ready = [name for name in pending
+                         if all(dependency in self.artifacts for dependency in self.stage_inputs(name))]
+                # Stages heading the longest remaining chains go first
+                for name in sorted(ready, key=lambda name: (-depth[name], name)):
+                    _, pool, function = STAGES[name]
+                    inputs = [self.artifacts[dependency] for dependency in self.stage_inputs(name)]
+                    if pool == "process":
+                        future = process_pool.submit(timed_stage, function, process_settings, *inputs)
+                    else:
+                        future = thread_pool.submit(timed_stage, function, self.settings, *inputs)
+                    running[future] = name
+                    pending.discard(name)
+                    self.report_stage(name, "started", finished, total)
+
+                # Wake up regularly so a cancel request is noticed even during a long stage
+                done, _ = wait(running, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    self.record(name, *future.result())
+                    finished += 1
+                    self.report_stage(name, "finished", finished, total)
+        except PipelineCancelled:
+            cancelled = True
+            raise
+        finally:
+            # A cancelled run returns at once; stages already running finish in the background
+            for future in running:
+                future.cancel()
+            thread_pool.shutdown(wait=not cancelled, cancel_futures=True)
+            if process_pool is not None:
+                process_pool.shutdown(wait=not cancelled, cancel_futures=True)
+
+        return {name: self.artifacts[name] for name in DEFAULT_PATHS if name in self.outputs}
+
+    def print_timeline(self):
+        """Prints when each stage ran, against the wall time of the run and the sum of all stages."""
+        if not self.timeline:
+            return
+        origin = min(entry["start"] for entry in self.timeline)
+        wall = max(entry["end"] for entry in self.timeline) - origin
+        busy = sum(entry["end"] - entry["start"] for entry in self.timeline)
+        width = max(len(entry["stage"]) for entry in self.timeline)
+        scale = 40 / wall if wall else 0
+
+        print(f"Stage timeline (wall {wall:.2f}s, sum of stages {busy:.2f}s):")
+        for entry in sorted(self.timeline, key=lambda entry: entry["start"]):
+            start, end = entry["start"] - origin, entry["end"] - origin
+            bar = " " * int(start * scale) + "#" * max(1, int((end - start) * scale))
+            print(f"  {entry['stage']:<{width}}  {entry['pool']:<7}  {start:7.2f}s - {end:7.2f}s  |{bar:<41}|")
+
+
+def run_pipeline(mp4_path, outputs, paths=None, debug=None, **settings):
+    """Builds only the requested outputs for one video and returns (paths, pipeline)."""
+    pipeline = VideoPipeline(mp4_path, outputs, paths, debug, **settings)
+    return pipeline.run(), pipeline
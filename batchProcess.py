@@ -0,0 +1,270 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+# Outputs written for every video unless others are asked for
+BATCH_OUTPUTS = ("detection_json", "retuned_mp4")
+
+# Journal settings that select the outputs and the worker model backend rather than pipeline behaviour
+JOURNAL_ONLY_SETTINGS = ("outputs", "backend")
+
+# The detection model of this worker process, loaded once by init_worker
+_worker_model = None
+
+
+def init_worker(model_path, backend=None, num_threads=None):
+    """Keeps each worker headless and loads the one model it shares between all of its videos."""
+    global _worker_model
+
+    os.environ["MPLBACKEND"] = "Agg"
+    if num_threads:
+        for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMBA_NUM_THREADS"):
+            os.environ[variable] = str(num_threads)
+
+    from appflow.detectModel import load_ai_model
+    _worker_model = load_ai_model(model_path, exit_on_error=False, backend=backend, num_threads=num_threads)
+
+
+def find_videos(inputs):
+    """
+    Lists the videos to process, in a stable order and without duplicates.
+
+    Each input is a video file, a directory searched recursively for .mp4 files, or a text
+    file listing one video path per line (blank lines and # comments are skipped).
+    """
+    videos = []
+    for source in inputs:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                videos.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(".mp4"))
+        elif source.lower().endswith(".mp4"):
+            videos.append(source)
+        elif os.path.isfile(source):
+            with open(source) as f:
+                videos.extend(line.strip() for line in f if line.strip() and not line.lstrip().startswith("#"))
+        else:
+            print(f"Warning: {source} does not exist. Skipping...")
+    return list(dict.fromkeys(os.path.abspath(video) for video in videos))
+
+
+def video_key(video):
+    """Identifies a video version by its path, size and modification time, without reading it."""
+    stat = os.stat(video)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def work_dir_for(video, output_folder):
+    """Per-video output folder; the path hash keeps episodes with the same file name apart."""
+    stem = os.path.splitext(os.path.basename(video))[0]
+    return os.path.join(output_folder, f"{stem}-{hashlib.sha1(video.encode()).hexdigest()[:8]}")
+
+
+class BatchJournal:
+    """
+    Append-only JSON Lines record of every finished video, written as each one completes.
+
+    A video counts as done when its last entry succeeded with the same file size, modification
+    time and settings, and its outputs still exist, so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A line cut short when the previous run was killed
+                    self.entries[entry["video"]] = entry
+
+    def is_done(self, video, settings):
+        entry = self.entries.get(video)
+        if entry is None or entry["status"] != "done" or not os.path.exists(video):
+            return False
+        return (entry["key"] == video_key(video) and entry["settings"] == json.loads(json.dumps(settings))
+                and all(os.path.exists(path) for path in entry["outputs"].values()))
+
+    def record(self, entry):
+        self.entries[entry["video"]] = entry
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def process_video(video, work_dir, settings):
+    """
+    Runs the pipeline for one video inside a worker, with the worker's model and its own work folder.
+
+    settings is the journal key of the run: the pipeline settings plus the requested outputs and backend.
+
+    Returns the journal entry for the video; a failure is recorded with its traceback instead of raised.
+    """
+    from appflow.videoPipeline import DEFAULT_PATHS, run_pipeline
+
+    started = time.perf_counter()
+    entry = {"video": video, "work_dir": work_dir, "settings": settings}
+    try:
+        entry["key"] = video_key(video)
+        os.makedirs(work_dir, exist_ok=True)
+        paths = {name: os.path.join(work_dir, path) for name, path in DEFAULT_PATHS.items()}
+        pipeline_settings = {key: value for key, value in settings.items() if key not in JOURNAL_ONLY_SETTINGS}
+        produced, pipeline = run_pipeline(video, settings["outputs"], paths, ai_model=_worker_model, threads=4,
+                                          processes=1, **pipeline_settings)
+        regions = pipeline.artifacts.get("regions") or []
+        entry.update({
+            "status": "done",
+            "outputs": produced,
+            "regions": len(regions),
+            "flagged_seconds": round(sum(region["end_time"] - region["start_time"] for region in regions), 2),
+        })
+    except Exception:
+        entry.update({"status": "failed", "outputs": {}, "error": traceback.format_exc()})
+    entry["seconds"] = round(time.perf_counter() - started, 2)
+    return entry
+
+
+def batch_process(inputs, output_folder="batch_output", workers=2, model_path="overstimulating_audio_detector.h5",
+                  backend=None, outputs=BATCH_OUTPUTS, window_hop=None, threshold=0.75, min_gap=0.0,
+                  gain_db=20, journal_path=None, report_path=None):
+    """
+    Processes many videos in a process pool, one video per task and one resident model per worker.
+
+    Every video writes into its own work folder under output_folder, so jobs never share file
+    names. Finished videos are appended to the journal as they complete, and videos the journal
+    already has as done (unchanged file, same settings, outputs and backend) are skipped. Failed
+    videos, including those lost when a worker dies, are retried on the next run. Returns the
+    report that is also written to report_path and printed.
+    """
+    from appflow.detectModel import check_window_hop
+
+    check_window_hop(4.0, window_hop)
+    os.makedirs(output_folder, exist_ok=True)
+    journal = BatchJournal(journal_path or os.path.join(output_folder, "batch_journal.jsonl"))
+    settings = {"window_hop": window_hop, "threshold": threshold, "min_gap": min_gap, "gain_db": gain_db,
+                "model_path": model_path, "outputs": sorted(outputs), "backend": backend}
+    started = time.perf_counter()
+
+    videos = find_videos(inputs)
+    jobs = [video for video in videos if not journal.is_done(video, settings)]
+    # TensorFlow in every worker gets an equal share of the cores
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    done_now, failed_now = 0, 0
+    if jobs:
+        # spawn gives every worker a fresh interpreter, so each loads TensorFlow and the model once
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"), initializer=init_worker,
+                                 initargs=(model_path, backend, num_threads)) as pool:
+            futures = {pool.submit(process_video, video, work_dir_for(video, output_folder), settings): video
+                       for video in jobs}
+            try:
+                for done, future in enumerate(as_completed(futures), start=1):
+                    try:
+                        entry = future.result()
+                    except BrokenProcessPool:
+                        # A worker died (e.g. its model failed to load); every pending video ends up here
+                        entry = {"video": futures[future], "settings": settings, "status": "failed", "outputs": {},
+                                 "error": traceback.format_exc(), "seconds": 0}
+                    journal.record(entry)
+                    if entry["status"] == "done":
+                        done_now += 1
+                        print(f"[{done}/{len(jobs)}] Processed: {entry['video']} ({entry['seconds']} s, "
+                              f"{entry['regions']} regions)")
+                    else:
+                        failed_now += 1
+                        print(f"[{done}/{len(jobs)}] Failed: {entry['video']}")
+            except KeyboardInterrupt:
+                print("Interrupted; finished videos are in the journal and will be skipped on the next run.")
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    report = build_report(videos, journal, settings, len(videos) - len(jobs), done_now, failed_now, workers,
+                          time.perf_counter() - started)
+    with open(report_path or os.path.join(output_folder, "batch_report.json"), "w") as f:
+        json.dump(report, f, indent=4)
+    print_report(report)
+    return report
+
+
+def build_report(videos, journal, settings, skipped, succeeded, failed, workers, seconds):
+    """Summarises this run and lists the journal entry of every input video."""
+    rows = []
+    for video in videos:
+        entry = journal.entries.get(video, {"status": "pending"})
+        rows.append({
+            "video": video,
+            "status": entry["status"],
+            "outputs": entry.get("outputs", {}),
+            "regions": entry.get("regions"),
+            "flagged_seconds": entry.get("flagged_seconds"),
+            "seconds": entry.get("seconds"),
+            "error": entry["error"].strip().splitlines()[-1] if entry.get("error") else None,
+        })
+    return {
+        "videos": len(videos),
+        "already_done": skipped,
+        "succeeded": succeeded,
+        "failed": failed,
+        "workers": workers,
+        "seconds": round(seconds, 2),
+        "settings": settings,
+        "results": rows,
+    }
+
+
+def print_report(report):
+    """Prints the batch summary, including the last line of every error."""
+    print(f"\nBatch finished in {report['seconds']} s with {report['workers']} workers: {report['videos']} videos, "
+          f"{report['already_done']} already done, {report['succeeded']} processed, {report['failed']} failed.")
+    for row in report["results"]:
+        if row["status"] == "failed":
+            print(f"  {row['video']}: {row['error']}")
+
+
+def add_batch_arguments(parser):
+    """Adds the batch options, shared by this script and `akira.py batch`."""
+    parser.add_argument("inputs", nargs="+", help="Video files, folders of videos, or text files listing videos")
+    parser.add_argument("--output-folder", default="batch_output", help="Every video gets its own folder in here")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes, each with its own model")
+    parser.add_argument("--outputs", nargs="+", default=list(BATCH_OUTPUTS),
+                        choices=["detection_json", "retuned_mp4", "boosted_mp4", "full_spectrogram", "segment_pngs",
+                                 "extracted_mp3", "boosted_mp3"])
+    parser.add_argument("--model", default="overstimulating_audio_detector.h5")
+    parser.add_argument("--backend", choices=["keras", "tflite", "onnx"], default=None)
+    parser.add_argument("--hop", type=float, default=None)
+    parser.add_argument("--threshold", type=float, default=0.75)
+    parser.add_argument("--min-gap", type=float, default=0.0,
+                        help="Join regions separated by less than this (seconds)")
+    parser.add_argument("--gain-db", type=float, default=20)
+    parser.add_argument("--journal", default=None,
+                        help="Job journal; finished videos in it are skipped (default: in the output folder)")
+    parser.add_argument("--report", default=None, help="Per-video summary report (default: in the output folder)")
+
+
+def main():
+    from appflow.detectModel import check_window_hop
+
+    parser = argparse.ArgumentParser(description="Detect and retune every video of a folder or file list.")
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+    try:
+        check_window_hop(4.0, args.hop)
+    except ValueError as e:
+        parser.error(str(e))
+    report = batch_process(args.inputs, args.output_folder, args.workers, args.model, args.backend, args.outputs,
+                           args.hop, args.threshold, args.min_gap, args.gain_db, args.journal, args.report)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
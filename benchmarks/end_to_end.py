@@ -0,0 +1,276 @@
+"""
+Times every stage of the video pipeline and the dataset builders on synthetic, reproducible media.
+
+The input is generated locally from a seed: silence, calm tones, noise bursts and chirps, where
+the bursts and chirps are the known overstimulating regions, muxed into an MP4 with a blank
+video track. Run from the repository root:
+
+    python -m benchmarks.end_to_end --seconds 120 --workers 4 --output bench.json
+    python -m benchmarks.end_to_end --seconds 120 --workers 4 --baseline bench.json
+
+The steps of process_video (extract, boost, STFT, renders, mux) are timed one by one. Stages
+that need the detector (detect_overstimulating_segments, the pipeline) run only when --model
+exists. Retuning always uses the known regions, so its workload does not change with the model.
+With --baseline, every stage whose median time grew by more than --tolerance is flagged as a
+regression and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from imageio_ffmpeg import get_ffmpeg_exe
+
+# Synthetic event kinds; the loud ones are the regions detection should flag
+EVENT_KINDS = ("silence", "tone", "burst", "chirp")
+OVERSTIMULATING_KINDS = ("burst", "chirp")
+
+
+def synthetic_track(seconds, sr=44100, seed=0, event_seconds=(2.0, 8.0)):
+    """
+    Generates a stereo float32 track of random events and returns (samples, known_regions).
+
+    known_regions lists every burst and chirp in the segment format retune_audio reads.
+    """
+    rng = np.random.default_rng(seed)
+    y = np.zeros(int(seconds * sr), dtype=np.float32)
+    regions, start = [], 0.0
+    while start < seconds:
+        kind = EVENT_KINDS[rng.integers(len(EVENT_KINDS))]
+        length = min(rng.uniform(*event_seconds), seconds - start)
+        first, last = int(start * sr), min(int((start + length) * sr), len(y))
+        t = np.arange(last - first) / sr
+
+        if kind == "tone":
+            event = 0.1 * np.sin(2 * np.pi * rng.uniform(220, 660) * t)
+        elif kind == "burst":
+            # Loud white noise chopped into abrupt bursts a few times a second
+            gate = (np.floor(t * rng.uniform(4, 10)) % 2 == 0)
+            event = 0.8 * rng.standard_normal(len(t)) * gate
+        elif kind == "chirp":
+            f0, f1 = rng.uniform(300, 1000), rng.uniform(6000, 12000)
+            event = 0.7 * np.sin(2 * np.pi * (f0 * t + (f1 - f0) * t ** 2 / (2 * max(length, 1e-3))))
+        else:
+            event = np.zeros(len(t))
+        y[first:last] = np.clip(event, -1, 1)
+
+        if kind in OVERSTIMULATING_KINDS:
+            regions.append({"start_time": round(start, 3), "end_time": round(start + length, 3), "kind": kind,
+                            "overstimulating": True})
+        start += length
+    return np.repeat(y[:, np.newaxis], 2, axis=1), regions
+
+
+def write_synthetic_video(output_path, samples, sr=44100):
+    """Muxes float32 PCM with a blank 160x120 video track into an MP4."""
+    seconds = len(samples) / sr
+    command = [get_ffmpeg_exe(), "-y", "-v", "error",
+               "-f", "lavfi", "-i", f"color=c=black:s=160x120:r=10:d={seconds}",
+               "-f", "f32le", "-ar", str(sr), "-ac", str(samples.shape[1]), "-i", "pipe:0",
+               "-map", "0:v:0", "-map", "1:a:0", "-c:v", "libx264", "-pix_fmt", "yuv420p",
+               "-c:a", "aac", "-b:a", "192k", "-shortest", output_path]
+    subprocess.run(command, input=np.ascontiguousarray(samples, dtype=np.float32).tobytes(), check=True)
+    return output_path
+
+
+def make_synthetic_media(work_dir, seconds, seed=0):
+    """Writes synthetic.mp4 and its known regions (known_regions.json) and returns (mp4_path, regions)."""
+    samples, regions = synthetic_track(seconds, seed=seed)
+    mp4_path = write_synthetic_video(os.path.join(work_dir, "synthetic.mp4"), samples)
+    with open(os.path.join(work_dir, "known_regions.json"), "w") as f:
+        json.dump(regions, f, indent=4)
+    return mp4_path, regions
+
+
+def make_raw_dataset(raw_folder, clips_per_category, clip_seconds, seed=0):
+    """Fills every dataset category folder with short synthetic source videos."""
+    from extractAudio import categories
+
+    for c, category in enumerate(categories):
+        os.makedirs(os.path.join(raw_folder, category), exist_ok=True)
+        for i in range(clips_per_category):
+            samples, _ = synthetic_track(clip_seconds, seed=seed + 1000 * (c + 1) + i)
+            write_synthetic_video(os.path.join(raw_folder, category, f"clip_{i}.mp4"), samples)
+
+
+def overlap_seconds(regions, other):
+    """Total time covered by both region lists."""
+    return sum(max(0.0, min(a["end_time"], b["end_time"]) - max(a["start_time"], b["start_time"]))
+               for a in regions for b in other)
+
+
+def region_accuracy(detected, known):
+    """Time-weighted precision and recall of detected regions against the known ones."""
+    covered = overlap_seconds(detected, known)
+    detected_seconds = sum(r["end_time"] - r["start_time"] for r in detected)
+    known_seconds = sum(r["end_time"] - r["start_time"] for r in known)
+    return {
+        "precision": round(covered / detected_seconds, 4) if detected_seconds else None,
+        "recall": round(covered / known_seconds, 4) if known_seconds else None,
+    }
+
+
+def run_once(work_dir, mp4_path, known_regions, ai_model, workers, raw_folder):
+    """Runs every stage once in a fresh folder and returns ({stage: seconds}, detected regions, {stage: failures})."""
+    from appflow.extractSpectroSound import (attach_boosted_audio, boost_volume, extract_audio,
+                                             generate_full_spectrogram, segment_spectrogram,
+                                             segment_spectrogram_tensors)
+    from appflow.spectralAnalysis import load_spectrum
+    from appflow.retunedDetected import attach_audio_to_video, retune_audio
+    from buildDataset import build_dataset
+
+    timings, failures = {}, {}
+
+    def timed(stage, function, *args, **kwargs):
+        started = time.perf_counter()
+        result = function(*args, **kwargs)
+        timings[stage] = time.perf_counter() - started
+        return result
+
+    # The steps of process_video, each timed on its own
+    segment_folder = os.path.join(work_dir, "spectrogram_segments")
+    os.makedirs(segment_folder, exist_ok=True)
+    audio = timed("extract_audio", extract_audio, mp4_path, os.path.join(work_dir, "extracted_audio.mp3"))
+    boosted = timed("boost_volume", boost_volume, audio, os.path.join(work_dir, "extracted_audio_boosted.mp3"))
+    spectrum = timed("load_spectrum", load_spectrum, boosted)
+    timed("generate_full_spectrogram", generate_full_spectrogram, spectrum,
+          os.path.join(work_dir, "full_spectrogram.png"))
+    timed("segment_spectrogram_tensors", segment_spectrogram_tensors, spectrum)
+    timed("segment_spectrogram", segment_spectrogram, spectrum, segment_folder)
+    timed("attach_boosted_audio", attach_boosted_audio, mp4_path, boosted,
+          os.path.join(work_dir, "original-boosted.mp4"))
+
+    detected = None
+    if ai_model is not None:
+        from appflow.detectModel import detect_overstimulating_segments
+        from appflow.videoPipeline import run_pipeline
+
+        results = timed("detect_overstimulating_segments", detect_overstimulating_segments, segment_folder, ai_model)
+        detected = [r for r in results if r["overstimulating"]]
+        paths = {"detection_json": os.path.join(work_dir, "pipeline.json"),
+                 "retuned_mp4": os.path.join(work_dir, "pipeline-retuned.mp4")}
+        timed("pipeline", run_pipeline, mp4_path, set(paths), paths, debug=False, ai_model=ai_model)
+
+    retuned = timed("retune_audio", retune_audio, boosted, None, known_regions)
+    timed("attach_audio_to_video", attach_audio_to_video, mp4_path, retuned, os.path.join(work_dir, "retuned.mp4"))
+
+    dataset = os.path.join(work_dir, "dataset")
+    summary = timed("build_dataset", build_dataset, raw_folder, os.path.join(dataset, "new"),
+                    os.path.join(dataset, "preprocessed"), os.path.join(dataset, "visualized"),
+                    os.path.join(dataset, "spectrogram"), workers=workers,
+                    manifest_path=os.path.join(dataset, "manifest.json"))
+    if summary["failed"]:
+        failures["build_dataset"] = summary["failed"]
+    return timings, detected, failures
+
+
+def compare(results, baseline, tolerance):
+    """Prints each stage against the baseline and returns the stages that regressed."""
+    regressions = []
+    print(f"\n{'stage':<32}  {'median s':>9}  {'baseline':>9}  {'change':>8}")
+    for stage, timing in results["stages"].items():
+        before = baseline["stages"].get(stage, {}).get("median_s")
+        if before is None:
+            print(f"{stage:<32}  {timing['median_s']:9.3f}  {'-':>9}  {'-':>8}")
+            continue
+        change = timing["median_s"] / before - 1 if before else 0.0
+        flag = "  REGRESSION" if change > tolerance else ""
+        if flag:
+            regressions.append(stage)
+        print(f"{stage:<32}  {timing['median_s']:9.3f}  {before:9.3f}  {change:+8.1%}{flag}")
+    if baseline.get("params") != results["params"]:
+        print("Note: the baseline was run with different parameters.")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=120, help="Length of the synthetic video")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes for the dataset builder")
+    parser.add_argument("--runs", type=int, default=3, help="Repeat every stage and report the median")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--clips", type=int, default=2, help="Synthetic source videos per dataset category")
+    parser.add_argument("--clip-seconds", type=float, default=12)
+    parser.add_argument("--model", default="overstimulating_audio_detector.h5")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="Earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Slowdown above which a stage is flagged")
+    parser.add_argument("--keep", default=None, help="Keep the generated media and outputs in this folder")
+    args = parser.parse_args()
+
+    ai_model = None
+    if os.path.exists(args.model):
+        from appflow.detectModel import load_ai_model
+        ai_model = load_ai_model(args.model)
+    else:
+        print(f"Model {args.model} not found; detection stages are skipped and retuning uses the known regions.")
+
+    work_dir = args.keep or tempfile.mkdtemp(prefix="akira-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        started = time.perf_counter()
+        mp4_path, known_regions = make_synthetic_media(work_dir, args.seconds, args.seed)
+        raw_folder = os.path.join(work_dir, "raw_dataset")
+        make_raw_dataset(raw_folder, args.clips, args.clip_seconds, args.seed)
+        print(f"Synthetic media ready in {time.perf_counter() - started:.1f} s: {args.seconds} s video with "
+              f"{len(known_regions)} known regions, {args.clips} clips per dataset category.")
+
+        runs, detected, failures = [], None, {}
+        for run in range(args.runs):
+            run_dir = os.path.join(work_dir, f"run_{run}")
+            os.makedirs(run_dir, exist_ok=True)
+            timings, detected, run_failures = run_once(run_dir, mp4_path, known_regions, ai_model, args.workers,
+                                                       raw_folder)
+            runs.append(timings)
+            failures.update(run_failures)
+            if not args.keep:
+                shutil.rmtree(run_dir)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "params": {"seconds": args.seconds, "workers": args.workers, "seed": args.seed, "clips": args.clips,
+                   "clip_seconds": args.clip_seconds, "model": args.model if ai_model is not None else None},
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "runs": args.runs,
+        "stages": {stage: {"median_s": round(statistics.median(run[stage] for run in runs), 4),
+                           "runs_s": [round(run[stage], 4) for run in runs]}
+                   for stage in runs[0]},
+        "known_regions": len(known_regions),
+        "failures": failures,
+    }
+    if detected is not None:
+        results["accuracy"] = region_accuracy(detected, known_regions)
+
+    print(f"\n{'stage':<32}  {'median s':>9}  {'x realtime':>10}")
+    for stage, timing in results["stages"].items():
+        speed = args.seconds / timing["median_s"] if timing["median_s"] and stage != "build_dataset" else None
+        print(f"{stage:<32}  {timing['median_s']:9.3f}  {f'{speed:.1f}' if speed else '-':>10}")
+    for stage, failed in failures.items():
+        print(f"Warning: {failed} item(s) failed in {stage}; its timing does not cover the full workload.")
+    if "accuracy" in results:
+        print(f"Detection against the known regions: precision {results['accuracy']['precision']}, "
+              f"recall {results['accuracy']['recall']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressions over {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
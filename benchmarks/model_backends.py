@@ -0,0 +1,94 @@
+"""
+Compares inference backends against the Keras baseline on a held-out set of spectrograms:
+single-image latency, batched throughput, and how often each backend agrees with Keras.
+
+Export the models first (python akira.py export ...), then run from the repository root:
+
+    python -m benchmarks.model_backends --holdout model_dataset/val \
+        exported_models/overstimulating_audio_detector.float16.tflite \
+        exported_models/overstimulating_audio_detector.int8.tflite \
+        exported_models/overstimulating_audio_detector.onnx
+"""
+import argparse
+import json
+import statistics
+import time
+import numpy as np
+
+
+def measure_latency(backend, images, runs):
+    """Returns the median and 95th percentile single-image latency, in milliseconds."""
+    backend.predict_batch(images[:1])  # Warm-up
+    timings = []
+    for i in range(runs):
+        image = images[i % len(images)][np.newaxis]
+        started = time.perf_counter()
+        backend.predict_batch(image)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), float(np.percentile(timings, 95))
+
+
+def measure_throughput(backend, images, batch_size):
+    """Scores the whole held-out set in batches and returns (confidences, images per second)."""
+    backend.predict_batch(images[:batch_size])  # Warm-up at the measured batch size
+    confidences = np.empty(len(images), dtype=np.float32)
+    started = time.perf_counter()
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        confidences[start:start + len(batch)] = backend.predict_batch(batch)
+    return confidences, len(images) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("models", nargs="*", help="Exported .tflite / .onnx models to compare")
+    parser.add_argument("--baseline", default="overstimulating_audio_detector.h5")
+    parser.add_argument("--holdout", required=True, help="Folder of held-out spectrogram images")
+    parser.add_argument("--samples", type=int, default=None, help="Use a fixed random subset of the held-out set")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--latency-runs", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--threshold", type=float, default=0.75)
+    parser.add_argument("--output", default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    from appflow.exportModel import sample_spectrogram_images
+    from appflow.modelBackends import load_backend
+
+    images = sample_spectrogram_images(args.holdout, args.samples)
+    print(f"Held-out set: {len(images)} spectrograms from {args.holdout}")
+
+    rows, baseline = [], None
+    for model_path in [args.baseline] + args.models:
+        backend = load_backend(model_path, num_threads=args.threads)
+        median_ms, p95_ms = measure_latency(backend, images, args.latency_runs)
+        confidences, images_per_second = measure_throughput(backend, images, args.batch_size)
+        if baseline is None:
+            baseline = confidences
+
+        decisions = confidences > args.threshold
+        rows.append({
+            "model": model_path,
+            "backend": backend.name,
+            "latency_median_ms": round(median_ms, 2),
+            "latency_p95_ms": round(p95_ms, 2),
+            "images_per_second": round(images_per_second, 1),
+            "agreement": round(float(np.mean(decisions == (baseline > args.threshold))), 4),
+            "max_abs_diff": round(float(np.max(np.abs(confidences - baseline))), 4),
+        })
+
+    width = max(len(row["model"]) for row in rows)
+    print(f"{'model':<{width}}  {'backend':<7}  {'p50 ms':>8}  {'p95 ms':>8}  {'img/s':>8}  {'agree':>6}  {'max diff':>8}")
+    for row in rows:
+        print(f"{row['model']:<{width}}  {row['backend']:<7}  {row['latency_median_ms']:8.2f}  "
+              f"{row['latency_p95_ms']:8.2f}  {row['images_per_second']:8.1f}  {row['agreement']:6.1%}  "
+              f"{row['max_abs_diff']:8.4f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"holdout": args.holdout, "samples": len(images), "batch_size": args.batch_size,
+                       "threshold": args.threshold, "results": rows}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
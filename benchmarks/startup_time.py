@@ -0,0 +1,58 @@
+"""
+Measures CLI startup time: `akira.py --help`, each subcommand's --help, and the import cost
+each subcommand pays before it starts working.
+
+Run from the repository root:
+
+    python -m benchmarks.startup_time --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules each subcommand handler imports before doing any work
+COMMAND_IMPORTS = {
+    "build-dataset": ["buildDataset", "datasetManifest", "extractAudio", "preprocessAudio",
+                      "extractAudioFeatures", "createSpectrogram"],
+    "detect": ["appflow.detectModel", "appflow.streamingAnalysis"],
+    "retune": ["appflow.extractSpectroSound", "appflow.retunedDetected"],
+    "train": ["model_dataset.train_model"],
+    "export": ["appflow.exportModel"],
+}
+
+
+def time_command(command, runs):
+    """Returns the median wall time of a command over several runs, in milliseconds."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    cli = [sys.executable, os.path.join(ROOT, "akira.py")]
+    rows = [("python (empty interpreter)", time_command([sys.executable, "-c", "pass"], args.runs)),
+            ("akira.py --help", time_command(cli + ["--help"], args.runs))]
+    for command, modules in COMMAND_IMPORTS.items():
+        rows.append((f"akira.py {command} --help", time_command(cli + [command, "--help"], args.runs)))
+        imports = "; ".join(f"import {module}" for module in modules)
+        rows.append((f"akira.py {command} (imports)", time_command([sys.executable, "-c", imports], args.runs)))
+
+    width = max(len(label) for label, _ in rows)
+    for label, milliseconds in rows:
+        print(f"{label:<{width}}  {milliseconds:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
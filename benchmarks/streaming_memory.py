@@ -0,0 +1,77 @@
+"""
+Reports peak RSS of the streaming analysis mode on synthetic inputs of increasing length.
+
+Run from the repository root:
+
+    python -m benchmarks.streaming_memory --hours 0.5 2
+
+Each duration is analysed in a fresh process so its peak RSS is measured in isolation.
+Pass --model to include detection; otherwise only the segment spectrograms are streamed.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from imageio_ffmpeg import get_ffmpeg_exe
+
+
+def make_synthetic_audio(output_path, seconds, sr=44100):
+    """Encodes pink noise with periodic loud tone bursts, generated by ffmpeg without touching Python memory."""
+    source = (f"anoisesrc=d={seconds}:c=pink:r={sr}:a=0.05[noise];"
+              f"sine=f=3000:d={seconds}:r={sr},volume='if(lt(mod(t,60),8),0.8,0)':eval=frame[burst];"
+              f"[noise][burst]amix=inputs=2")
+    subprocess.run([get_ffmpeg_exe(), "-y", "-v", "error", "-filter_complex", source,
+                    "-ac", "2", "-c:a", "aac", "-b:a", "64k", output_path], check=True)
+
+
+def measure(input_path, model_path=None):
+    """Streams one input through the analysis and returns its segment count, time and peak RSS."""
+    from appflow.streamingAnalysis import stream_segment_spectrograms
+
+    started = time.perf_counter()
+    if model_path:
+        from appflow.detectModel import load_ai_model
+        from appflow.streamingAnalysis import analyse_video_streaming
+        segments = len(analyse_video_streaming(input_path, load_ai_model(model_path)))
+    else:
+        segments = sum(1 for _ in stream_segment_spectrograms(input_path))
+
+    # ru_maxrss is reported in kilobytes on Linux
+    return {
+        "segments": segments,
+        "seconds": round(time.perf_counter() - started, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, nargs="+", default=[0.5, 2.0], help="Synthetic input lengths")
+    parser.add_argument("--model", help="Path to the .h5 model; include detection in the measurement")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.model)))
+        return
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for hours in args.hours:
+            input_path = os.path.join(work_dir, f"synthetic_{hours}h.m4a")
+            make_synthetic_audio(input_path, int(hours * 3600))
+
+            command = [sys.executable, "-m", "benchmarks.streaming_memory", "--child", input_path]
+            if args.model:
+                command += ["--model", args.model]
+            result = json.loads(subprocess.run(command, capture_output=True, text=True, check=True).stdout.splitlines()[-1])
+            print(f"{hours:>5} h: {result['segments']} segments in {result['seconds']} s, "
+                  f"peak RSS {result['peak_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import argparse
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+
+def init_worker():
+    """Keeps each worker single-threaded and headless so the pool, not BLAS, uses the cores."""
+    for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMBA_NUM_THREADS"):
+        os.environ[variable] = "1"
+    os.environ["MPLBACKEND"] = "Agg"
+
+
+# Dataset stages in build order, each with the stage it reads from
+STAGES = ["audio", "preprocessed", "features", "spectrogram"]
+UPSTREAM = {"preprocessed": "audio", "features": "preprocessed", "spectrogram": "preprocessed"}
+
+
+def clip_paths(mp4_file, category, folders):
+    """Returns {stage: (input_file, output_file)} for the four stages of one source video."""
+    from preprocessAudio import preprocessed_path
+    from extractAudioFeatures import features_plot_path
+    from createSpectrogram import spectrogram_path
+
+    audio_file = os.path.join(folders["new"], category, os.path.splitext(os.path.basename(mp4_file))[0] + ".mp3")
+    preprocessed_file = preprocessed_path(audio_file, os.path.join(folders["preprocessed"], category))
+    return {
+        "audio": (mp4_file, audio_file),
+        "preprocessed": (audio_file, preprocessed_file),
+        "features": (preprocessed_file, features_plot_path(preprocessed_file, os.path.join(folders["visualized"], category))),
+        "spectrogram": (preprocessed_file, spectrogram_path(preprocessed_file, os.path.join(folders["spectrogram"], category))),
+    }
+
+
+def stage_params(gain_db=15, img_size=(224, 224)):
+    """Returns the parameters recorded in the manifest for each stage."""
+    from extractAudio import EXTRACT_PARAMS
+    from extractAudioFeatures import FEATURE_PARAMS
+    from createSpectrogram import spectrogram_params
+
+    return {"audio": EXTRACT_PARAMS, "preprocessed": {"gain_db": gain_db},
+            "features": FEATURE_PARAMS, "spectrogram": spectrogram_params(img_size)}
+
+
+def stale_stages(manifest, paths, params):
+    """Lists the stages that must run: those whose output is not current, plus everything downstream of them."""
+    stale = []
+    for stage in STAGES:
+        input_file, output_file = paths[stage]
+        if UPSTREAM.get(stage) in stale or not manifest.is_current(output_file, input_file, params[stage]):
+            stale.append(stage)
+    return stale
+
+
+def build_clip(mp4_file, category, folders, gain_db=15, img_size=(224, 224), stages=STAGES):
+    """
+    Pushes one source video through the given dataset stages inside a single worker.
+
+    Returns (mp4_file, outputs, error); outputs maps each completed stage to its output file and
+    error is the traceback text if a stage failed.
+    """
+    # Stage modules are imported here so they load once per worker, after init_worker has run
+    from extractAudio import extract_audio_file
+    from preprocessAudio import preprocess_audio
+    from extractAudioFeatures import visualize_features
+    from createSpectrogram import generate_spectrogram
+
+    outputs = {}
+    try:
+        paths = clip_paths(mp4_file, category, folders)
+        for _, output_file in paths.values():
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+        if "audio" in stages:
+            outputs["audio"] = extract_audio_file(*paths["audio"])  # step 1
+        if "preprocessed" in stages:
+            audio_file, preprocessed_file = paths["preprocessed"]
+            if preprocess_audio(audio_file, os.path.dirname(preprocessed_file), gain_db) is None:  # step 2
+                raise FileNotFoundError(f"Extracted audio missing: {audio_file}")
+            outputs["preprocessed"] = preprocessed_file
+        if "features" in stages:
+            preprocessed_file, plot_path = paths["features"]
+            outputs["features"] = visualize_features(preprocessed_file, os.path.dirname(plot_path))  # step 3
+        if "spectrogram" in stages:
+            preprocessed_file, image_path = paths["spectrogram"]
+            outputs["spectrogram"] = generate_spectrogram(preprocessed_file, os.path.dirname(image_path),
+                                                          img_size)  # step 4
+        return mp4_file, outputs, None
+    except Exception:
+        return mp4_file, outputs, traceback.format_exc()
+
+
+def find_source_videos(raw_folder, category_names=None):
+    """Lists (mp4_file, category) pairs for every source video in the category folders."""
+    if category_names is None:
+        from extractAudio import categories as category_names
+
+    videos = []
+    for category in category_names:
+        category_path = os.path.join(raw_folder, category)
+        if not os.path.exists(category_path):
+            print(f"Warning: {category_path} does not exist. Skipping...")
+            continue
+        for filename in sorted(os.listdir(category_path)):
+            if filename.endswith(".mp4"):
+                videos.append((os.path.join(category_path, filename), category))
+    return videos
+
+
+def build_dataset(raw_folder="raw_dataset", new_folder="new_dataset", preprocessed_folder="preprocessed_dataset",
+                  visualized_folder="visualized_dataset", spectrogram_folder="spectrogram_dataset",
+                  workers=None, gain_db=15, img_size=(224, 224), manifest_path="dataset_manifest.json"):
+    """
+    Builds the dataset incrementally in a process pool, one source video per task.
+
+    The manifest decides which stages of each video are stale, so only new or changed inputs
+    (or changed stage parameters) are processed, and outputs whose source video was deleted are
+    pruned. A failing video is reported in the summary without stopping the others. Returns the
+    summary dictionary that is also printed at the end.
+    """
+    from datasetManifest import DatasetManifest
+
+    folders = {"new": new_folder, "preprocessed": preprocessed_folder,
+               "visualized": visualized_folder, "spectrogram": spectrogram_folder}
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+
+    manifest = DatasetManifest(manifest_path)
+    pruned = manifest.prune()
+    params = stage_params(gain_db, img_size)
+
+    sources = find_source_videos(raw_folder)
+    jobs = {}
+    for mp4_file, category in sources:
+        paths = clip_paths(mp4_file, category, folders)
+        stages = stale_stages(manifest, paths, params)
+        if stages:
+            jobs[mp4_file] = (category, paths, stages)
+
+    succeeded, failed = [], {}
+    if jobs:
+        # spawn gives every worker a fresh interpreter, so init_worker runs before numpy and BLAS load
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                 initializer=init_worker) as pool:
+            futures = [pool.submit(build_clip, mp4_file, category, folders, gain_db, img_size, stages)
+                       for mp4_file, (category, _, stages) in jobs.items()]
+            for done, future in enumerate(as_completed(futures), start=1):
+                mp4_file, outputs, error = future.result()
+                paths = jobs[mp4_file][1]
+                for stage in outputs:
+                    input_file, output_file = paths[stage]
+                    manifest.record(output_file, stage, input_file, params[stage])
+
+                if error:
+                    failed[mp4_file] = error
+                    print(f"[{done}/{len(jobs)}] Failed: {mp4_file}")
+                else:
+                    succeeded.append(mp4_file)
+                    print(f"[{done}/{len(jobs)}] Built: {mp4_file}")
+    manifest.save()
+
+    summary = {
+        "videos": len(sources),
+        "up_to_date": len(sources) - len(jobs),
+        "succeeded": len(succeeded),
+        "failed": len(failed),
+        "pruned": len(pruned),
+        "workers": workers,
+        "seconds": round(time.perf_counter() - started, 2),
+        "errors": failed,
+    }
+    print_summary(summary)
+    return summary
+
+
+def print_summary(summary):
+    """Prints the build summary, including the last line of every error."""
+    print(f"\nDataset build finished in {summary['seconds']} s with {summary['workers']} workers: "
+          f"{summary['videos']} videos, {summary['up_to_date']} already up to date, {summary['succeeded']} built, "
+          f"{summary['failed']} failed, {summary['pruned']} stale outputs pruned.")
+    for mp4_file, error in summary["errors"].items():
+        print(f"  {mp4_file}: {error.strip().splitlines()[-1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the training dataset from the raw category videos.")
+    parser.add_argument("--raw-folder", default="raw_dataset")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--gain-db", type=float, default=15)
+    parser.add_argument("--manifest", default="dataset_manifest.json")
+    args = parser.parse_args()
+    build_dataset(args.raw_folder, workers=args.workers, gain_db=args.gain_db, manifest_path=args.manifest)
+
+
+if __name__ == "__main__":
+    main()
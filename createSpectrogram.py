@@ -1,12 +1,69 @@
 import os
 import librosa
-import librosa.display
 import numpy as np
-import matplotlib.pyplot as plt
-from PIL import Image
 
+# STFT settings used for every spectrogram image
+STFT_PARAMS = {"n_fft": 2048, "hop_length": 512}
 
-def generate_spectrograms(input_directory, output_directory, img_size=(224, 224)):
+
+def spectrogram_path(file_path, output_subdir):
+    """Return the spectrogram image path for an MP3 file."""
+    return os.path.join(output_subdir, f"{os.path.splitext(os.path.basename(file_path))[0]}_spectrogram.png")
+
+
+def spectrogram_params(img_size=(224, 224)):
+    """Return the parameters recorded in the dataset manifest for a spectrogram image."""
+    return {"img_size": list(img_size), "cmap": "magma", **STFT_PARAMS}
+
+
+def generate_spectrogram(file_path, output_subdir, img_size=(224, 224)):
+    """
+    Generate the spectrogram image of a single MP3 file and return the saved image path.
+
+    Args:
+        file_path (str): The MP3 file to process.
+        output_subdir (str): The directory where the spectrogram image will be saved.
+        img_size (tuple): The target size for the spectrogram image (default is 224x224).
+    """
+    import librosa.display
+    import matplotlib.pyplot as plt
+    from PIL import Image
+
+    filename = os.path.basename(file_path)
+
+    # Load audio file
+    y, sr = librosa.load(file_path, sr=None)
+
+    # Compute STFT spectrogram
+    D = np.abs(librosa.stft(y, **STFT_PARAMS))
+
+    # Create figure
+    fig, ax = plt.subplots(figsize=(5, 5), dpi=100)
+
+    # Display spectrogram
+    img = librosa.display.specshow(librosa.amplitude_to_db(D, ref=np.max), sr=sr, cmap='magma', ax=ax)
+
+    # Remove axis and padding
+    ax.axis("off")
+    plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
+
+    # Save spectrogram
+    temp_output_file = os.path.join(output_subdir, f"{os.path.splitext(filename)[0]}_spectrogram_temp.png")
+    fig.savefig(temp_output_file, transparent=True)
+    plt.close(fig)
+
+    # Resize to target size (224x224) and remove transparency
+    img = Image.open(temp_output_file).convert("RGB")
+    img = img.resize(img_size, Image.LANCZOS)
+    final_output_file = spectrogram_path(file_path, output_subdir)
+    img.save(final_output_file)
+    os.remove(temp_output_file)  # Remove temporary image
+
+    print(f"✅ Saved spectrogram: {final_output_file}")
+    return final_output_file
+
+
+def generate_spectrograms(input_directory, output_directory, img_size=(224, 224), manifest=None):
     """
     Generate spectrogram images from MP3 files and save them in the specified output directory.
 
@@ -14,7 +71,10 @@ def generate_spectrograms(input_directory, output_directory, img_size=(224, 224)
         input_directory (str): The directory containing MP3 files to process.
         output_directory (str): The directory where the spectrogram images will be saved.
         img_size (tuple): The target size for the spectrogram images (default is 224x224).
+        manifest (DatasetManifest): Optional manifest; files whose image is already current are skipped.
     """
+    params = spectrogram_params(img_size)
+
     # Ensure the output directory exists
     os.makedirs(output_directory, exist_ok=True)
 
@@ -27,41 +87,19 @@ def generate_spectrograms(input_directory, output_directory, img_size=(224, 224)
         for filename in files:
             if filename.endswith(".mp3"):
                 file_path = os.path.join(subdir, filename)
+                output_file = spectrogram_path(file_path, output_subdir)
+                if manifest is not None and manifest.is_current(output_file, file_path, params):
+                    continue
 
-                # Load audio file
-                y, sr = librosa.load(file_path, sr=None)
-
-                # Compute STFT spectrogram
-                D = np.abs(librosa.stft(y))
-
-                # Create figure
-                fig, ax = plt.subplots(figsize=(5, 5), dpi=100)
-
-                # Display spectrogram
-                img = librosa.display.specshow(librosa.amplitude_to_db(D, ref=np.max), sr=sr, cmap='magma', ax=ax)
-
-                # Remove axis and padding
-                ax.axis("off")
-                plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
-
-                # Save spectrogram
-                temp_output_file = os.path.join(output_subdir, f"{os.path.splitext(filename)[0]}_spectrogram_temp.png")
-                fig.savefig(temp_output_file, transparent=True)
-                plt.close(fig)
-
-                # Resize to target size (224x224) and remove transparency
-                img = Image.open(temp_output_file).convert("RGB")
-                img = img.resize(img_size, Image.LANCZOS)
-                final_output_file = os.path.join(output_subdir, f"{os.path.splitext(filename)[0]}_spectrogram.png")
-                img.save(final_output_file)
-                os.remove(temp_output_file)  # Remove temporary image
-
-                print(f"✅ Saved spectrogram: {final_output_file}")
+                generate_spectrogram(file_path, output_subdir, img_size)
+                if manifest is not None:
+                    manifest.record(output_file, "spectrogram", file_path, params)
 
     print("🎉 Spectrogram generation completed!")
 
 
 # Example usage
-input_directory = "preprocessed_dataset"  # Source folder (MP3 files in subdirectories)
-output_directory = "spectrogram_dataset"  # Destination folder
-generate_spectrograms(input_directory, output_directory)
+if __name__ == "__main__":
+    input_directory = "preprocessed_dataset"  # Source folder (MP3 files in subdirectories)
+    output_directory = "spectrogram_dataset"  # Destination folder
+    generate_spectrograms(input_directory, output_directory)
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+
+
+def normalize_params(params):
+    """Round-trips stage parameters through JSON so tuples and lists compare equal to stored values."""
+    return json.loads(json.dumps(params, sort_keys=True))
+
+
+class DatasetManifest:
+    """
+    Records, for every dataset output, the content hash of its input and the stage parameters used.
+
+    An output is current when it exists, its input still hashes to the recorded value and the
+    stage parameters are unchanged. Content hashes are cached by file size and modification
+    time, so unchanged files are not re-read on every run.
+    """
+
+    def __init__(self, path="dataset_manifest.json"):
+        self.path = path
+        self.outputs = {}
+        self.hashes = {}
+        if os.path.exists(path):
+            with open(path, "r") as manifest_file:
+                data = json.load(manifest_file)
+            self.outputs = data.get("outputs", {})
+            self.hashes = data.get("hashes", {})
+
+    def file_hash(self, file_path):
+        """Returns the SHA-256 of a file, reusing the cached value while its size and mtime are unchanged."""
+        stat = os.stat(file_path)
+        cached = self.hashes.get(file_path)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        self.hashes[file_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def is_current(self, output_file, input_file, params):
+        """Checks whether output_file was built from the current content of input_file with these parameters."""
+        entry = self.outputs.get(output_file)
+        if entry is None or not os.path.exists(output_file) or not os.path.exists(input_file):
+            return False
+        return (entry["input"] == input_file and entry["params"] == normalize_params(params)
+                and entry["input_hash"] == self.file_hash(input_file))
+
+    def record(self, output_file, stage, input_file, params):
+        """Records that output_file was just built by stage from input_file."""
+        self.outputs[output_file] = {
+            "stage": stage,
+            "input": input_file,
+            "input_hash": self.file_hash(input_file),
+            "params": normalize_params(params),
+        }
+
+    def prune(self):
+        """
+        Deletes outputs whose input no longer exists, cascading down the stage chain.
+
+        Returns the list of removed output paths.
+        """
+        removed = []
+        changed = True
+        while changed:
+            changed = False
+            for output_file, entry in list(self.outputs.items()):
+                if not os.path.exists(entry["input"]):
+                    if os.path.exists(output_file):
+                        os.remove(output_file)
+                    del self.outputs[output_file]
+                    removed.append(output_file)
+                    changed = True
+
+        self.hashes = {path: cached for path, cached in self.hashes.items() if os.path.exists(path)}
+        return removed
+
+    def save(self):
+        """Writes the manifest atomically, so an interrupted run never leaves a truncated file."""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as manifest_file:
+            json.dump({"outputs": self.outputs, "hashes": self.hashes}, manifest_file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
@@ -1,9 +1,11 @@
-from moviepy import VideoFileClip
 import os
 
 # Define category folders
 categories = ["Chaotic", "High Frequency", "High Intensity", "Abrupt", "Repetitive", "Non-Overstimulating"]
 
+# Parameters recorded in the dataset manifest for extracted audio
+EXTRACT_PARAMS = {"format": "mp3"}
+
 # Base directories
 raw_dataset_folder = os.path.join(os.getcwd(), "raw_dataset")
 new_dataset_folder = os.path.join(os.getcwd(), "new_dataset")
@@ -14,12 +16,23 @@ def ensure_folder_exists(folder_path):
     os.makedirs(folder_path, exist_ok=True)
 
 
-# Create the new_dataset directory
-ensure_folder_exists(new_dataset_folder)
+def extract_audio_file(mp4_file, audio_file):
+    """Extracts the audio track of a single MP4 file and saves it as an MP3."""
+    from moviepy import VideoFileClip
+
+    with VideoFileClip(mp4_file) as video_clip:
+        with video_clip.audio as audio_clip:
+            audio_clip.write_audiofile(audio_file)
+    return audio_file
 
 
-def extract_audio_batch():
-    """Extracts audio from MP4 files in each category folder and saves them in 'new_dataset'."""
+def extract_audio_batch(manifest=None):
+    """
+    Extracts audio from MP4 files in each category folder and saves them in 'new_dataset'.
+    With a DatasetManifest, videos whose MP3 is already current are skipped.
+    """
+    # Create the new_dataset directory
+    ensure_folder_exists(new_dataset_folder)
 
     for category in categories:
         category_path = os.path.join(raw_dataset_folder, category)
@@ -36,13 +49,14 @@ def extract_audio_batch():
             if filename.endswith(".mp4"):
                 mp4_file = os.path.join(category_path, filename)
                 audio_file = os.path.join(output_category_path, os.path.splitext(filename)[0] + ".mp3")
+                if manifest is not None and manifest.is_current(audio_file, mp4_file, EXTRACT_PARAMS):
+                    continue
 
                 try:
-                    with VideoFileClip(mp4_file) as video_clip:
-                        with video_clip.audio as audio_clip:
-                            audio_clip.write_audiofile(audio_file)
-
+                    extract_audio_file(mp4_file, audio_file)
                     extracted_files.append(audio_file)
+                    if manifest is not None:
+                        manifest.record(audio_file, "audio", mp4_file, EXTRACT_PARAMS)
                     print(f"Extracted audio saved: {audio_file}")
 
                 except Exception as e:
@@ -51,6 +65,7 @@ def extract_audio_batch():
 
 def remove_audio_batch():
     """Removes audio from MP4 files in each category folder and saves them in 'new_dataset'."""
+    from moviepy import VideoFileClip
 
     for category in categories:
         category_path = os.path.join(raw_dataset_folder, category)
@@ -81,5 +96,6 @@ def remove_audio_batch():
 
 
 # Run the functions
-extract_audio_batch()
-# remove_audio_batch()
\ No newline at end of file
+if __name__ == "__main__":
+    extract_audio_batch()
+    # remove_audio_batch()
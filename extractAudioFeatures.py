@@ -1,79 +1,92 @@
 import os
 import librosa
-import librosa.display
 import numpy as np
-import matplotlib.pyplot as plt
+
+# STFT and MFCC settings, also recorded in the dataset manifest for each plot
+FEATURE_PARAMS = {"n_fft": 2048, "hop_length": 512, "n_mfcc": 13}
 
 def ensure_folder_exists(folder_path):
     """Creates a folder if it does not exist."""
     os.makedirs(folder_path, exist_ok=True)
 
+def features_plot_path(mp3_file, output_folder):
+    """Returns the feature plot path for an MP3 file."""
+    return os.path.join(output_folder, os.path.splitext(os.path.basename(mp3_file))[0] + "_features.png")
+
+def visualize_features(mp3_file, output_folder):
+    """Plots the STFT, MFCC and loudness waveforms of one MP3 file and returns the saved plot path."""
+    import matplotlib.pyplot as plt
+
+    # Load audio file
+    y, sr = librosa.load(mp3_file, sr=None)
+
+    # Compute STFT
+    stft = np.abs(librosa.stft(y, n_fft=FEATURE_PARAMS["n_fft"], hop_length=FEATURE_PARAMS["hop_length"]))
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=FEATURE_PARAMS["n_fft"])
+    stft_mean = np.mean(stft, axis=1)
+
+    # Convert frequency to kHz
+    freqs_khz = freqs / 1000
+
+    # Compute MFCC
+    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=FEATURE_PARAMS["n_mfcc"])
+    mfcc_mean = np.mean(mfcc, axis=1)
+
+    # Compute Loudness (RMS Energy) in dB
+    rms = librosa.feature.rms(y=y, frame_length=FEATURE_PARAMS["n_fft"], hop_length=FEATURE_PARAMS["hop_length"])[0]
+    rms_db = librosa.amplitude_to_db(rms, ref=np.max)
+
+    # Ensure output folder exists
+    ensure_folder_exists(output_folder)
+
+    # Generate plot filename
+    plot_path = features_plot_path(mp3_file, output_folder)
+
+    # Plot and save waveforms
+    plt.figure(figsize=(12, 6))
+
+    # STFT Waveform (in kHz)
+    plt.subplot(3, 1, 1)
+    plt.plot(freqs_khz, stft_mean, color="blue")
+    plt.title("STFT Waveform")
+    plt.xlabel("Frequency (kHz)")
+    plt.ylabel("Magnitude")
+    plt.grid()
+
+    # MFCC Waveform (in dB)
+    plt.subplot(3, 1, 2)
+    plt.plot(range(1, FEATURE_PARAMS["n_mfcc"] + 1), mfcc_mean, color="red")
+    plt.title("MFCC Waveform")
+    plt.xlabel("MFCC Coefficients")
+    plt.ylabel("Amplitude (dB)")
+    plt.grid()
+
+    # Loudness Waveform (in dB)
+    plt.subplot(3, 1, 3)
+    plt.plot(rms_db, color="green")
+    plt.title("Loudness Waveform (RMS in dB)")
+    plt.xlabel("Frames")
+    plt.ylabel("Loudness (dB)")
+    plt.grid()
+
+    plt.tight_layout()
+    plt.savefig(plot_path)  # Save as image
+    plt.close()
+
+    print(f"Feature visualization saved: {plot_path}")
+    return plot_path
+
 def extract_and_visualize_features(mp3_file, output_folder):
     try:
-        # Load audio file
-        y, sr = librosa.load(mp3_file, sr=None)
-
-        # Compute STFT
-        stft = np.abs(librosa.stft(y))
-        freqs = librosa.fft_frequencies(sr=sr)
-        stft_mean = np.mean(stft, axis=1)
-
-        # Convert frequency to kHz
-        freqs_khz = freqs / 1000
-
-        # Compute MFCC
-        mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-        mfcc_mean = np.mean(mfcc, axis=1)
-
-        # Compute Loudness (RMS Energy) in dB
-        rms = librosa.feature.rms(y=y)[0]
-        rms_db = librosa.amplitude_to_db(rms, ref=np.max)
-
-        # Ensure output folder exists
-        ensure_folder_exists(output_folder)
-
-        # Generate plot filename
-        filename = os.path.splitext(os.path.basename(mp3_file))[0] + "_features.png"
-        plot_path = os.path.join(output_folder, filename)
-
-        # Plot and save waveforms
-        plt.figure(figsize=(12, 6))
-
-        # STFT Waveform (in kHz)
-        plt.subplot(3, 1, 1)
-        plt.plot(freqs_khz, stft_mean, color="blue")
-        plt.title("STFT Waveform")
-        plt.xlabel("Frequency (kHz)")
-        plt.ylabel("Magnitude")
-        plt.grid()
-
-        # MFCC Waveform (in dB)
-        plt.subplot(3, 1, 2)
-        plt.plot(range(1, 14), mfcc_mean, color="red")
-        plt.title("MFCC Waveform")
-        plt.xlabel("MFCC Coefficients")
-        plt.ylabel("Amplitude (dB)")
-        plt.grid()
-
-        # Loudness Waveform (in dB)
-        plt.subplot(3, 1, 3)
-        plt.plot(rms_db, color="green")
-        plt.title("Loudness Waveform (RMS in dB)")
-        plt.xlabel("Frames")
-        plt.ylabel("Loudness (dB)")
-        plt.grid()
-
-        plt.tight_layout()
-        plt.savefig(plot_path)  # Save as image
-        plt.close()
-
-        print(f"Feature visualization saved: {plot_path}")
-
+        return visualize_features(mp3_file, output_folder)
     except Exception as e:
         print(f"Error processing {mp3_file}: {e}")
 
-def plot_audio_features(input_folder, output_folder):
-    """Recursively processes all MP3 files in the input folder and creates matching subdirectories in visualized_dataset."""
+def plot_audio_features(input_folder, output_folder, manifest=None):
+    """
+    Recursively processes all MP3 files in the input folder and creates matching subdirectories in visualized_dataset.
+    With a DatasetManifest, files whose plot is already current are skipped.
+    """
     for subdir, _, files in os.walk(input_folder):
         relative_path = os.path.relpath(subdir, input_folder)
         output_subdir = os.path.join(output_folder, relative_path)
@@ -82,12 +95,18 @@ def plot_audio_features(input_folder, output_folder):
         for file in files:
             if file.endswith(".mp3"):
                 input_file = os.path.join(subdir, file)
-                extract_and_visualize_features(input_file, output_subdir)
+                plot_path = features_plot_path(input_file, output_subdir)
+                if manifest is not None and manifest.is_current(plot_path, input_file, FEATURE_PARAMS):
+                    continue
+
+                if extract_and_visualize_features(input_file, output_subdir) and manifest is not None:
+                    manifest.record(plot_path, "features", input_file, FEATURE_PARAMS)
 
-# Define input and output folders
-input_folder = "preprocessed_dataset"
-visualized_folder = "visualized_dataset"
-ensure_folder_exists(visualized_folder)
+if __name__ == "__main__":
+    # Define input and output folders
+    input_folder = "preprocessed_dataset"
+    visualized_folder = "visualized_dataset"
+    ensure_folder_exists(visualized_folder)
 
-# Process all MP3 files and save to visualized_dataset with subdirectories
-plot_audio_features(input_folder, visualized_folder)
+    # Process all MP3 files and save to visualized_dataset with subdirectories
+    plot_audio_features(input_folder, visualized_folder)
@@ -1,8 +1,42 @@
+import argparse
+import os
+import pickle
+import sys
 import matplotlib.pyplot as plt
+import numpy as np
 import tensorflow as tf
 
-# Load trained model
-model = tf.keras.models.load_model("overstimulating_audio_detector.h5")
+if not __package__:
+    # Run as a script (python evaluate_model.py): make the model_dataset package importable from the repository root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def evaluate_on_shards(model, shards_path, split="val", batch_size=32, threshold=0.5):
+    """
+    Scores a trained model on one split of a spectrogram shard export.
+
+    The images are read straight from the memory-mapped shards, so evaluation decodes no PNGs.
+    Returns the accuracy, the confusion counts and the source files of the misclassified images.
+    """
+    from model_dataset.train_model import ShardImages, open_shards
+
+    shards = open_shards(shards_path, tuple(model.input_shape[1:3]))
+    indices = shards.split_indices(split)
+    if not len(indices):
+        raise ValueError(f"Split '{split}' of '{shards_path}' is empty")
+    confidences = model.predict(ShardImages(shards, indices, batch_size), verbose=0).reshape(-1)
+    predicted = confidences > threshold
+    actual = shards.labels[indices] > 0.5
+    return {
+        "split": split,
+        "images": len(indices),
+        "accuracy": float(np.mean(predicted == actual)),
+        "true_positives": int(np.sum(predicted & actual)),
+        "false_positives": int(np.sum(predicted & ~actual)),
+        "true_negatives": int(np.sum(~predicted & ~actual)),
+        "false_negatives": int(np.sum(~predicted & actual)),
+        "misclassified": [shards.records[i]["source"] for i in indices[predicted != actual]],
+    }
 
 
 # Plot training history
@@ -48,10 +82,32 @@ def plot_training_history(history):
     plt.show()
 
 
-# Load training history
-import pickle
+def main():
+    parser = argparse.ArgumentParser(description="Plot the training history or evaluate the trained detector.")
+    parser.add_argument("--history", default="training_history.pkl")
+    parser.add_argument("--model", default="overstimulating_audio_detector.h5")
+    parser.add_argument("--shards", help="Evaluate the model on this spectrogram shard export instead of plotting")
+    parser.add_argument("--split", default="val", choices=["train", "val"])
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    if args.shards:
+        # Load trained model
+        model = tf.keras.models.load_model(args.model)
+        report = evaluate_on_shards(model, args.shards, args.split, args.batch_size)
+        print(f"{report['split']}: {report['accuracy']:.3f} accuracy on {report['images']} images "
+              f"(TP {report['true_positives']}, FP {report['false_positives']}, "
+              f"TN {report['true_negatives']}, FN {report['false_negatives']})")
+        for source in report["misclassified"]:
+            print(f"  misclassified: {source}")
+        return
+
+    # Load training history
+    with open(args.history, 'rb') as f:
+        history = pickle.load(f)
+
+    plot_training_history(history)
 
-with open('training_history.pkl', 'rb') as f:
-    history = pickle.load(f)
 
-plot_training_history(history)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import math
+import os
+import numpy as np
+from appflow.detectModel import NEGATIVE_CATEGORIES
+
+SPLITS = ("train", "val")
+
+# Image files read from dataset folders, here and by train_model
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def hash_split(digest, val_fraction):
+    """Assigns an image to a split from its content hash, so the split is stable as the dataset grows."""
+    return "val" if int(digest[:8], 16) / 0xFFFFFFFF < val_fraction else "train"
+
+
+def find_spectrograms(source_folder, val_fraction=0.2, negative_categories=NEGATIVE_CATEGORIES):
+    """
+    Lists (path, label, class_name, split) for every spectrogram image under source_folder.
+
+    A folder with train/ and val/ class folders (the training layout) keeps its split, and
+    classes are labelled in sorted order like flow_from_directory. A folder of category
+    folders (spectrogram_dataset) is labelled 1 for overstimulating categories and 0 for
+    negative_categories, and split by content hash.
+    """
+    entries = []
+    if all(os.path.isdir(os.path.join(source_folder, split)) for split in SPLITS):
+        for split in SPLITS:
+            split_folder = os.path.join(source_folder, split)
+            classes = sorted(name for name in os.listdir(split_folder)
+                             if os.path.isdir(os.path.join(split_folder, name)))
+            for label, class_name in enumerate(classes):
+                for path in list_image_files(os.path.join(split_folder, class_name)):
+                    entries.append((path, label, class_name, split))
+    else:
+        for category in sorted(os.listdir(source_folder)):
+            category_folder = os.path.join(source_folder, category)
+            if not os.path.isdir(category_folder):
+                continue
+            label = 0 if category in negative_categories else 1
+            for path in list_image_files(category_folder):
+                entries.append((path, label, category, None))
+    if not entries:
+        raise ValueError(f"No spectrogram images found under '{source_folder}'")
+    return entries
+
+
+def list_image_files(folder):
+    return [os.path.join(root, name) for root, _, files in sorted(os.walk(folder))
+            for name in sorted(files) if name.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def file_sha256(path):
+    """SHA-256 of a file's bytes: the key of the shard index and of the training embedding cache."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_image(path, img_size=(224, 224)):
+    """Decodes an image to uint8 RGB, dropping alpha and resizing like the Keras image loader."""
+    from PIL import Image
+
+    image = Image.open(path).convert("RGB")
+    if image.size != tuple(img_size):
+        image = image.resize(img_size, Image.NEAREST)
+    return np.asarray(image, dtype=np.uint8)
+
+
+def export_shards(source_folder, output_folder, shard_size=1024, val_fraction=0.2, img_size=(224, 224),
+                  negative_categories=NEGATIVE_CATEGORIES):
+    """
+    Exports a folder of spectrogram PNGs to fixed-shape uint8 .npy shards plus an index.json.
+
+    Every split gets its own shards (train-00000.npy, ...), each holding shard_size images of
+    img_size x 3; the last one is zero-padded. The index lists, for every image, its split,
+    shard, row, label, class, source file and SHA-256, so training and evaluation open the
+    shards with mmap and never touch the PNGs or list directories again. Returns the index.
+    """
+    entries = find_spectrograms(source_folder, val_fraction, negative_categories)
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Hash every file first (the hash may pick its split); images are decoded later, one shard at a time
+    records = []
+    for path, label, class_name, split in entries:
+        digest = file_sha256(path)
+        records.append({"split": split or hash_split(digest, val_fraction), "label": label, "class": class_name,
+                        "source": os.path.relpath(path, source_folder), "sha256": digest})
+
+    index = {
+        "meta": {"img_size": list(img_size), "channels": 3, "dtype": "uint8", "shard_size": shard_size,
+                 "source_folder": source_folder},
+        "shards": {},
+        "records": [],
+    }
+    for split in SPLITS:
+        split_records = [record for record in records if record["split"] == split]
+        num_shards = math.ceil(len(split_records) / shard_size)
+        index["shards"][split] = []
+        for shard_number in range(num_shards):
+            name = f"{split}-{shard_number:05d}.npy"
+            shard = np.lib.format.open_memmap(os.path.join(output_folder, name), mode="w+", dtype=np.uint8,
+                                              shape=(shard_size, *img_size, 3))
+            chunk = split_records[shard_number * shard_size:(shard_number + 1) * shard_size]
+            for row, record in enumerate(chunk):
+                shard[row] = load_image(os.path.join(source_folder, record["source"]), img_size)
+                index["records"].append({**record, "shard": name, "row": row})
+            shard.flush()
+            del shard
+            index["shards"][split].append(name)
+
+    with open(os.path.join(output_folder, "index.json"), "w") as f:
+        json.dump(index, f, indent=1)
+    counts = {split: sum(1 for record in index["records"] if record["split"] == split) for split in SPLITS}
+    print(f"Exported {len(index['records'])} spectrograms to {output_folder}: "
+          + ", ".join(f"{count} {split}" for split, count in counts.items()))
+    return index
+
+
+class SpectrogramShards:
+    """Opens an exported shard folder: the index, and every shard as a read-only memmap."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        with open(os.path.join(folder, "index.json")) as f:
+            index = json.load(f)
+        self.meta = index["meta"]
+        self.records = index["records"]
+        names = [name for split in SPLITS for name in index["shards"].get(split, [])]
+        self.shards = [np.load(os.path.join(folder, name), mmap_mode="r") for name in names]
+        shard_ids = {name: i for i, name in enumerate(names)}
+        self.shard_ids = np.array([shard_ids[record["shard"]] for record in self.records], dtype=np.int64)
+        self.rows = np.array([record["row"] for record in self.records], dtype=np.int64)
+        self.labels = np.array([record["label"] for record in self.records], dtype=np.float32)
+        self.splits = np.array([record["split"] for record in self.records])
+
+    def split_indices(self, split):
+        """Positions in the index of the images of one split."""
+        return np.flatnonzero(self.splits == split)
+
+    def images(self, indices, out=None):
+        """
+        Gathers the uint8 images at the given index positions into one array.
+
+        Rows are copied straight from the memmaps, one shard at a time in row order, so only
+        the pages of the requested images are read.
+        """
+        indices = np.asarray(indices)
+        if out is None:
+            out = np.empty((len(indices), *self.meta["img_size"], self.meta["channels"]), dtype=np.uint8)
+        shard_ids, rows = self.shard_ids[indices], self.rows[indices]
+        for shard_id in np.unique(shard_ids):
+            positions = np.flatnonzero(shard_ids == shard_id)
+            positions = positions[np.argsort(rows[positions])]
+            out[positions] = self.shards[shard_id][rows[positions]]
+        return out
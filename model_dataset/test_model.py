@@ -1,20 +1,46 @@
-import tensorflow as tf
+import argparse
+import os
+import sys
 import numpy as np
 from tensorflow.keras.preprocessing import image
 
-# Load the trained model
-model = tf.keras.models.load_model("audio-detector.h5")
+if not __package__:
+    # Run as a script (python test_model.py): make the appflow package importable from the repository root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_TEST_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test-data", "test-spectro-10.png")
+
 
 # Function to predict a new image
-def predict_image(img_path):
+def predict_image(img_path, detector, threshold=0.5):
     img = image.load_img(img_path, target_size=(224, 224))
     img_array = image.img_to_array(img) / 255.0
     img_array = np.expand_dims(img_array, axis=0)
 
-    prediction = model.predict(img_array)
-    return "Overstimulating" if prediction[0][0] > 0.5 else "Non-Overstimulating"
+    confidence = float(detector.predict_batch(img_array)[0])
+    return "Overstimulating" if confidence > threshold else "Non-Overstimulating", confidence
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify spectrogram images with the trained detector.")
+    parser.add_argument("images", nargs="*", default=[DEFAULT_TEST_IMAGE])
+    parser.add_argument("--model", default="audio-detector.h5")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--xla", action="store_true", help="Compile the model with XLA")
+    args = parser.parse_args()
+
+    # Load the trained model once, compiled and warmed up, then score every image with it
+    from appflow.detectModel import load_ai_model
+    detector = load_ai_model(args.model, jit_compile=args.xla)
+
+    for test_image_path in args.images:
+        result, confidence = predict_image(test_image_path, detector, args.threshold)
+        print(f"{test_image_path}: {result} ({confidence:.3f})")
+
+    report = detector.latency_report()
+    if report:
+        print(f"Steady-state latency: {report['batch_p50_ms']} ms per image (p95 {report['batch_p95_ms']} ms)")
+
 
-# Test on a sample image
-test_image_path = "test-data/test-spectro-2.png"
-result = predict_image(test_image_path)
-print(f"Prediction: {result}")
+if __name__ == "__main__":
+    main()
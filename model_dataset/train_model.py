@@ -1,54 +1,379 @@
 import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.applications import VGG16
 from tensorflow.keras import layers, models
+import json
+import math
 import os
 import pickle  # Import pickle to save training history
+import sys
+import time
+import numpy as np
 
-# Define dataset path
-dataset_path = "C:/Akira/modify-audio/model_dataset"
-train_dir = os.path.join(dataset_path, "train")
-val_dir = os.path.join(dataset_path, "val")
-
-# Image preprocessing
-train_datagen = ImageDataGenerator(rescale=1.0/255)
-val_datagen = ImageDataGenerator(rescale=1.0/255)
-
-train_generator = train_datagen.flow_from_directory(
-    train_dir, target_size=(224, 224), batch_size=32, class_mode='binary'
-)
-
-val_generator = val_datagen.flow_from_directory(  # Use separate generator for validation
-    val_dir, target_size=(224, 224), batch_size=32, class_mode='binary'
-)
-
-# Load VGG16 model
-base_model = VGG16(weights="imagenet", include_top=False, input_shape=(224, 224, 3))
-for layer in base_model.layers[:-4]:
-    layer.trainable = False
-
-# Build the model
-model = models.Sequential([
-    base_model,
-    layers.Flatten(),
-    layers.Dense(256, activation='relu'),
-    layers.Dropout(0.5),
-    layers.Dense(1, activation='sigmoid')
-])
-
-# Compile the model
-model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=0.0001),
-              loss='binary_crossentropy',
-              metrics=['accuracy'])
-
-# Train the model
-history = model.fit(train_generator, epochs=20, validation_data=val_generator)
-
-# Save the model
-model.save("overstimulating_audio_detector.h5")
-print("Model training completed and saved!")
-
-# ✅ Save training history
-with open("training_history.pkl", "wb") as f:
-    pickle.dump(history.history, f)
-print("Training history saved!")
+if not __package__:
+    # Run as a script (python train_model.py): make the model_dataset package importable from the repository root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_dataset.spectrogram_shards import IMAGE_EXTENSIONS, SpectrogramShards, file_sha256
+
+# Define dataset path (folder with train/ and val/ class folders); AKIRA_DATASET overrides it
+dataset_path = os.environ.get("AKIRA_DATASET", "model_dataset")
+
+
+def list_images(directory):
+    """
+    Lists (paths, labels, class_names) for a folder of class subfolders.
+
+    Classes are sorted by name and labelled by their position, the same mapping
+    flow_from_directory uses, so models trained either way read their outputs the same way.
+    """
+    class_names = sorted(name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name)))
+    paths, labels = [], []
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(directory, class_name)
+        for root, _, files in sorted(os.walk(class_dir)):
+            for filename in sorted(files):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(root, filename))
+                    labels.append(label)
+    if not paths:
+        raise ValueError(f"No images found in the class folders of '{directory}'")
+    return paths, labels, class_names
+
+
+def decode_image(path, label, img_size=(224, 224)):
+    """Reads and decodes one PNG into float32 RGB in [0, 1], like ImageDataGenerator(rescale=1/255)."""
+    image = tf.io.decode_png(tf.io.read_file(path), channels=3)  # Drops the alpha channel
+    image = tf.image.resize(image, img_size, method="nearest")  # flow_from_directory's default interpolation
+    return tf.cast(image, tf.float32) / 255.0, tf.cast(label, tf.float32)
+
+
+def image_dataset(directory, img_size=(224, 224), batch_size=32, shuffle=False, cache="memory", seed=0):
+    """
+    Builds the tf.data input pipeline for one split and returns (dataset, number of images).
+
+    PNGs are decoded in parallel. With cache="memory" the decoded images are kept in RAM after
+    the first epoch; any other value is a file prefix for an on-disk cache, and None disables
+    caching. Training splits are reshuffled every epoch after the cache, and the next batches
+    are prefetched while the model trains on the current one.
+    """
+    paths, labels, _ = list_images(directory)
+    dataset = tf.data.Dataset.from_tensor_slices((paths, labels))
+    dataset = dataset.map(lambda path, label: decode_image(path, label, img_size),
+                          num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+    if cache == "memory":
+        dataset = dataset.cache()
+    elif cache:
+        os.makedirs(os.path.dirname(os.path.abspath(cache)), exist_ok=True)
+        dataset = dataset.cache(cache)
+    if shuffle:
+        dataset = dataset.shuffle(len(paths), seed=seed, reshuffle_each_iteration=True)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE), len(paths)
+
+
+class ThroughputLogger(tf.keras.callbacks.Callback):
+    """Prints the training images per second of every epoch, validation excluded."""
+
+    def __init__(self, num_images):
+        super().__init__()
+        self.num_images = num_images
+        self.images_per_second = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.started = time.perf_counter()
+        self.train_end = None
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.train_end = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        seconds = (self.train_end or time.perf_counter()) - self.started
+        self.images_per_second.append(self.num_images / seconds)
+        print(f"Epoch {epoch + 1}: {self.images_per_second[-1]:.1f} images/s ({seconds:.1f} s of training)")
+
+
+def build_model(img_size=(224, 224), fine_tune_layers=4, weights="imagenet"):
+    """Builds the detector: VGG16 with all but its last fine_tune_layers frozen, and the dense head."""
+    base_model = VGG16(weights=weights, include_top=False, input_shape=(*img_size, 3))
+    for layer in base_model.layers[:len(base_model.layers) - fine_tune_layers]:
+        layer.trainable = False
+
+    head = [
+        layers.Flatten(),
+        layers.Dense(256, activation='relu'),
+        layers.Dropout(0.5),
+        layers.Dense(1, activation='sigmoid')
+    ]
+    return models.Sequential([base_model, *head]), base_model, head
+
+
+def split_frozen_prefix(base_model, fine_tune_layers=4):
+    """Returns (prefix, tail): the frozen part of VGG16 as its own model, and the trainable layers after it."""
+    boundary = len(base_model.layers) - fine_tune_layers
+    prefix = models.Model(base_model.input, base_model.layers[boundary - 1].output, name="vgg16_frozen_prefix")
+    return prefix, base_model.layers[boundary:]
+
+
+class EmbeddingCache:
+    """
+    Activations of the frozen VGG16 prefix, one memory-mapped row per distinct image.
+
+    Rows live in features.npy and are found through index.json, keyed by the SHA-256 of the
+    image file, so renamed or duplicated images reuse their row and only new images run
+    through the prefix. The cache is discarded when the prefix layer, input size or dtype change.
+    """
+
+    def __init__(self, cache_dir, prefix_layer, img_size=(224, 224), dtype="float16"):
+        self.cache_dir = cache_dir
+        self.features_path = os.path.join(cache_dir, "features.npy")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.meta = {"prefix_layer": prefix_layer, "img_size": list(img_size), "dtype": dtype}
+        self.rows = {}
+        if os.path.exists(self.index_path) and os.path.exists(self.features_path):
+            with open(self.index_path) as f:
+                data = json.load(f)
+            if data.get("meta") == self.meta:
+                self.rows = data["rows"]
+
+    def features(self):
+        """Opens the cached activations read-only, without loading them."""
+        return np.load(self.features_path, mmap_mode="r")
+
+    def update(self, paths, prefix, batch_size=32):
+        """Runs the images the cache does not have yet through the prefix and returns the row of every path."""
+        def decode_batches(missing_paths):
+            images = tf.data.Dataset.from_tensor_slices(missing_paths)
+            images = images.map(lambda path: decode_image(path, 0, tuple(self.meta["img_size"]))[0],
+                                num_parallel_calls=tf.data.AUTOTUNE)
+            return images.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+        return self.add([file_sha256(path) for path in paths], paths, prefix, decode_batches)
+
+    def update_from_shards(self, shards, indices, prefix, batch_size=32):
+        """Like update, for images of a SpectrogramShards export; the index already holds their hashes."""
+        def shard_batches(missing_indices):
+            for start in range(0, len(missing_indices), batch_size):
+                yield shards.images(missing_indices[start:start + batch_size]).astype(np.float32) / 255.0
+
+        hashes = [shards.records[i]["sha256"] for i in indices]
+        return self.add(hashes, list(indices), prefix, shard_batches)
+
+    def add(self, hashes, sources, prefix, batches):
+        """
+        Returns the row of every hash, first running the missing images through the prefix.
+
+        batches(missing_sources) yields the float images of the sources whose hash is not
+        cached yet, in order.
+        """
+        missing = {}
+        for source, digest in zip(sources, hashes):
+            if digest not in self.rows and digest not in missing:
+                missing[digest] = source
+
+        if missing:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            shape = tuple(prefix.output.shape[1:])
+            old_count = len(self.rows)
+            # Grow into a new file and swap it in, so an interrupted update leaves the old cache intact
+            new_path = self.features_path + ".tmp.npy"
+            features = np.lib.format.open_memmap(new_path, mode="w+", dtype=self.meta["dtype"],
+                                                 shape=(old_count + len(missing), *shape))
+            if old_count:
+                old = self.features()
+                for start in range(0, old_count, 1024):
+                    end = min(start + 1024, old_count)
+                    features[start:end] = old[start:end]
+                del old
+
+            print(f"Embedding cache: computing {len(missing)} new images ({old_count} cached).")
+            row = old_count
+            for batch in batches(list(missing.values())):
+                activations = prefix(batch, training=False).numpy()
+                features[row:row + len(activations)] = activations
+                row += len(activations)
+            features.flush()
+            del features
+            os.replace(new_path, self.features_path)
+
+            self.rows.update({digest: old_count + i for i, digest in enumerate(missing)})
+            with open(self.index_path + ".tmp", "w") as f:
+                json.dump({"meta": self.meta, "rows": self.rows}, f)
+            os.replace(self.index_path + ".tmp", self.index_path)
+        return np.array([self.rows[digest] for digest in hashes], dtype=np.int64)
+
+
+class ShardImages(tf.keras.utils.PyDataset):
+    """
+    Batches of spectrograms and labels read from memory-mapped shards (see spectrogram_shards).
+
+    Each batch copies only its own uint8 rows out of the shards and rescales them to [0, 1],
+    so there is no PNG decode and no directory listing, and shuffling costs nothing extra.
+    """
+
+    def __init__(self, shards, indices, batch_size=32, shuffle=False, seed=0):
+        super().__init__()
+        self.shards = shards
+        self.indices = np.asarray(indices)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.order = self.rng.permutation(self.indices) if shuffle else self.indices
+
+    def __len__(self):
+        return math.ceil(len(self.indices) / self.batch_size)
+
+    def __getitem__(self, index):
+        batch = self.order[index * self.batch_size:(index + 1) * self.batch_size]
+        return self.shards.images(batch).astype(np.float32) / 255.0, self.shards.labels[batch]
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.order = self.rng.permutation(self.indices)
+
+
+def open_shards(shards_path, img_size=(224, 224)):
+    """Opens a spectrogram shard export, checking it was written at the image size the model expects."""
+    shards = SpectrogramShards(shards_path)
+    if tuple(shards.meta["img_size"]) != tuple(img_size):
+        raise ValueError(f"Shards in '{shards_path}' hold {tuple(shards.meta['img_size'])} images, "
+                         f"expected {tuple(img_size)}")
+    return shards
+
+
+class CachedFeatures(tf.keras.utils.PyDataset):
+    """Batches of cached prefix activations and labels, reading only the rows of each batch from the memmap."""
+
+    def __init__(self, features, rows, labels, batch_size=32, shuffle=False, seed=0):
+        super().__init__()
+        self.features = features
+        self.rows = rows
+        self.labels = np.asarray(labels, dtype=np.float32)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.order = self.rng.permutation(len(rows)) if shuffle else np.arange(len(rows))
+
+    def __len__(self):
+        return math.ceil(len(self.rows) / self.batch_size)
+
+    def __getitem__(self, index):
+        batch = self.order[index * self.batch_size:(index + 1) * self.batch_size]
+        return self.features[self.rows[batch]].astype(np.float32), self.labels[batch]
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.order = self.rng.permutation(len(self.rows))
+
+
+def train_from_embeddings(base_model, head, train_dir, val_dir, epochs, fine_tune_layers=4,
+                          embedding_cache="embedding_cache", img_size=(224, 224), batch_size=32,
+                          learning_rate=0.0001, seed=0, shards=None):
+    """
+    Trains the unfrozen VGG16 tail and the dense head from cached prefix activations.
+
+    The frozen prefix runs once per distinct image, when it first enters the cache. The tail
+    and head layers are shared with the full model, so it holds the trained weights afterwards.
+    With shards (an opened SpectrogramShards), the images come from the shards instead of the folders.
+    """
+    prefix, tail = split_frozen_prefix(base_model, fine_tune_layers)
+    cache = EmbeddingCache(embedding_cache, prefix.layers[-1].name, img_size)
+    splits = {}
+    for split, directory in (("train", train_dir), ("val", val_dir)):
+        if shards is not None:
+            indices = shards.split_indices(split)
+            splits[split] = (cache.update_from_shards(shards, indices, prefix, batch_size), shards.labels[indices])
+        else:
+            paths, labels, _ = list_images(directory)
+            splits[split] = (cache.update(paths, prefix, batch_size), labels)
+    features = cache.features()
+    print(f"Embedding cache ready: {len(features)} images of {features.shape[1:]} {features.dtype} in {embedding_cache}.")
+
+    train_rows, train_labels = splits["train"]
+    train_data = CachedFeatures(features, train_rows, train_labels, batch_size, shuffle=True, seed=seed)
+    val_data = CachedFeatures(features, *splits["val"], batch_size)
+
+    tail_model = models.Sequential([layers.Input(shape=features.shape[1:]), *tail, *head])
+    tail_model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
+                       loss='binary_crossentropy',
+                       metrics=['accuracy'])
+    throughput = ThroughputLogger(len(train_rows))
+    history = tail_model.fit(train_data, epochs=epochs, validation_data=val_data, callbacks=[throughput])
+    history.history["images_per_second"] = throughput.images_per_second
+    return history
+
+
+def train_model(dataset_path=dataset_path, epochs=20, model_path="overstimulating_audio_detector.h5",
+                history_path="training_history.pkl", batch_size=32, learning_rate=0.0001, fine_tune_layers=4,
+                img_size=(224, 224), cache="memory", seed=0, mode="full", embedding_cache="embedding_cache",
+                fine_tune_epochs=0, fine_tune_learning_rate=None, shards=None):
+    """
+    Fine-tunes VGG16 on the spectrogram dataset and saves the model and its training history.
+
+    mode="full" trains on the images end to end. mode="embeddings" runs the frozen VGG16 prefix
+    once into an on-disk cache and trains the tail and head from it for epochs, which makes every
+    epoch (and every hyperparameter search run) far cheaper; fine_tune_epochs then continues
+    training the whole model on the raw images, and the history covers all epochs.
+    shards is a folder written by spectrogram_shards.export_shards; when given, both modes read
+    the images and splits from its memory-mapped shards instead of dataset_path.
+    """
+    if mode not in ("full", "embeddings"):
+        raise ValueError(f"Unknown training mode '{mode}'; expected 'full' or 'embeddings'")
+    if not epochs and not (mode == "embeddings" and fine_tune_epochs):
+        raise ValueError("Nothing to train: epochs (or fine_tune_epochs in embeddings mode) must be positive")
+
+    train_dir = os.path.join(dataset_path, "train")
+    val_dir = os.path.join(dataset_path, "val")
+    shard_set = open_shards(shards, img_size) if shards else None
+
+    # Load VGG16 model and build the detector
+    model, base_model, head = build_model(img_size, fine_tune_layers)
+
+    history = None
+    if mode == "embeddings":
+        history = train_from_embeddings(base_model, head, train_dir, val_dir, epochs, fine_tune_layers,
+                                        embedding_cache, img_size, batch_size, learning_rate, seed, shard_set)
+
+    raw_epochs = epochs if mode == "full" else fine_tune_epochs
+    if raw_epochs:
+        if shard_set is not None:
+            train_indices, val_indices = shard_set.split_indices("train"), shard_set.split_indices("val")
+            train_data = ShardImages(shard_set, train_indices, batch_size, shuffle=True, seed=seed)
+            val_data = ShardImages(shard_set, val_indices, batch_size)
+            num_train, num_val = len(train_indices), len(val_indices)
+        else:
+            # Input pipelines; an on-disk cache gets one file prefix per split
+            train_cache = cache if cache in (None, "memory") else f"{cache}_train"
+            val_cache = cache if cache in (None, "memory") else f"{cache}_val"
+            train_data, num_train = image_dataset(train_dir, img_size, batch_size, shuffle=True, cache=train_cache,
+                                                  seed=seed)
+            val_data, num_val = image_dataset(val_dir, img_size, batch_size, cache=val_cache)
+        print(f"Found {num_train} training and {num_val} validation images.")
+
+        # Compile the model
+        rate = learning_rate if mode == "full" else (fine_tune_learning_rate or learning_rate)
+        model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=rate),
+                      loss='binary_crossentropy',
+                      metrics=['accuracy'])
+
+        # Train the model
+        throughput = ThroughputLogger(num_train)
+        raw_history = model.fit(train_data, epochs=raw_epochs, validation_data=val_data, callbacks=[throughput])
+        raw_history.history["images_per_second"] = throughput.images_per_second
+        if history is None:
+            history = raw_history
+        else:
+            for key, values in raw_history.history.items():
+                history.history.setdefault(key, []).extend(values)
+
+    # Save the model
+    model.save(model_path)
+    print("Model training completed and saved!")
+
+    # ✅ Save training history
+    with open(history_path, "wb") as f:
+        pickle.dump(history.history, f)
+    print("Training history saved!")
+    return model, history
+
+
+if __name__ == "__main__":
+    train_model()
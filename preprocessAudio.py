@@ -19,10 +19,18 @@ def boost_volume(audio_segment, gain_db=10):
     return audio_segment + gain_db
 
 
-def preprocess_audio(input_file, output_folder):
+def preprocessed_path(input_file, output_folder):
+    """
+    Get the base filename and append "-preprocessed" to build the output path.
+    """
+    file_name_without_ext = os.path.splitext(os.path.basename(input_file))[0]
+    return os.path.join(output_folder, f"{file_name_without_ext}-preprocessed.mp3")
+
+
+def preprocess_audio(input_file, output_folder, gain_db=15):
     """
     Preprocess an audio file by boosting volume only (no filters applied).
-    The processed file is saved with "-preprocessed" appended to the filename.
+    The processed file is saved with "-preprocessed" appended to the filename, and its path is returned.
     """
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)  # Create output directory if it doesn't exist
@@ -32,22 +40,22 @@ def preprocess_audio(input_file, output_folder):
         return
 
     # Boost volume
-    audio = boost_volume(audio, gain_db=15)
+    audio = boost_volume(audio, gain_db=gain_db)
 
-    # Get the base filename and append "-preprocessed"
-    file_name = os.path.basename(input_file)
-    file_name_without_ext = os.path.splitext(file_name)[0]
-    output_file = os.path.join(output_folder, f"{file_name_without_ext}-preprocessed.mp3")
+    output_file = preprocessed_path(input_file, output_folder)
 
     # Export the processed audio
     audio.export(output_file, format="mp3")
     print(f"Processed audio saved to {output_file}")
+    return output_file
 
 
-def process_dataset(input_folder, output_folder):
+def process_dataset(input_folder, output_folder, gain_db=15, manifest=None):
     """
     Process all audio files in the input folder and save the preprocessed files to the output folder.
+    With a DatasetManifest, files whose preprocessed output is already current are skipped.
     """
+    params = {"gain_db": gain_db}
     for subfolder in os.listdir(input_folder):
         subfolder_path = os.path.join(input_folder, subfolder)
         if os.path.isdir(subfolder_path):
@@ -58,11 +66,17 @@ def process_dataset(input_folder, output_folder):
             for file_name in os.listdir(subfolder_path):
                 if file_name.endswith(".mp3"):
                     input_file = os.path.join(subfolder_path, file_name)
-                    preprocess_audio(input_file, output_subfolder)
+                    output_file = preprocessed_path(input_file, output_subfolder)
+                    if manifest is not None and manifest.is_current(output_file, input_file, params):
+                        continue
+
+                    if preprocess_audio(input_file, output_subfolder, gain_db) and manifest is not None:
+                        manifest.record(output_file, "preprocessed", input_file, params)
 
 
-input_folder = "new_dataset"  # Folder with 5 subfolders
-output_folder = "preprocessed_dataset"  # Folder to save preprocessed files
+if __name__ == "__main__":
+    input_folder = "new_dataset"  # Folder with 5 subfolders
+    output_folder = "preprocessed_dataset"  # Folder to save preprocessed files
 
     # Process the dataset
-process_dataset(input_folder, output_folder)
\ No newline at end of file
+    process_dataset(input_folder, output_folder)
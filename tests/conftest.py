@@ -0,0 +1,21 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Tests import the repository modules (appflow, batchProcess, ...) the way akira.py does, from the root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+
+@pytest.fixture
+def synthetic_audio():
+    """Ten seconds of mono audio: a calm tone, a noise burst and a rising chirp."""
+    sr = 22050
+    t = np.arange(10 * sr) / sr
+    rng = np.random.default_rng(0)
+    y = 0.2 * np.sin(2 * np.pi * 440 * t)
+    y[3 * sr:5 * sr] += 0.5 * rng.standard_normal(2 * sr)
+    y[6 * sr:9 * sr] += 0.4 * np.sin(2 * np.pi * (200 + 1500 * (t[6 * sr:9 * sr] - 6)) * t[6 * sr:9 * sr])
+    return y.astype(np.float32), sr
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from batchProcess import BatchJournal, video_key
+
+SETTINGS = {"window_hop": None, "threshold": 0.75, "min_gap": 0.0, "gain_db": 20, "model_path": "model.h5",
+            "outputs": ["detection_json", "retuned_mp4"], "backend": None}
+
+
+@pytest.fixture
+def finished(tmp_path):
+    """A video the journal records as done, with its outputs on disk."""
+    video = tmp_path / "episode.mp4"
+    video.write_bytes(b"video")
+    outputs = {name: str(tmp_path / f"{name}.out") for name in SETTINGS["outputs"]}
+    for path in outputs.values():
+        open(path, "w").close()
+
+    journal = BatchJournal(str(tmp_path / "batch_journal.jsonl"))
+    journal.record({"video": str(video), "key": video_key(str(video)), "settings": SETTINGS, "status": "done",
+                    "outputs": outputs})
+    return journal, str(video), outputs
+
+
+def test_done_videos_are_skipped_after_reloading_the_journal(finished):
+    journal, video, _ = finished
+    assert journal.is_done(video, SETTINGS)
+    assert BatchJournal(journal.path).is_done(video, dict(SETTINGS))
+
+
+def test_other_outputs_backend_or_settings_reprocess_the_video(finished):
+    journal, video, _ = finished
+    assert not journal.is_done(video, {**SETTINGS, "outputs": ["boosted_mp4", "detection_json", "retuned_mp4"]})
+    assert not journal.is_done(video, {**SETTINGS, "backend": "onnx"})
+    assert not journal.is_done(video, {**SETTINGS, "threshold": 0.5})
+
+
+def test_changed_video_or_missing_output_reprocesses_the_video(finished):
+    journal, video, outputs = finished
+    os.remove(outputs["retuned_mp4"])
+    assert not journal.is_done(video, SETTINGS)
+
+    open(outputs["retuned_mp4"], "w").close()
+    with open(video, "ab") as f:
+        f.write(b" re-encoded")
+    assert not journal.is_done(video, SETTINGS)
+
+
+def test_failed_entries_and_truncated_lines_are_retried(finished):
+    journal, video, _ = finished
+    journal.record({"video": video, "key": video_key(video), "settings": SETTINGS, "status": "failed",
+                    "outputs": {}, "error": "Traceback ..."})
+    with open(journal.path, "a") as f:
+        f.write('{"video": "cut short')
+
+    reloaded = BatchJournal(journal.path)
+    assert reloaded.entries[video]["status"] == "failed"
+    assert not reloaded.is_done(video, SETTINGS)
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from datasetManifest import DatasetManifest
+
+PARAMS = {"gain_db": 15, "img_size": (224, 224)}
+
+
+@pytest.fixture
+def built(tmp_path):
+    """A source clip, its output and a manifest recording that the output was built from it."""
+    source, output = tmp_path / "clip.mp4", tmp_path / "clip.mp3"
+    source.write_bytes(b"original video")
+    output.write_bytes(b"audio")
+    manifest = DatasetManifest(str(tmp_path / "manifest.json"))
+    manifest.record(str(output), "extract", str(source), PARAMS)
+    return manifest, str(source), str(output)
+
+
+def test_output_is_current_after_recording_and_reloading(built):
+    manifest, source, output = built
+    assert manifest.is_current(output, source, PARAMS)
+
+    manifest.save()
+    reloaded = DatasetManifest(manifest.path)
+    assert reloaded.is_current(output, source, {"gain_db": 15, "img_size": [224, 224]})
+
+
+def test_changed_input_content_makes_the_output_stale(built):
+    manifest, source, output = built
+    with open(source, "wb") as f:
+        f.write(b"edited video!")
+    assert not manifest.is_current(output, source, PARAMS)
+
+
+def test_touching_the_input_without_changing_it_keeps_the_output_current(built):
+    manifest, source, output = built
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert manifest.is_current(output, source, PARAMS)
+
+
+def test_changed_parameters_or_missing_files_make_the_output_stale(built):
+    manifest, source, output = built
+    assert not manifest.is_current(output, source, {**PARAMS, "gain_db": 20})
+    assert not manifest.is_current(output, source + ".other", PARAMS)
+
+    os.remove(output)
+    assert not manifest.is_current(output, source, PARAMS)
+
+
+def test_prune_removes_outputs_of_deleted_inputs_down_the_chain(built, tmp_path):
+    manifest, source, output = built
+    image = tmp_path / "clip.png"
+    image.write_bytes(b"spectrogram")
+    manifest.record(str(image), "spectrogram", output, PARAMS)
+
+    os.remove(source)
+    removed = manifest.prune()
+
+    assert sorted(removed) == sorted([output, str(image)])
+    assert not os.path.exists(output) and not image.exists()
+    assert manifest.outputs == {}
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from model_dataset.train_model import EmbeddingCache, train_model  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def prefix():
+    """A small stand-in for the frozen VGG16 prefix."""
+    inputs = tf.keras.Input((8, 8, 3))
+    return tf.keras.Model(inputs, tf.keras.layers.Conv2D(2, 3)(inputs))
+
+
+def images_for(sources):
+    """Batches of constant images, one per source value, the way add() asks for them."""
+    yield np.stack([np.full((8, 8, 3), source / 100, dtype=np.float32) for source in sources])
+
+
+def activations(prefix, source):
+    return prefix(np.full((1, 8, 8, 3), source / 100, dtype=np.float32)).numpy()[0].astype(np.float16)
+
+
+def test_growing_the_cache_keeps_earlier_rows(tmp_path, prefix):
+    cache = EmbeddingCache(str(tmp_path), "conv", (8, 8))
+    train_rows = cache.add([f"train-{i}" for i in range(10)], list(range(10)), prefix, images_for)
+    val_rows = cache.add([f"val-{i}" for i in range(10)], list(range(10, 20)), prefix, images_for)
+
+    features = cache.features()
+    assert features.shape == (20, 6, 6, 2)
+    np.testing.assert_array_equal(train_rows, np.arange(10))
+    np.testing.assert_array_equal(val_rows, np.arange(10, 20))
+    for source in (0, 9, 10, 19):
+        np.testing.assert_allclose(features[source], activations(prefix, source), rtol=1e-3, atol=1e-3)
+
+
+def test_known_and_duplicate_hashes_reuse_their_row(tmp_path, prefix):
+    cache = EmbeddingCache(str(tmp_path), "conv", (8, 8))
+    cache.add(["a", "b"], [1, 2], prefix, images_for)
+
+    requested = []
+
+    def recording(sources):
+        requested.extend(sources)
+        return images_for(sources)
+
+    rows = cache.add(["b", "c", "c", "a"], [2, 3, 3, 1], prefix, recording)
+    assert requested == [3]
+    np.testing.assert_array_equal(rows, [1, 2, 2, 0])
+
+
+def test_cache_persists_and_is_discarded_when_the_prefix_changes(tmp_path, prefix):
+    EmbeddingCache(str(tmp_path), "conv", (8, 8)).add(["a"], [1], prefix, images_for)
+
+    assert EmbeddingCache(str(tmp_path), "conv", (8, 8)).rows == {"a": 0}
+    assert EmbeddingCache(str(tmp_path), "other_layer", (8, 8)).rows == {}
+
+
+def test_training_without_any_epochs_is_rejected_before_the_model_is_built(tmp_path):
+    with pytest.raises(ValueError):
+        train_model(str(tmp_path), epochs=0, mode="embeddings", fine_tune_epochs=0)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from appflow.detectModel import check_window_hop, confidence_timeline, detect_regions, merge_regions, segment_result
+
+
+def regions_of(confidences, threshold=0.75, hysteresis=0.15, min_gap=0.0):
+    cells = np.asarray(confidences, dtype=np.float64)
+    regions = merge_regions(np.arange(len(cells)) * 1.0, cells, 1.0, threshold, hysteresis, min_gap)
+    return [(region["start_time"], region["end_time"]) for region in regions]
+
+
+def test_hysteresis_extends_a_region_over_cells_above_the_low_threshold():
+    assert regions_of([0.1, 0.65, 0.8, 0.7, 0.61, 0.2]) == [(1.0, 5.0)]
+
+
+def test_runs_that_never_cross_the_threshold_are_dropped():
+    assert regions_of([0.7, 0.74, 0.7, 0.1, 0.75]) == []
+
+
+def test_without_hysteresis_only_cells_above_threshold_count():
+    assert regions_of([0.7, 0.8, 0.7, 0.9], hysteresis=0.0) == [(1.0, 2.0), (3.0, 4.0)]
+
+
+def test_regions_closer_than_min_gap_are_joined():
+    confidences = [0.9, 0.1, 0.9, 0.1, 0.1, 0.1, 0.9]
+    assert regions_of(confidences, min_gap=2.0) == [(0.0, 3.0), (6.0, 7.0)]
+    assert regions_of(confidences, min_gap=0.0) == [(0.0, 1.0), (2.0, 3.0), (6.0, 7.0)]
+
+
+def test_region_confidence_is_the_peak_of_its_runs():
+    regions = merge_regions(np.arange(4.0), np.array([0.8, 0.95, 0.7, 0.0]), 1.0)
+    assert regions[0]["confidence"] == 0.95
+    assert regions[0]["overstimulating"] is True
+
+
+def test_timeline_averages_the_overlapping_windows_of_each_cell():
+    results = [segment_result(f"segment_{i}", i, c, 4.0, 0.75, 2.0) for i, c in enumerate([0.2, 1.0, 0.4])]
+    starts, cells = confidence_timeline(results, 4.0, 2.0)
+
+    np.testing.assert_allclose(starts, [0.0, 2.0, 4.0, 6.0])
+    np.testing.assert_allclose(cells, [0.2, 0.6, 0.7, 0.4])
+
+
+def test_timeline_rejects_hops_that_do_not_divide_the_window():
+    results = [segment_result("segment_0", 0, 0.5, 4.0, 0.75, 1.5)]
+    with pytest.raises(ValueError):
+        confidence_timeline(results, 4.0, 1.5)
+
+
+@pytest.mark.parametrize("hop", [1.5, 3.0, 8.0, 0.0, -1.0])
+def test_invalid_hops_are_rejected_before_analysis(hop):
+    with pytest.raises(ValueError):
+        check_window_hop(4.0, hop)
+
+
+@pytest.mark.parametrize("hop", [None, 4.0, 2.0, 1.0, 0.5])
+def test_hops_that_divide_the_window_are_accepted(hop):
+    check_window_hop(4.0, hop)
+
+
+def test_detect_regions_without_overlap_merges_adjacent_segments():
+    results = [segment_result(f"segment_{i}", i, c) for i, c in enumerate([0.1, 0.9, 0.8, 0.1, 0.95])]
+    regions = detect_regions(results, 4.0, None, hysteresis=0.0)
+    assert [(r["start_time"], r["end_time"]) for r in regions] == [(4.0, 12.0), (16.0, 20.0)]
+
+
+def test_pipeline_regions_stage_applies_min_gap():
+    from appflow.videoPipeline import VideoPipeline, stage_regions
+
+    results = [segment_result(f"segment_{i}", i, c) for i, c in enumerate([0.9, 0.1, 0.9])]
+    pipeline = VideoPipeline("video.mp4", ["detection_json"], min_gap=5.0)
+    regions = stage_regions(pipeline.settings, results)
+    assert [(r["start_time"], r["end_time"]) for r in regions] == [(0.0, 12.0)]
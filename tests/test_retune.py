@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from appflow.retunedDetected import RetuneEngine, flagged_regions
+
+SR = 16000
+SEGMENTS = [
+    {"start_time": 1.0, "end_time": 2.5, "overstimulating": True},
+    {"start_time": 4.0, "end_time": 4.3, "overstimulating": True},
+    {"start_time": 5.0, "end_time": 6.0, "overstimulating": False},
+    {"start_time": 6.5, "end_time": 9.0, "overstimulating": True},  # Runs past the end of the track
+]
+
+
+@pytest.fixture
+def track():
+    return np.random.default_rng(1).standard_normal(8 * SR).astype(np.float32) * 0.3
+
+
+def retune_in_blocks(track, block_samples):
+    engine = RetuneEngine(SR, SEGMENTS, len(track))
+    return np.concatenate([engine.process(track[start:start + block_samples].copy(), start)
+                           for start in range(0, len(track), block_samples)])
+
+
+def test_flagged_regions_merge_overlaps_and_skip_unflagged_entries():
+    segments = [{"start_time": 0, "end_time": 4, "overstimulating": True},
+                {"start_time": 2, "end_time": 6, "overstimulating": True},
+                {"start_time": 6, "end_time": 8, "overstimulating": True},
+                {"start_time": 9, "end_time": 12, "overstimulating": False},
+                {"start_time": 14, "end_time": 14, "overstimulating": True}]
+    assert flagged_regions(segments, 10) == [(0, 80)]
+
+
+@pytest.mark.parametrize("block_samples", [SR * 8, SR, 4001, 1000, 257])
+def test_block_size_does_not_change_the_result(track, block_samples):
+    whole = RetuneEngine(SR, SEGMENTS, len(track)).process(track.copy(), 0)
+    np.testing.assert_allclose(retune_in_blocks(track, block_samples), whole, atol=1e-5)
+
+
+def test_only_flagged_regions_change(track):
+    engine = RetuneEngine(SR, SEGMENTS, len(track))
+    retuned = engine.process(track.copy(), 0)
+
+    changed = np.zeros(len(track), dtype=bool)
+    for start, end in engine.regions:
+        changed[start:end] = True
+    np.testing.assert_array_equal(retuned[~changed], track[~changed])
+    assert not np.allclose(retuned[changed], track[changed])
+    assert engine.regions[-1] == (int(6.5 * SR), len(track))
+
+
+def test_region_edges_crossfade_from_the_original(track):
+    retuned = RetuneEngine(SR, SEGMENTS, len(track)).process(track.copy(), 0)
+    start = SR  # The first region starts at 1 s; its first sample is still fully original
+    assert retuned[start] == pytest.approx(track[start])
+
+    # The retuned signal fades in, so it departs from the original more and more across the fade
+    difference = np.abs(retuned - track)
+    assert difference[start:start + 400].mean() < difference[start + 4000:start + 4400].mean()
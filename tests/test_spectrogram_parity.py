@@ -0,0 +1,20 @@
+from appflow.audioBuffer import AudioBuffer
+from appflow.extractSpectroSound import compare_spectrogram_paths, segment_spectrogram_tensors
+
+
+def test_in_memory_spectrograms_match_rendered_pngs(synthetic_audio, tmp_path):
+    y, sr = synthetic_audio
+    within_tolerance, mean_errors = compare_spectrogram_paths(AudioBuffer(y, sr), str(tmp_path), tolerance=0.05)
+
+    # Two full segments and the 2-second tail, each close to its matplotlib rendering
+    assert len(mean_errors) == 3
+    assert within_tolerance, mean_errors
+
+
+def test_spectrogram_tensors_are_model_ready(synthetic_audio):
+    y, sr = synthetic_audio
+    spectrograms = segment_spectrogram_tensors(AudioBuffer(y, sr))
+
+    assert spectrograms.shape == (3, 224, 224, 3)
+    assert spectrograms.dtype == "float32"
+    assert spectrograms.min() >= 0.0 and spectrograms.max() <= 1.0